@@ -4,21 +4,213 @@ import os
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 SOURCE_DOCS_DIR = PROJECT_ROOT / "data" / "source_docs" 
+# Thư mục của store: Chroma + manifest + index BM25 + thống kê + index mmap.
+# Ingest ghi và chatbot đọc CÙNG thư mục này (không nối thêm "global" ở nơi khác).
 VECTOR_STORE_DIR = PROJECT_ROOT / "data" / "vector_store" / "global"
 
 # --- THÊM DÒNG NÀY ---
 JSON_OUTPUT_DIR = PROJECT_ROOT / "data" / "json_output" 
 # ---------------------
 
+# --- PARSE (Giai đoạn 1) ---
+# Số process parse song song, timeout + giới hạn RAM cho mỗi file
+PARSE_WORKERS = os.cpu_count() or 1
+PARSE_TIMEOUT_SECONDS = 300
+PARSE_MAX_MEMORY_MB = 4096
+PARSE_REPORT_PATH = PROJECT_ROOT / "data" / "reports" / "parse_report.json"
+# Tracing: span cho từng bước chat / ingest -> JSONL + chỉ số Prometheus (GET /metrics, file .prom sau ingest).
+# Tắt (mặc định) -> gần như không tốn gì
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "0") == "1"
+TRACE_JSONL_PATH = PROJECT_ROOT / "data" / "reports" / "traces.jsonl"
+TRACE_METRICS_PATH = PROJECT_ROOT / "data" / "reports" / "metrics.prom"
+# Bucket (giây) của histogram thời gian + ghi JSONL ra đĩa mỗi N span hoặc mỗi X giây
+TRACE_HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TRACE_FLUSH_SPANS = 64
+TRACE_FLUSH_SECONDS = 1.0
+# Báo cáo thời gian import / khởi động (scripts/profile_startup.py)
+STARTUP_PROFILE_PATH = PROJECT_ROOT / "data" / "reports" / "startup_profile.json"
+# Benchmark (scripts/benchmark.py): bộ câu hỏi chuẩn (có trong repo) + thư mục báo cáo JSON
+BENCHMARK_GOLDEN_QUERIES_PATH = PROJECT_ROOT / "data" / "benchmarks" / "golden_queries.json"
+BENCHMARK_REPORT_DIR = PROJECT_ROOT / "data" / "reports" / "benchmarks"
+# So sánh với lần chạy trước (--compare): chậm hơn / recall thấp hơn quá ngưỡng này -> báo hồi quy
+BENCHMARK_REGRESSION_TOLERANCE = 0.10
+# File bảng (CSV/XLSX/DAT) được đọc theo block N hàng và ghi ra JSONL
+PARSE_STREAM_BLOCK_ROWS = 5000
+# Định dạng trung gian cho file bảng: "parquet" (dạng cột, có kiểu, cần pyarrow) hoặc "jsonl"
+TABLE_OUTPUT_FORMAT = "parquet"
+
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# --- EMBEDDING ---
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Backend tính embedding: "torch" (HuggingFaceEmbeddings, bản gốc) hoặc "onnx" (ONNX Runtime, int8)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# Thư mục model ONNX local (tạo bằng scripts/export_onnx_embedding.py): model_quantized.onnx + tokenizer.json
+EMBEDDING_ONNX_DIR = PROJECT_ROOT / "models" / "all-MiniLM-L6-v2-onnx"
+EMBEDDING_ONNX_FILE = "model_quantized.onnx"
+# Số thread CPU cho 1 lần tính embedding + số câu mỗi lô
+EMBEDDING_NUM_THREADS = int(os.environ.get("EMBEDDING_NUM_THREADS", os.cpu_count() or 1))
+EMBEDDING_BATCH_SIZE = 32
+# MiniLM được train với tối đa 256 token / câu
+EMBEDDING_MAX_LENGTH = 256
+# Embedding câu hỏi lúc chat: gom các request đồng thời thành lô (tối đa N câu, chờ tối đa X ms khi có tải)
+EMBEDDING_SERVICE_ENABLED = True
+EMBEDDING_SERVICE_MAX_BATCH = 32
+EMBEDDING_SERVICE_MAX_WAIT_MS = 5
+EMBEDDING_SERVICE_CACHE_SIZE = 2048
+# Kiểm tra độ lệch so với backend gốc (scripts/check_embedding_parity.py): cosine thấp nhất chấp nhận được
+EMBEDDING_PARITY_MIN_COSINE = 0.99
+# Cache vector trên đĩa: chỉ chunk mới/đã sửa mới phải embed lại khi ingest
+EMBEDDING_CACHE_PATH = PROJECT_ROOT / "data" / "cache" / "embeddings.sqlite3"
+
+# --- INGEST ---
+# Manifest (SQLite) nằm cạnh Chroma store: document -> chunk IDs + hash
+INGEST_MANIFEST_NAME = "ingest_manifest.sqlite3"
+# Pipeline: chunk (nhiều thread) -> embed theo lô gom qua nhiều file -> 1 writer
+INGEST_EMBED_BATCH_SIZE = 64
+# Mỗi worker tự dùng thread nội bộ của PyTorch -> mặc định một nửa số core
+INGEST_EMBED_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+INGEST_CHUNK_WORKERS = 2
+INGEST_QUEUE_SIZE = 1024
+
+# --- VECTOR INDEX (mmap) ---
+# Đường truy vấn: "chroma" hoặc "mmap" (ma trận float32 memory-mapped export lúc ingest, nhanh hơn SQLite)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_NAME = "vector_index"
+# Export index mmap sau mỗi lần ingest
+VECTOR_INDEX_EXPORT = True
+# HNSW (cần hnswlib): "auto" = bật khi số chunk >= VECTOR_INDEX_HNSW_MIN_ROWS, "on", "off"
+VECTOR_INDEX_HNSW = "auto"
+VECTOR_INDEX_HNSW_MIN_ROWS = 50000
+VECTOR_INDEX_HNSW_M = 16
+VECTOR_INDEX_HNSW_EF_CONSTRUCTION = 200
+VECTOR_INDEX_HNSW_EF_SEARCH = 64
+# Kiểu lưu cho lượt quét vét cạn: "float32" hoặc "int8" (1/4 RAM, scale theo vector).
+# int8: quét bản nén lấy k * RESCORE_FACTOR ứng viên rồi chấm lại chính xác bằng float32
+# (200k x 384, k=10: ~29 so với ~42 ms/câu của float32, recall 1.0)
+VECTOR_INDEX_STORAGE = "float32"
+VECTOR_INDEX_RESCORE_FACTOR = 4
+VECTOR_RECALL_REPORT_PATH = PROJECT_ROOT / "data" / "reports" / "vector_recall.json"
+# Thống kê dựng sẵn (số mục theo topic / document / giá trị cột), nằm cạnh Chroma store
+FACET_STATS_NAME = "facet_stats.json"
+# Cột của dữ liệu bảng được gắn vào metadata chunk và đếm theo giá trị
+FACET_COLUMNS = ("brand", "fuel", "body_type", "prefecture", "transmission")
+# Tên gọi khác của topic (agent/người dùng có thể gọi "cars_data", "xe hơi"...)
+TOPIC_ALIASES = {
+    "car": ["cars", "cars_data", "car_sales", "xe", "xe hơi", "ô tô", "oto"],
+    "license": ["license_conversion", "đổi bằng", "đổi bằng lái", "gaimen kirikae"],
+    "driving school": ["driving_school", "trường dạy lái", "học lái xe", "trường lái"],
+}
+
 # --- CẤU HÌNH RAG ---
 # 1. LLM
 # Lấy tên model từ biến môi trường, nếu không có thì dùng "gemini-2.5-flash"
 GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-2.5-flash")
 LLM_TEMPERATURE = 0.3
+# "gemini" (mặc định) hoặc "local" (LLM giả lập, không gọi mạng - dùng khi test/đo tải)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+LOCAL_LLM_LATENCY_SECONDS = float(os.environ.get("LOCAL_LLM_LATENCY_SECONDS", "0"))
+# Stream câu trả lời từng token (terminal) + in time-to-first-token mỗi lượt
+CHAT_STREAMING = os.environ.get("CHAT_STREAMING", "1") != "0"
 
 # 2. Retriever
 # Số lượng 'k' tài liệu sẽ lấy
-RETRIEVER_SEARCH_K = 3
\ No newline at end of file
+RETRIEVER_SEARCH_K = 3
+
+# Định tuyến câu hỏi tới shard theo topic (chỉ search topic liên quan, không chắc -> search mọi topic)
+QUERY_ROUTER_ENABLED = True
+# Từ khoá -> topic (so khớp sau khi bỏ dấu), cộng thêm TOPIC_ALIASES và giá trị các cột bên dưới
+ROUTER_TOPIC_KEYWORDS = {
+    "car": ["mua xe", "giá xe", "xe cũ", "đời xe", "số km", "hộp số", "nhiên liệu", "yên",
+            "used car", "中古車"],
+    "license": ["bằng lái", "giấy phép lái xe", "chuyển đổi", "dịch thuật", "thi lý thuyết",
+                "thi thực hành", "cảnh sát", "driver's license", "免許", "外免切替"],
+    "driving school": ["trường", "học phí", "khoá học", "khóa học", "học bằng", "giáo viên",
+                       "driving school", "教習所"],
+}
+# Giá trị cột của dữ liệu bảng (hãng, nhiên liệu, kiểu xe) cũng là từ khoá của topic đó
+ROUTER_FACET_COLUMNS = ("brand", "fuel", "body_type")
+# Centroid: chỉ chọn 1 topic khi cosine top-1 >= MIN_SIMILARITY và hơn top-2 ít nhất MIN_MARGIN
+ROUTER_CENTROID_MIN_MARGIN = 0.05
+ROUTER_CENTROID_MIN_SIMILARITY = 0.2
+# Đã định tuyến chắc chắn vào 1 topic -> bớt chunk gửi cho LLM
+ROUTER_ROUTED_SEARCH_K = 2
+# System prompt theo vai trò: phiên đã rõ chủ đề -> chỉ gửi phần chung + vai trò đó (Nhi / Minh / An)
+PERSONA_PROMPTS_ENABLED = True
+
+# Retrieval đón trước: tìm ngữ cảnh ngay khi nhận câu hỏi (khớp từ khoá topic) và chèn sẵn kết quả
+# như 1 lần gọi retrieve_context -> agent trả lời trong 1 lần gọi LLM thay vì 2 (bật: SPECULATIVE_RETRIEVAL=1)
+SPECULATIVE_RETRIEVAL_ENABLED = os.environ.get("SPECULATIVE_RETRIEVAL", "0") == "1"
+# Chờ kết quả tối đa chừng này trước lần gọi LLM đầu; quá giờ -> không chèn (kết quả vẫn vào cache retrieval)
+SPECULATIVE_MAX_WAIT_MS = 300
+SPECULATIVE_MAX_WORKERS = 4
+
+# Ghép ngữ cảnh cho LLM: lấy nhiều ứng viên hơn, bỏ phần lặp do CHUNK_OVERLAP / chunk gần trùng,
+# xếp lại bằng MMR rồi xếp vào ngân sách token (mỗi đoạn kèm nguồn)
+CONTEXT_PACKING_ENABLED = True
+CONTEXT_CANDIDATE_K = 10
+CONTEXT_TOKEN_BUDGET = 500
+CONTEXT_MAX_CHUNKS = 6
+# MMR: 1.0 = chỉ xét độ liên quan, 0.0 = chỉ xét độ khác nhau
+CONTEXT_MMR_LAMBDA = 0.7
+# Cosine giữa 2 chunk >= ngưỡng -> coi là trùng, bỏ chunk xếp hạng thấp hơn
+CONTEXT_DEDUP_THRESHOLD = 0.95
+# Đoạn lặp giữa 2 chunk cùng document ngắn hơn mức này thì không cắt
+CONTEXT_MIN_OVERLAP_CHARS = 50
+
+# 3. Hybrid retrieval (BM25 + vector)
+# Index từ khoá (SQLite FTS5) được build khi ingest, nằm cạnh Chroma store
+LEXICAL_INDEX_NAME = "lexical_index.sqlite3"
+# Số ứng viên lấy từ mỗi nguồn trước khi trộn bằng Reciprocal Rank Fusion
+HYBRID_CANDIDATES_K = 20
+HYBRID_RRF_K = 60
+HYBRID_LEXICAL_WEIGHT = 1.0
+HYBRID_VECTOR_WEIGHT = 1.0
+# Truy vấn ngắn khớp chính xác (ví dụ "N-BOX") trả về thẳng từ BM25, không cần embed
+HYBRID_EXACT_MATCH_SHORTCUT = True
+
+# Cache kết quả retrieval (LRU + TTL), tự xoá khi manifest ingest thay đổi
+RETRIEVAL_CACHE_ENABLED = True
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024
+RETRIEVAL_CACHE_TTL_SECONDS = 3600
+# Chế độ gần đúng: dùng lại kết quả nếu cosine(embedding câu hỏi) >= ngưỡng VÀ cùng số + thực thể đã biết
+# (MiniLM tiếng Anh cho câu tiếng Việt: "xe ở Osaka" và "xe ở Tokyo" có cosine rất cao)
+RETRIEVAL_CACHE_SEMANTIC = True
+RETRIEVAL_CACHE_SIMILARITY_THRESHOLD = 0.92
+RETRIEVAL_CACHE_REVISION_CHECK_SECONDS = 5
+# Thực thể phân biệt 2 câu hỏi gần giống nhau: tỉnh / thành phố Nhật, cộng thêm giá trị các cột
+# RETRIEVAL_CACHE_KEY_FACET_COLUMNS lấy từ thống kê ingest (hãng, nhiên liệu, kiểu xe...)
+RETRIEVAL_CACHE_KEY_TERMS = [
+    "Hokkaido", "Aomori", "Iwate", "Miyagi", "Akita", "Yamagata", "Fukushima", "Ibaraki", "Tochigi",
+    "Gunma", "Saitama", "Chiba", "Tokyo", "Kanagawa", "Niigata", "Toyama", "Ishikawa", "Fukui",
+    "Yamanashi", "Nagano", "Gifu", "Shizuoka", "Aichi", "Mie", "Shiga", "Kyoto", "Osaka", "Hyogo",
+    "Nara", "Wakayama", "Tottori", "Shimane", "Okayama", "Hiroshima", "Yamaguchi", "Tokushima",
+    "Kagawa", "Ehime", "Kochi", "Fukuoka", "Saga", "Nagasaki", "Kumamoto", "Oita", "Miyazaki",
+    "Kagoshima", "Okinawa",
+    "Yokohama", "Nagoya", "Kobe", "Sapporo", "Sendai", "Kawasaki", "Kitakyushu", "Hamamatsu",
+]
+RETRIEVAL_CACHE_KEY_FACET_COLUMNS = ("brand", "fuel", "body_type", "prefecture")
+
+# 4. Truy vấn có cấu trúc (lọc/sắp xếp/thống kê chính xác trên bảng xe, không qua embedding)
+CAR_CATALOG_TOPIC = "car"
+CAR_CATALOG_DOCUMENT_ID = "car_sales"
+# Các cột phân loại được dựng sẵn index giá trị -> hàng
+CAR_CATALOG_CATEGORICAL_COLUMNS = ("fuel", "body_type", "prefecture", "transmission")
+
+# 5. HTTP chat service (python -m chatbot)
+API_HOST = os.environ.get("API_HOST", "0.0.0.0")
+API_PORT = int(os.environ.get("API_PORT", "8000"))
+# Số lượt chat xử lý đồng thời tối đa (các lượt khác chờ)
+API_MAX_CONCURRENT_TURNS = 64
+
+# 6. Lịch sử phiên chat (dùng chung terminal + HTTP service)
+# Ngân sách token cho lịch sử gửi kèm mỗi lượt (lượt cũ hơn được gộp vào bản tóm tắt)
+SESSION_TOKEN_BUDGET = 3000
+SESSION_SUMMARY_MAX_CHARS = 1500
+# Ước lượng token không cần tokenizer
+SESSION_CHARS_PER_TOKEN = 4.0
+# Số phiên tối đa giữ trong RAM (LRU) + thời gian rảnh trước khi bị đẩy ra đĩa
+SESSION_MAX_SESSIONS = 2000
+SESSION_IDLE_SECONDS = 1800
+SESSION_SNAPSHOT_DIR = PROJECT_ROOT / "data" / "sessions"
\ No newline at end of file
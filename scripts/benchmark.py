@@ -0,0 +1,410 @@
+# benchmark.py
+# (Benchmark offline trên dữ liệu có sẵn + bảng xe nhân bản (100k, 1M hàng...):
+#  parse -> chunk -> embed -> ingest -> retrieval p50/p95/p99 + recall@k trên bộ câu hỏi chuẩn.
+#  Kết quả ghi ra JSON để so sánh giữa các lần chạy: --compare báo cáo trước)
+
+import io
+import os
+import sys
+import csv
+import json
+import time
+import zlib
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+
+# --- Setup Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from config import (
+    SOURCE_DOCS_DIR, JSON_OUTPUT_DIR, BENCHMARK_GOLDEN_QUERIES_PATH, BENCHMARK_REPORT_DIR, BENCHMARK_REGRESSION_TOLERANCE,
+    EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, CHUNK_SIZE, CHUNK_OVERLAP, TABLE_OUTPUT_FORMAT,
+    INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_WORKERS, RETRIEVER_SEARCH_K, QUERY_ROUTER_ENABLED,
+    VECTOR_INDEX_NAME, VECTOR_INDEX_EXPORT, VECTOR_INDEX_STORAGE, VECTOR_INDEX_HNSW,
+    VECTOR_INDEX_HNSW_EF_SEARCH, VECTOR_INDEX_RESCORE_FACTOR, LEXICAL_INDEX_NAME,
+)
+from langchain_core.embeddings import Embeddings
+from src.chatbot.core.utils import get_embedding_model, embedding_model_id, get_facet_stats, get_query_router
+from src.chatbot.core.agent import ChatResources
+from src.chatbot.core.lexical_index import LexicalIndex, fold_text, tokenize
+from src.chatbot.core.table_query import load_table_columns, find_table_file
+from convert_json import SUPPORTED_EXTENSIONS, convert_file, json_output_path_for
+from chunk_and_embedding import run_ingest, iter_json_documents, chunk_json_file
+
+REPORT_VERSION = 1
+# Bảng được nhân bản khi --scale N (topic/document của dữ liệu xe có sẵn)
+SCALE_SOURCE_TOPIC = "car"
+SCALE_SOURCE_FILE = "car_sales"
+SCALE_PREFECTURES = ["Osaka", "Tokyo", "Aichi", "Hyogo", "Chiba", "Kanagawa", "Saitama", "Fukuoka", "Hokkaido"]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embedding băm token (không cần model, không cần mạng): đo được phần còn lại của pipeline
+    trên máy chưa có model MiniLM. Chỉ so sánh kết quả giữa các lần chạy cùng --embedding.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def load_embeddings(kind: str) -> tuple[Embeddings, str]:
+    if kind == "hashing":
+        return HashingEmbeddings(), "hashing-384"
+    return get_embedding_model(), embedding_model_id()
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# --- DỮ LIỆU ---
+def write_scaled_table(rows: int, target: Path, seed: int = 0) -> int:
+    """
+    Nhân bản bảng xe có sẵn thành `rows` hàng CSV. Mỗi bản sao đổi năm / số km / giá / tỉnh
+    -> các hàng khác nhau (không bị cache embedding hay BM25 gộp lại).
+    """
+    base_path = find_table_file(JSON_OUTPUT_DIR, SCALE_SOURCE_TOPIC, SCALE_SOURCE_FILE)
+    data = load_table_columns(base_path)
+    columns = list(data)
+    base_rows = list(zip(*data.values()))
+    rng = np.random.default_rng(seed)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(rows):
+            row = dict(zip(columns, base_rows[i % len(base_rows)]))
+            copy = i // len(base_rows)
+            row["year"] = int(row["year"]) - int(rng.integers(0, 6))
+            row["mileage_km"] = int(row["mileage_km"]) + copy * 1000 + int(rng.integers(0, 1000))
+            row["price_yen"] = int(int(row["price_yen"]) * float(rng.uniform(0.7, 1.2)) // 1000 * 1000)
+            row["prefecture"] = SCALE_PREFECTURES[int(rng.integers(0, len(SCALE_PREFECTURES)))]
+            row["url_slug"] = f"{row['url_slug']}-{i}"
+            writer.writerow([row[c] for c in columns])
+    print(f"LOG: Đã tạo bảng nhân bản {rows} hàng từ {base_path.name} -> {target}")
+    return rows
+
+
+# --- CÁC BƯỚC ĐO ---
+def bench_parse(source_dir: Path, json_dir: Path) -> dict:
+    """Parse mọi file gốc (dữ liệu có sẵn + bảng nhân bản) ra thư mục tạm, đo hàng/s và MB/s"""
+    files = [p for p in source_dir.glob("**/*") if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS]
+    rows = 0
+    size = 0
+    per_file = []
+    start = time.perf_counter()
+    for file_path in files:
+        file_start = time.perf_counter()
+        result = convert_file(file_path, json_output_path_for(file_path, source_dir, json_dir))
+        seconds = time.perf_counter() - file_start
+        rows += result.get("rows", 0)
+        size += file_path.stat().st_size
+        per_file.append({"file": str(file_path.relative_to(source_dir)), "rows": result.get("rows", 0),
+                         "seconds": round(seconds, 3)})
+    seconds = time.perf_counter() - start
+    return {
+        "files": len(files), "table_rows": rows, "mb": round(size / 1e6, 3),
+        "seconds": round(seconds, 3),
+        "rows_per_s": round(rows / seconds, 1) if seconds else 0.0,
+        "mb_per_s": round(size / 1e6 / seconds, 3) if seconds else 0.0,
+        "per_file": per_file,
+    }
+
+
+def bench_chunk(json_dir: Path, golden: list[dict], sample_size: int) -> tuple[dict, list[str], dict]:
+    """
+    Chunk mọi document (không embed) -> chunk/s. Cùng lượt đó: đếm chunk liên quan của từng câu hỏi
+    chuẩn (cho recall@k) và giữ `sample_size` chunk đầu tiên cho bước đo embedding.
+    """
+    needles = {q["id"]: [fold_text(n) for n in q["relevant_if"]] for q in golden}
+    relevant_counts = {qid: 0 for qid in needles}
+    sample = []
+    documents = chunks = 0
+    judge_seconds = 0.0  # thời gian so khớp câu hỏi chuẩn, không tính vào tốc độ chunk
+    start = time.perf_counter()
+    for json_path, topic, document_id in iter_json_documents(json_dir):
+        documents += 1
+        for _, doc in chunk_json_file(json_path, topic, document_id):
+            judge_start = time.perf_counter()
+            chunks += 1
+            if len(sample) < sample_size:
+                sample.append(doc.page_content)
+            text = fold_text(doc.page_content)
+            for qid, parts in needles.items():
+                if all(part in text for part in parts):
+                    relevant_counts[qid] += 1
+            judge_seconds += time.perf_counter() - judge_start
+    seconds = time.perf_counter() - start - judge_seconds
+    stats = {
+        "documents": documents, "chunks": chunks, "seconds": round(seconds, 3),
+        "chunks_per_s": round(chunks / seconds, 1) if seconds else 0.0,
+    }
+    return stats, sample, relevant_counts
+
+
+def bench_embed(embeddings: Embeddings, texts: list[str], batch_size: int) -> dict:
+    if not texts:
+        return {"texts": 0}
+    embeddings.embed_documents(texts[:batch_size])  # làm nóng (tải model, khởi tạo thread pool)
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    seconds = time.perf_counter() - start
+    return {
+        "texts": len(texts), "batch_size": batch_size, "seconds": round(seconds, 3),
+        "texts_per_s": round(len(texts) / seconds, 1) if seconds else 0.0,
+    }
+
+
+def bench_ingest(json_dir: Path, store_dir: Path, cache_path: Path, embeddings, model_id: str) -> dict:
+    """Ingest lạnh (store + cache embedding trống), rồi chạy lại lần 2 (không có gì đổi -> chỉ quét hash)"""
+    cold = run_ingest(json_dir, store_dir, embedding_model=embeddings, model_id=model_id,
+                      embedding_cache_path=cache_path)
+    start = time.perf_counter()
+    run_ingest(json_dir, store_dir, embedding_model=embeddings, model_id=model_id,
+               embedding_cache_path=cache_path)
+    return {**cold, "noop_rerun_seconds": round(time.perf_counter() - start, 3)}
+
+
+def open_vector_store(backend: str, store_dir: Path, embeddings):
+    if backend == "mmap":
+        from src.chatbot.core.vector_index import MmapVectorIndex, MmapVectorStore
+        index = MmapVectorIndex(store_dir / VECTOR_INDEX_NAME, hnsw_ef_search=VECTOR_INDEX_HNSW_EF_SEARCH,
+                                rescore_factor=VECTOR_INDEX_RESCORE_FACTOR)
+        return MmapVectorStore(index, embedding=embeddings)
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=str(store_dir), embedding_function=embeddings)
+
+
+def bench_retrieval(backend: str, store_dir: Path, embeddings, golden: list[dict],
+                    relevant_counts: dict, repeat: int) -> dict:
+    """
+    Chạy bộ câu hỏi chuẩn qua đúng đường tìm kiếm của chatbot (ChatResources.search_documents:
+    định tuyến topic + BM25 + vector, không có cache retrieval). Mỗi câu chạy `repeat` lần.
+    """
+    facet_stats = get_facet_stats(store_dir)
+    resources = ChatResources(
+        embeddings=embeddings,
+        vector_store=open_vector_store(backend, store_dir, embeddings),
+        lexical_index=LexicalIndex(store_dir / LEXICAL_INDEX_NAME),
+        facet_stats=facet_stats,
+        router=get_query_router(facet_stats, store_dir) if QUERY_ROUTER_ENABLED else None,
+    )
+    log = io.StringIO()
+    with redirect_stdout(log):  # bỏ log [DEBUG] của router khỏi phép đo
+        for q in golden:
+            resources.search_documents(q["query"])
+
+    latencies = []
+    per_query = []
+    with redirect_stdout(log):
+        for q in golden:
+            parts = [fold_text(n) for n in q["relevant_if"]]
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                docs, _ = resources.search_documents(q["query"])
+                samples.append((time.perf_counter() - start) * 1000)
+            latencies.extend(samples)
+            hits = sum(all(part in fold_text(doc.page_content) for part in parts) for doc in docs)
+            relevant = relevant_counts.get(q["id"], 0)
+            per_query.append({
+                "id": q["id"], "returned": len(docs), "relevant_in_corpus": relevant,
+                "relevant_returned": hits,
+                "recall": round(hits / min(relevant, len(docs)), 3) if relevant and docs else 0.0,
+                "p50_ms": round(float(np.median(samples)), 3),
+            })
+
+    judged = [r for r in per_query if r["relevant_in_corpus"]]
+    return {
+        "queries": len(golden), "repeat": repeat,
+        **percentiles(latencies),
+        "recall_at_k": round(float(np.mean([r["recall"] for r in judged])), 4) if judged else 0.0,
+        "hit_rate": round(float(np.mean([r["relevant_returned"] > 0 for r in judged])), 4) if judged else 0.0,
+        "avg_chunks": round(float(np.mean([r["returned"] for r in per_query])), 3),
+        "unjudged_queries": [r["id"] for r in per_query if not r["relevant_in_corpus"]],
+        "router": resources.router.stats if resources.router is not None else None,
+        "per_query": per_query,
+    }
+
+
+# --- SO SÁNH ---
+# Hậu tố key -> hướng tốt: -1 = càng nhỏ càng tốt (thời gian), +1 = càng lớn càng tốt
+_METRIC_DIRECTIONS = (("_ms", -1), ("seconds", -1), ("_per_s", 1), ("recall_at_k", 1), ("hit_rate", 1))
+
+
+def _flatten(obj, prefix="") -> dict:
+    out = {}
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in ("per_query", "per_file", "router", "environment", "config"):
+                continue
+            out.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix[:-1]] = float(obj)
+    return out
+
+
+def compare_reports(old: dict, new: dict, tolerance: float) -> list[str]:
+    """In chênh lệch các chỉ số chính, trả về danh sách chỉ số bị hồi quy quá `tolerance`"""
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    regressions = []
+    print(f"\n--- SO SÁNH với {old.get('started_at')} (commit {old.get('git_commit')}) ---")
+    for section in ("dataset", "config"):
+        changed = sorted(k for k in set(old.get(section, {})) | set(new.get(section, {}))
+                         if k != "relevant_chunks" and old.get(section, {}).get(k) != new.get(section, {}).get(k))
+        if changed:
+            print(f"  CẢNH BÁO: {section} khác nhau ({', '.join(changed)}) -> chênh lệch không chỉ do code.")
+    for key in sorted(set(old_flat) & set(new_flat)):
+        direction = next((d for suffix, d in _METRIC_DIRECTIONS if key.endswith(suffix)), 0)
+        before, after = old_flat[key], new_flat[key]
+        if direction == 0 or before == 0:
+            continue
+        change = (after - before) / abs(before)
+        worse = change * direction < -tolerance
+        if worse:
+            regressions.append(key)
+        print(f"  {'HỒI QUY' if worse else '':<8}{key:<40} {before:>12.3f} -> {after:>12.3f} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Benchmark parse / chunk / embed / ingest / retrieval (offline)")
+    cli.add_argument("--scale", type=int, default=0,
+                     help="Thêm bảng xe nhân bản N hàng (ví dụ 100000, 1000000); 0 = chỉ dữ liệu có sẵn")
+    cli.add_argument("--embedding", choices=["config", "hashing"], default="config",
+                     help="config = model theo EMBEDDING_BACKEND; hashing = băm token (máy không có model)")
+    cli.add_argument("--embed-sample", type=int, default=2048, help="Số chunk dùng để đo tốc độ embedding")
+    cli.add_argument("--backends", default="chroma,mmap", help="Vector store đo retrieval, cách nhau bởi dấu phẩy")
+    cli.add_argument("--repeat", type=int, default=5, help="Số lần chạy mỗi câu hỏi chuẩn")
+    cli.add_argument("--golden", type=Path, default=BENCHMARK_GOLDEN_QUERIES_PATH)
+    cli.add_argument("--work-dir", type=Path, default=None, help="Thư mục làm việc (mặc định: thư mục tạm)")
+    cli.add_argument("--keep", action="store_true", help="Giữ lại thư mục làm việc")
+    cli.add_argument("--output", type=Path, default=None, help="File báo cáo JSON")
+    cli.add_argument("--compare", type=Path, default=None, help="Báo cáo JSON lần trước để so sánh")
+    cli.add_argument("--tolerance", type=float, default=BENCHMARK_REGRESSION_TOLERANCE)
+    args = cli.parse_args(argv)
+
+    golden = json.loads(args.golden.read_text(encoding="utf-8"))["queries"]
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="chatbot-bench-"))
+    source_dir, json_dir = work_dir / "source_docs", work_dir / "json_output"
+    store_dir, cache_path = work_dir / "vector_store", work_dir / "cache" / "embeddings.sqlite3"
+    for path in (source_dir, json_dir, store_dir, cache_path.parent):
+        shutil.rmtree(path, ignore_errors=True)
+
+    report = {
+        "report_version": REPORT_VERSION,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "config": {
+            "embedding": args.embedding, "embedding_backend": EMBEDDING_BACKEND,
+            "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "table_format": TABLE_OUTPUT_FORMAT,
+            "ingest_batch_size": INGEST_EMBED_BATCH_SIZE, "ingest_embed_workers": INGEST_EMBED_WORKERS,
+            "retriever_k": RETRIEVER_SEARCH_K, "query_router": QUERY_ROUTER_ENABLED,
+            "vector_storage": VECTOR_INDEX_STORAGE, "vector_hnsw": VECTOR_INDEX_HNSW,
+        },
+        "dataset": {"scale_rows": args.scale},
+    }
+
+    try:
+        # Dữ liệu: file gốc có sẵn + (tuỳ chọn) bảng xe nhân bản, parse ra thư mục tạm
+        shutil.copytree(SOURCE_DOCS_DIR, source_dir)
+        if args.scale:
+            write_scaled_table(args.scale, source_dir / SCALE_SOURCE_TOPIC / f"{SCALE_SOURCE_FILE}_x{args.scale}.csv")
+
+        print("\n--- [1/5] PARSE ---")
+        report["parse"] = bench_parse(source_dir, json_dir)
+
+        print("\n--- [2/5] CHUNK ---")
+        report["chunk"], sample, relevant_counts = bench_chunk(json_dir, golden, args.embed_sample)
+        report["dataset"]["relevant_chunks"] = relevant_counts
+
+        print("\n--- [3/5] EMBED ---")
+        embeddings, model_id = load_embeddings(args.embedding)
+        report["config"]["embedding_model_id"] = model_id
+        report["embed"] = bench_embed(embeddings, sample, EMBEDDING_BATCH_SIZE)
+
+        print("\n--- [4/5] INGEST ---")
+        report["ingest"] = bench_ingest(json_dir, store_dir, cache_path, embeddings, model_id)
+
+        print("\n--- [5/5] RETRIEVAL ---")
+        report["retrieval"] = {}
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            if backend == "mmap" and not VECTOR_INDEX_EXPORT:
+                print("LOG: VECTOR_INDEX_EXPORT tắt -> bỏ qua backend mmap.")
+                continue
+            report["retrieval"][backend] = bench_retrieval(
+                backend, store_dir, embeddings, golden, relevant_counts, args.repeat
+            )
+    finally:
+        if not args.keep and args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or BENCHMARK_REPORT_DIR / f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("\n--- KẾT QUẢ ---")
+    print(f"  parse    : {report['parse']['rows_per_s']:>10.1f} hàng/s  ({report['parse']['mb_per_s']:.2f} MB/s)")
+    print(f"  chunk    : {report['chunk']['chunks_per_s']:>10.1f} chunk/s ({report['chunk']['chunks']} chunk)")
+    print(f"  embed    : {report['embed'].get('texts_per_s', 0):>10.1f} câu/s   ({model_id})")
+    print(f"  ingest   : {report['ingest']['wall_seconds']:>10.2f} s       "
+          f"(chạy lại không đổi: {report['ingest']['noop_rerun_seconds']:.2f}s)")
+    for backend, r in report["retrieval"].items():
+        print(f"  {backend:<9}: p50 {r['p50_ms']:.2f}ms  p95 {r['p95_ms']:.2f}ms  p99 {r['p99_ms']:.2f}ms  "
+              f"recall@k {r['recall_at_k']:.3f}  hit {r['hit_rate']:.3f}  {r['avg_chunks']:.2f} chunk/câu")
+    print(f"\nBáo cáo: {output}")
+
+    if args.compare:
+        old = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare_reports(old, report, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} chỉ số hồi quy quá {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
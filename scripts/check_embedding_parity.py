@@ -0,0 +1,93 @@
+# check_embedding_parity.py
+# (So sánh vector của backend embedding đang cấu hình với backend gốc: độ lệch cosine + tốc độ)
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# --- Setup Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import (
+    EMBEDDING_BACKEND, EMBEDDING_ONNX_DIR, EMBEDDING_NUM_THREADS, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_LENGTH, EMBEDDING_PARITY_MIN_COSINE,
+)
+from src.chatbot.core.utils import get_embedding_model
+
+# Câu mẫu khi không truyền --texts-file (giống câu hỏi thật của khách + nội dung dữ liệu)
+SAMPLE_TEXTS = [
+    "Xe hybrid dưới 1 triệu yên ở Osaka",
+    "Thủ tục đổi bằng lái xe Việt Nam sang bằng Nhật cần giấy tờ gì?",
+    "Trường dạy lái xe nào ở Tokyo có hỗ trợ tiếng Việt?",
+    "Toyota Prius 2018, 45000 km, giá 1,250,000 yên, hộp số AT, Aichi",
+    "Honda N-BOX Kei Car màu trắng, xăng, đời 2020",
+    "Chi phí học bằng lái ở Nhật khoảng bao nhiêu?",
+    "SUV Diesel Mazda CX-5 số tự động",
+    "Bạn có những loại xe nào?",
+    "How long does it take to convert a foreign driver's license in Japan?",
+    "運転免許の切り替えに必要な書類",
+]
+
+
+def load_reference(name: str):
+    """Backend tham chiếu: "torch" (bản gốc) hoặc "onnx-fp32" (ONNX chưa lượng tử hoá, khi máy không có torch)"""
+    if name == "torch":
+        return get_embedding_model("torch")
+    from src.chatbot.core.onnx_embeddings import OnnxEmbeddings
+    return OnnxEmbeddings(
+        EMBEDDING_ONNX_DIR, model_file="model.onnx", num_threads=EMBEDDING_NUM_THREADS,
+        batch_size=EMBEDDING_BATCH_SIZE, max_length=EMBEDDING_MAX_LENGTH,
+    )
+
+
+def timed_embed(model, texts: list[str]) -> tuple[np.ndarray, float]:
+    model.embed_documents(texts[:2])  # làm nóng (khởi tạo session / thread pool)
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    return vectors, time.perf_counter() - start
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Kiểm tra độ lệch cosine giữa 2 backend embedding")
+    cli.add_argument("--reference", choices=["torch", "onnx-fp32"], default="torch")
+    cli.add_argument("--candidate", choices=["torch", "onnx"], default=EMBEDDING_BACKEND)
+    cli.add_argument("--texts-file", type=Path, default=None, help="File văn bản, mỗi dòng 1 câu")
+    cli.add_argument("--repeat", type=int, default=20, help="Nhân bản câu mẫu để đo tốc độ")
+    cli.add_argument("--min-cosine", type=float, default=EMBEDDING_PARITY_MIN_COSINE)
+    args = cli.parse_args(argv)
+
+    if args.texts_file:
+        texts = [line.strip() for line in args.texts_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        texts = SAMPLE_TEXTS * args.repeat
+
+    reference = load_reference(args.reference)
+    candidate = get_embedding_model(args.candidate)
+
+    ref_vectors, ref_seconds = timed_embed(reference, texts)
+    cand_vectors, cand_seconds = timed_embed(candidate, texts)
+
+    # Cả 2 đều đã chuẩn hoá L2 -> cosine = tích vô hướng
+    cosine = np.sum(ref_vectors * cand_vectors, axis=1)
+    worst = int(np.argmin(cosine))
+    print(f"--- PARITY: {args.candidate} so với {args.reference} ({len(texts)} câu) ---")
+    print(f"  cosine trung bình: {cosine.mean():.5f}")
+    print(f"  cosine thấp nhất : {cosine.min():.5f}  ({texts[worst][:60]!r})")
+    print(f"  cosine p5        : {np.percentile(cosine, 5):.5f}")
+    print(f"  tốc độ {args.reference:>9}: {len(texts) / ref_seconds:8.1f} câu/s")
+    print(f"  tốc độ {args.candidate:>9}: {len(texts) / cand_seconds:8.1f} câu/s "
+          f"(x{ref_seconds / cand_seconds:.2f})")
+
+    if cosine.min() < args.min_cosine:
+        print(f"KHÔNG ĐẠT: cosine thấp nhất < {args.min_cosine}")
+        return 1
+    print(f"ĐẠT (ngưỡng {args.min_cosine})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,9 +5,10 @@ import os
 import sys
 import json
 import re
+import time
 from pathlib import Path
+from typing import Iterable, Iterator
 
-from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter, Language
 from langchain_core.documents import Document
 
@@ -15,8 +16,25 @@ from langchain_core.documents import Document
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
-from config import JSON_OUTPUT_DIR, VECTOR_STORE_DIR, CHUNK_SIZE, CHUNK_OVERLAP
-from src.chatbot.core.utils import get_embedding_model
+from config import (
+    JSON_OUTPUT_DIR, VECTOR_STORE_DIR, CHUNK_SIZE, CHUNK_OVERLAP,
+    EMBEDDING_CACHE_PATH, INGEST_MANIFEST_NAME, LEXICAL_INDEX_NAME,
+    FACET_STATS_NAME, FACET_COLUMNS, TOPIC_ALIASES,
+    INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_WORKERS, INGEST_CHUNK_WORKERS, INGEST_QUEUE_SIZE,
+    VECTOR_INDEX_NAME, VECTOR_INDEX_EXPORT, VECTOR_INDEX_HNSW, VECTOR_INDEX_HNSW_MIN_ROWS,
+    VECTOR_INDEX_HNSW_M, VECTOR_INDEX_HNSW_EF_CONSTRUCTION, VECTOR_INDEX_STORAGE,
+    TRACE_METRICS_PATH,
+)
+from src.chatbot.core.utils import get_embedding_model, embedding_model_id, configure_tracing
+from src.chatbot.core.embedding_cache import EmbeddingCache, CachedEmbeddings
+from src.chatbot.core.ingest_manifest import IngestManifest, file_hash, config_hash, make_chunk_id
+from src.chatbot.core.ingest_pipeline import IngestPipeline
+from src.chatbot.core import table_store
+from src.chatbot.core.lexical_index import LexicalIndex
+from src.chatbot.core.facet_stats import FacetStats
+from src.chatbot.core.table_query import rows_to_columns
+from src.chatbot.core.vector_index import export_from_collection, hnsw_available
+from src.chatbot.core.tracing import tracer
 
 # --- LOGIC CHUNKING (Chuyển từ file cũ sang) ---
 
@@ -52,18 +70,65 @@ def chunk_unstructured_elements(elements: list[dict]) -> list[Document]:
     
     return chunks
 
+def iter_table_row_chunks(rows: Iterable, columns: list[str] | None = None) -> Iterator[Document]:
+    """
+    Chunk dữ liệu dạng hàng theo kiểu generator (không giữ cả bảng trong RAM).
+    `rows` là list dict (JSON cũ, Parquet) hoặc list giá trị đi kèm `columns` (JSONL).
+    """
+    for i, row in enumerate(rows):
+        items = list(zip(columns, row)) if columns is not None else list(row.items())
+        content_parts = [
+            f"{str(col).strip()}: {'' if val is None else str(val).strip()}" for col, val in items
+        ]
+        page_content = ", ".join(content_parts)
+        metadata = {"type": "csv_row", "row_index": i + 1}
+        # Giá trị các cột chính -> metadata (lọc được trong Chroma, đếm trong FacetStats)
+        for col, val in items:
+            if col in FACET_COLUMNS and val not in (None, ""):
+                metadata[col] = val if isinstance(val, (int, float)) else str(val).strip()
+        yield Document(page_content=page_content, metadata=metadata)
+
 def chunk_table_rows(rows: list[dict]) -> list[Document]:
     """
     Chunk dữ liệu dạng hàng (từ CSV/DAT). Mỗi hàng là 1 Document.
     Đây là logic 'process_csv_file' cũ của anh.
     """
-    chunks = []
-    for i, row_dict in enumerate(rows):
-        content_parts = [f"{str(col).strip()}: {str(val).strip()}" for col, val in row_dict.items()]
-        page_content = ", ".join(content_parts)
-        metadata = {"type": "csv_row", "row_index": i + 1}
-        chunks.append(Document(page_content=page_content, metadata=metadata))
-    return chunks
+    # JSON cũ có thể chứa cả hàng CSV trong 1 ô -> tách thành cột thật trước
+    data = rows_to_columns(rows)
+    return list(iter_table_row_chunks(zip(*data.values()), list(data)))
+
+def iter_jsonl_table_chunks(jsonl_path: Path, topic: str, document_id: str) -> Iterator[tuple[str, Document]]:
+    """
+    Đọc file JSONL (dòng 1 = header, mỗi dòng sau = 1 hàng) từng dòng một
+    và yield (chunk_id, Document) -> ingest file bảng lớn với RAM cố định.
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        source_filename = header.get("source_filename", "unknown")
+        rows = (json.loads(line) for line in f if line.strip())
+        for i, chunk in enumerate(iter_table_row_chunks(rows, header["columns"])):
+            chunk.metadata.update({
+                "topic": topic,
+                "document_id": document_id,
+                "source": source_filename
+            })
+            yield make_chunk_id(topic, document_id, i), chunk
+
+def iter_parquet_table_chunks(parquet_path: Path, topic: str, document_id: str) -> Iterator[tuple[str, Document]]:
+    """
+    Đọc file Parquet (dạng cột) theo từng batch và yield (chunk_id, Document),
+    mỗi hàng là 1 chunk như chunk_table_rows.
+    """
+    meta = table_store.read_metadata(parquet_path)
+    source_filename = meta.get("source_filename", "unknown")
+    rows = table_store.iter_rows(parquet_path)
+    for i, chunk in enumerate(iter_table_row_chunks(rows)):
+        chunk.metadata.update({
+            "topic": topic,
+            "document_id": document_id,
+            "source": source_filename
+        })
+        yield make_chunk_id(topic, document_id, i), chunk
 
 def chunk_plain_text(content: str) -> list[Document]:
     """Chunk file text đơn giản (từ .txt)"""
@@ -89,106 +154,262 @@ def chunk_code(content: dict) -> list[Document]:
         
     return text_splitter.create_documents([text])
 
-# --- HÀM MAIN CỦA GIAI ĐOẠN 2 ---
+def export_vector_index(collection, index_dir: Path, model_id: str | None = None) -> dict:
+    """Export Chroma ra index mmap (ma trận float32 + bảng metadata) cho VECTOR_BACKEND="mmap" """
+    total = collection.count()
+    use_hnsw = VECTOR_INDEX_HNSW == "on" or (
+        VECTOR_INDEX_HNSW == "auto" and total >= VECTOR_INDEX_HNSW_MIN_ROWS
+    )
+    if use_hnsw and not hnsw_available():
+        print("LOG: Chưa cài hnswlib -> index mmap chỉ dùng tìm kiếm vét cạn (NumPy).")
+        use_hnsw = False
 
-def main():
-    print("--- BẮT ĐẦU GIAI ĐOẠN 2: INGEST JSON VÀO VECTOR STORE ---")
-    
-    if not JSON_OUTPUT_DIR.exists():
-        print(f"Thư mục JSON {JSON_OUTPUT_DIR} không tồn tại. Hãy chạy run_parser.py trước.")
-        return
+    start = time.perf_counter()
+    info = export_from_collection(
+        collection, index_dir, model_id=model_id or embedding_model_id(), hnsw=use_hnsw,
+        hnsw_m=VECTOR_INDEX_HNSW_M, hnsw_ef_construction=VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+        storage=VECTOR_INDEX_STORAGE,
+    )
+    print(f"Index mmap: {info['count']} vector, {len(info.get('shards', []))} shard topic -> {index_dir} "
+          f"(HNSW: {'có' if info.get('hnsw') else 'không'}, lưu {info.get('storage', '-')}, "
+          f"{time.perf_counter() - start:.1f}s)")
+    return info
+
+
+def iter_json_documents(json_dir: Path) -> Iterator[tuple[Path, str, str]]:
+    """(file JSON/JSONL/Parquet, topic, document_id): topic = thư mục con, document_id = tên file"""
+    for json_path in json_dir.glob("**/*"):
+        if not json_path.is_file() or json_path.suffix not in (".json", ".jsonl", ".parquet"):
+            continue
+        relative_path = json_path.relative_to(json_dir)
+        topic = str(relative_path.parent)
+        if topic == ".": topic = "general"
+        # Lấy tên file gốc (BaoCao.pdf -> BaoCao)
+        document_id = relative_path.name.split('.')[0]
+        yield json_path, topic, document_id
+
+
+def chunk_json_file(json_path: Path, topic: str, document_id: str) -> Iterable[tuple[str, Document]]:
+    """
+    Đọc 1 file output của Giai đoạn 1 -> (chunk_id, Document) đã gán metadata.
+    File bảng (Parquet/JSONL) trả về generator (chunk dần), file JSON trả về list.
+    """
+    if json_path.suffix == ".parquet":
+        return iter_parquet_table_chunks(json_path, topic, document_id)
+    if json_path.suffix == ".jsonl":
+        return iter_jsonl_table_chunks(json_path, topic, document_id)
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    source_filename = data.get("source_filename", "unknown")
+    data_type = data.get("data_type", "unknown")
+    content = data.get("content")
+
+    # --- CHUNKING ROUTER (Dựa trên data_type) ---
+    splits = []
+    if not content:
+        print(f"  Bỏ qua (không có content): {json_path.name}")
+    elif data_type == "unstructured_doc":
+        splits = chunk_unstructured_elements(content)
+    elif data_type == "table_rows":
+        splits = chunk_table_rows(content)
+    elif data_type == "plain_text":
+        splits = chunk_plain_text(content.get("content", ""))
+    elif data_type == "code":
+        splits = chunk_code(content)
+
+    # Gán metadata chung cho tất cả chunks
+    for chunk in splits:
+        chunk_metadata = chunk.metadata if chunk.metadata is not None else {}
+        chunk_metadata.update({
+            "topic": topic, 
+            "document_id": document_id, 
+            "source": source_filename
+        })
+        chunk.metadata = chunk_metadata
+
+    ids = [make_chunk_id(topic, document_id, i) for i in range(len(splits))]
+    return list(zip(ids, splits))
+
+# --- INGEST (dùng chung cho main và scripts/benchmark.py) ---
+
+def run_ingest(json_dir: Path = JSON_OUTPUT_DIR, store_path: Path = VECTOR_STORE_DIR,
+               embedding_model=None, model_id: str | None = None,
+               embedding_cache_path: Path = EMBEDDING_CACHE_PATH) -> dict | None:
+    """
+    Ingest toàn bộ json_dir vào store_path (Chroma + manifest + BM25 + thống kê + index mmap).
+    `embedding_model` / `model_id`: mặc định model trong config (benchmark truyền model khác
+    và thư mục tạm). Trả về thống kê pipeline + thời gian từng bước.
+    Bật TRACING_ENABLED -> span từng bước chunk / embed / ghi vào TRACE_JSONL_PATH + chỉ số ra TRACE_METRICS_PATH.
+    """
+    configure_tracing()
+    with tracer.span("ingest.run", json_dir=str(json_dir)) as span:
+        stats = _run_ingest(json_dir, store_path, embedding_model, model_id, embedding_cache_path)
+        if stats is not None:
+            span.set(documents=stats["documents"], chunks=stats["chunks"])
+    if tracer.enabled:
+        tracer.flush()
+        tracer.write_metrics(TRACE_METRICS_PATH)
+        print(f"Tracing: {tracer.jsonl_path}, chỉ số: {TRACE_METRICS_PATH}")
+    return stats
+
+
+def _run_ingest(json_dir: Path, store_path: Path, embedding_model, model_id: str | None,
+                embedding_cache_path: Path) -> dict | None:
+    if not json_dir.exists():
+        print(f"Thư mục JSON {json_dir} không tồn tại. Hãy chạy run_parser.py trước.")
+        return None
+    started = time.perf_counter()
+    model_id = model_id or embedding_model_id()
 
     print("Đang tải model embedding...")
-    embeddings = get_embedding_model()
+    # Bọc model bằng cache: chunk không đổi sẽ dùng lại vector đã lưu
+    embedding_cache = EmbeddingCache(embedding_cache_path)
+    embeddings = CachedEmbeddings(embedding_model or get_embedding_model(), embedding_cache, model_id)
     
     print("Khởi tạo Chroma Vector Store...")
-    store_path = VECTOR_STORE_DIR / "global"
+    # Cùng wrapper với phía đọc (utils._load_vector_store); chromadb tự lưu xuống đĩa, không cần persist()
+    from langchain_chroma import Chroma
+    # Cùng thư mục mà chatbot đọc (trước đây ghi nhầm vào VECTOR_STORE_DIR / "global")
     store_path.mkdir(parents=True, exist_ok=True)
+    legacy_path = store_path / "global"
+    if legacy_path.exists():
+        print(f"LOG: Bỏ qua store cũ tại {legacy_path} (đường dẫn lồng nhầm), có thể xoá thư mục này.")
     vectorstore = Chroma(
         persist_directory=str(store_path),
         embedding_function=embeddings
     )
 
-    # Lấy metadata cũ để check trùng lặp
-    existing_metadatas = []
-    try:
-        existing_metadatas = vectorstore.get()["metadatas"]
-    except Exception:
-        pass
-
-    def is_duplicate(topic, doc_id):
-        return any(
-            meta.get("topic") == topic and meta.get("document_id") == doc_id
-            for meta in existing_metadatas
-        )
+    # Manifest: (topic, document_id) -> chunk IDs + hash nguồn + hash cấu hình chunk
+    manifest = IngestManifest(store_path / INGEST_MANIFEST_NAME)
+    cfg_hash = config_hash(CHUNK_SIZE, CHUNK_OVERLAP, model_id)
+    # Index từ khoá BM25, ghi cùng lúc với Chroma
+    lexical_index = LexicalIndex(store_path / LEXICAL_INDEX_NAME)
+    # Thống kê theo topic/document/giá trị cột, cập nhật theo từng document
+    facet_stats = FacetStats(store_path / FACET_STATS_NAME, FACET_COLUMNS, TOPIC_ALIASES)
+    seen_documents = set()
+    pending_hashes = {}  # (topic, document_id) -> hash file JSON đang ingest
 
-    print(f"Quét thư mục JSON: {JSON_OUTPUT_DIR}")
-    
-    for json_path in JSON_OUTPUT_DIR.glob("**/*.json"):
-        if not json_path.is_file():
+    def delete_chunks(topic, doc_id):
+        old_ids = manifest.chunk_ids(topic, doc_id)
+        if old_ids:
+            vectorstore.delete(ids=old_ids)
+        elif manifest.get(topic, doc_id) is None:
+            # Store cũ (trước khi có manifest): chunk mang ID ngẫu nhiên -> xoá theo metadata
+            vectorstore._collection.delete(where={"$and": [
+                {"topic": topic}, {"document_id": doc_id}
+            ]})
+        lexical_index.delete_document(topic, doc_id)
+
+    print(f"Quét thư mục JSON: {json_dir}")
+
+    # --- Bước quét: chỉ hash file, bỏ qua document không đổi ---
+    tasks = []
+    for json_path, topic, document_id in iter_json_documents(json_dir):
+        seen_documents.add((topic, document_id))
+
+        # --- BỎ QUA NẾU KHÔNG ĐỔI (so hash file JSON + cấu hình chunk) ---
+        source_hash = file_hash(json_path)
+        if (manifest.is_unchanged(topic, document_id, source_hash, cfg_hash)
+                and lexical_index.has_document(topic, document_id)
+                and facet_stats.has_document(topic, document_id)):
+            print(f"Bỏ qua (không đổi): {json_path.name}")
             continue
-        
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            source_filename = data.get("source_filename", "unknown")
-            data_type = data.get("data_type", "unknown")
-            content = data.get("content")
-
-            # --- Thông tin metadata từ đường dẫn file JSON ---
-            relative_path = json_path.relative_to(JSON_OUTPUT_DIR)
-            topic = str(relative_path.parent)
-            if topic == ".": topic = "general"
-            # Lấy tên file gốc (BaoCao.pdf -> BaoCao)
-            document_id = relative_path.name.split('.')[0] 
-
-            print(f"Processing JSON: {json_path.name} (topic: {topic}, id: {document_id})")
-
-            # --- CHECK TRÙNG LẶP (Logic cũ của anh) ---
-            if is_duplicate(topic, document_id):
-                print(f"🧹 Xoá dữ liệu cũ: topic='{topic}', id='{document_id}'")
-                vectorstore._collection.delete(where={"topic": topic, "document_id": document_id})
-
-            if not content:
-                print("  Bỏ qua (không có content).")
-                continue
-
-            # --- CHUNKING ROUTER (Dựa trên data_type) ---
-            splits = []
-            if data_type == "unstructured_doc":
-                splits = chunk_unstructured_elements(content)
-            elif data_type == "table_rows":
-                splits = chunk_table_rows(content)
-            elif data_type == "plain_text":
-                splits = chunk_plain_text(content.get("content", ""))
-            elif data_type == "code":
-                splits = chunk_code(content)
-            
-            if not splits:
-                print("  Không tạo được chunk nào.")
-                continue
-
-            # Gán metadata chung cho tất cả chunks
-            for chunk in splits:
-                chunk_metadata = chunk.metadata if chunk.metadata is not None else {}
-                chunk_metadata.update({
-                    "topic": topic, 
-                    "document_id": document_id, 
-                    "source": source_filename
-                })
-                chunk.metadata = chunk_metadata
-
-            # Thêm vào vector store
-            vectorstore.add_documents(splits)
-            print(f"  -> Cập nhật xong: {len(splits)} chunks.")
 
+        if manifest.get(topic, document_id) is None:
+            # Xoá chunk kiểu cũ TRƯỚC khi ghi chunk mới (cùng metadata)
+            delete_chunks(topic, document_id)
+        pending_hashes[(topic, document_id)] = source_hash
+        tasks.append((json_path, topic, document_id))
+
+    def prepare(task):
+        """Tầng 1 của pipeline: đọc JSON -> chunk -> gán metadata + ID"""
+        json_path, topic, document_id = task
+        print(f"Processing JSON: {json_path.name} (topic: {topic}, id: {document_id})")
+        # File bảng: chunk dần trong lúc pipeline embed/ghi
+        try:
+            return (topic, document_id), chunk_json_file(json_path, topic, document_id)
         except Exception as e:
             print(f"  LỖI khi xử lý JSON {json_path.name}: {e}")
+            return None
 
-    vectorstore.persist()
+    def on_document_done(doc_key, new_ids):
+        """Chạy trên thread writer khi mọi chunk của document đã ghi xong"""
+        topic, document_id = doc_key
+        stale_ids = sorted(set(manifest.chunk_ids(topic, document_id)) - set(new_ids))
+        if stale_ids:
+            print(f"🧹 Xoá {len(stale_ids)} chunk cũ: topic='{topic}', id='{document_id}'")
+            vectorstore.delete(ids=stale_ids)
+            lexical_index.delete(stale_ids)
+        if new_ids:
+            manifest.record(topic, document_id, pending_hashes[doc_key], cfg_hash, new_ids)
+            facet_stats.commit_document(topic, document_id)
+            print(f"  -> Cập nhật xong {topic}/{document_id}: {len(new_ids)} chunks.")
+        else:
+            manifest.remove(topic, document_id)
+            facet_stats.remove_document(topic, document_id)
+            print(f"  Không tạo được chunk nào: {topic}/{document_id}")
+
+    def on_document_failed(doc_key):
+        facet_stats.discard_document(*doc_key)
+        # Không ghi manifest -> lần chạy sau sẽ ingest lại document này
+        print(f"  LỖI: ingest không trọn vẹn {doc_key[0]}/{doc_key[1]}, sẽ thử lại lần sau.")
+
+    pipeline = IngestPipeline(
+        embeddings=embeddings,
+        collection=vectorstore._collection,
+        batch_size=INGEST_EMBED_BATCH_SIZE,
+        embed_workers=INGEST_EMBED_WORKERS,
+        chunk_workers=INGEST_CHUNK_WORKERS,
+        queue_size=INGEST_QUEUE_SIZE,
+        sinks=[lexical_index, facet_stats],
+        on_document_done=on_document_done,
+        on_document_failed=on_document_failed,
+    )
+    stats = pipeline.run(tasks, prepare)
+    print(
+        f"Pipeline: {stats['documents']} document, {stats['chunks']} chunks, "
+        f"{stats['batches']} lô embed, {stats['failed_documents']} lỗi, {stats['seconds']}s"
+    )
+
+    # --- File JSON đã bị xoá khỏi ổ đĩa -> gỡ chunk tương ứng ---
+    for topic, document_id in manifest.documents():
+        if (topic, document_id) not in seen_documents:
+            print(f"🧹 Gỡ document không còn tồn tại: topic='{topic}', id='{document_id}'")
+            delete_chunks(topic, document_id)
+            manifest.remove(topic, document_id)
+            facet_stats.remove_document(topic, document_id)
+
+    print(f"Index BM25: {lexical_index.count()} chunks.")
+    export_seconds = 0.0
+    if VECTOR_INDEX_EXPORT:
+        export_start = time.perf_counter()
+        with tracer.span("ingest.export"):
+            export_vector_index(vectorstore._collection, store_path / VECTOR_INDEX_NAME, model_id)
+        export_seconds = time.perf_counter() - export_start
+    facet_stats.save()
+    print(f"Thống kê theo topic: {facet_stats.topics()}")
+    manifest.close()
+    lexical_index.close()
+    embedding_cache.close()
     print(f"\nĐã lưu vectorstore tổng hợp tại: {store_path}")
-    print("\n🎉 HOÀN TẤT GIAI ĐOẠN 2: INGEST VECTOR STORE")
+    print(f"Embedding cache: {embeddings.hits} chunk dùng lại, {embeddings.misses} chunk embed mới.")
+    return {
+        **stats,
+        "skipped_documents": len(seen_documents) - len(tasks),
+        "embedding_cache_hits": embeddings.hits,
+        "embedding_cache_misses": embeddings.misses,
+        "export_seconds": round(export_seconds, 3),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+    }
+
+# --- HÀM MAIN CỦA GIAI ĐOẠN 2 ---
+
+def main():
+    print("--- BẮT ĐẦU GIAI ĐOẠN 2: INGEST JSON VÀO VECTOR STORE ---")
+    if run_ingest() is not None:
+        print("\n🎉 HOÀN TẤT GIAI ĐOẠN 2: INGEST VECTOR STORE")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,15 +4,25 @@
 import os
 import sys
 import json
+import time
+import argparse
 from pathlib import Path
 
 # --- Setup Paths ---
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
-from config import SOURCE_DOCS_DIR, JSON_OUTPUT_DIR
+from config import (
+    SOURCE_DOCS_DIR, JSON_OUTPUT_DIR, PARSE_STREAM_BLOCK_ROWS, TABLE_OUTPUT_FORMAT,
+    PARSE_WORKERS, PARSE_TIMEOUT_SECONDS, PARSE_MAX_MEMORY_MB, PARSE_REPORT_PATH,
+    TRACE_METRICS_PATH,
+)
 # Import thư viện parser mới của chúng ta
 from src.chatbot.core import document_processing as parser
+from src.chatbot.core.parse_pool import run_pool
+from src.chatbot.core import table_store
+from src.chatbot.core.tracing import tracer
+from src.chatbot.core.utils import configure_tracing
 
 # --- Định nghĩa các loại file ---
 CODE_EXTENSIONS = {".py", ".js", ".java", ".md", ".html", ".css"}
@@ -21,25 +31,184 @@ TXT_EXTENSIONS = {".txt"}
 CSV_EXTENSIONS = {".csv"}
 XLSX_EXTENSIONS = {".xlsx"}
 STRUCTURED_TEXT_EXTENSIONS = {".dat"} # file data xe của anh
+# File bảng: đọc stream theo block -> ghi Parquet (dạng cột, có kiểu)
+# hoặc JSONL (dòng 1: header, mỗi dòng sau: 1 hàng) nếu không có pyarrow
+TABLE_EXTENSIONS = CSV_EXTENSIONS | XLSX_EXTENSIONS | STRUCTURED_TEXT_EXTENSIONS
+if TABLE_OUTPUT_FORMAT == "parquet" and not table_store.is_available():
+    print("LOG: Chưa cài pyarrow -> dữ liệu bảng sẽ ghi ra JSONL.")
+    TABLE_OUTPUT_SUFFIX = ".jsonl"
+else:
+    TABLE_OUTPUT_SUFFIX = f".{TABLE_OUTPUT_FORMAT}"
+OUTPUT_SUFFIXES = (".json", ".jsonl", ".parquet")
+SUPPORTED_EXTENSIONS = (
+    CODE_EXTENSIONS | DOC_EXTENSIONS | TXT_EXTENSIONS | CSV_EXTENSIONS
+    | XLSX_EXTENSIONS | STRUCTURED_TEXT_EXTENSIONS
+)
 
-def main():
-    print("--- BẮT ĐẦU GIAI ĐOẠN 1: PARSE FILES SANG JSON ---")
-    JSON_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+def json_output_path_for(file_path: Path, source_dir: Path = SOURCE_DOCS_DIR,
+                         output_dir: Path = JSON_OUTPUT_DIR) -> Path:
+    # data/source_docs/folder/file.pdf -> data/json_output/folder/file.json
+    # data/source_docs/folder/file.xlsx -> data/json_output/folder/file.parquet
+    relative_path = file_path.relative_to(source_dir)
+    suffix = TABLE_OUTPUT_SUFFIX if file_path.suffix.lower() in TABLE_EXTENSIONS else ".json"
+    return output_dir / relative_path.with_suffix(suffix)
+
+
+def _remove_stale_sibling(json_output_path: Path) -> None:
+    """Đổi định dạng output (.json / .jsonl / .parquet) -> xoá file cũ để không ingest trùng"""
+    for other in OUTPUT_SUFFIXES:
+        stale = json_output_path.with_suffix(other)
+        if other != json_output_path.suffix and stale.exists():
+            stale.unlink()
+
+
+def write_table_jsonl(file_path: Path, json_output_path: Path, blocks) -> int:
+    """
+    Ghi dữ liệu bảng theo từng block ra JSONL (ghi vào file tạm rồi rename,
+    nên Giai đoạn 2 không bao giờ thấy file ghi dở). Trả về số hàng đã ghi.
+    """
+    tmp_path = json_output_path.with_suffix(".jsonl.tmp")
+    row_count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        header_written = False
+        for columns, rows in blocks:
+            if not header_written:
+                header = {
+                    "source_path": str(file_path),
+                    "source_filename": file_path.name,
+                    "data_type": "table_rows",
+                    "format": "jsonl",
+                    "columns": columns,
+                }
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                header_written = True
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            row_count += len(rows)
+    if row_count == 0:
+        tmp_path.unlink()
+        return 0
+    os.replace(tmp_path, json_output_path)
+    return row_count
+
+
+def write_table_parquet(file_path: Path, json_output_path: Path, open_blocks) -> int:
+    """
+    Ghi dữ liệu bảng ra Parquet. Kiểu cột suy ra từ block đầu; nếu block sau
+    không khớp (ví dụ cột số xuất hiện chữ) thì đọc lại file với cột đó ép về string.
+    """
+    metadata = {
+        "source_path": str(file_path),
+        "source_filename": file_path.name,
+        "data_type": "table_rows",
+    }
+    string_columns = set()
+    while True:
+        try:
+            return table_store.write_parquet(json_output_path, open_blocks(), metadata, string_columns)
+        except table_store.SchemaConflict as e:
+            print(f"  {e} -> ghi lại với cột '{e.column}' dạng string")
+            string_columns.add(e.column)
+
+
+def convert_file(file_path: Path, json_output_path: Path | None = None) -> dict:
+    """
+    Parse 1 file gốc và lưu ra JSON/JSONL. Chạy được trong process con (run_pool).
+    `json_output_path`: mặc định theo json_output_path_for (benchmark ghi ra thư mục tạm).
+    Trả về {"data_type", "saved"} (+ "rows" với file bảng); lỗi parse sẽ raise ra ngoài.
+    """
+    json_output_path = json_output_path or json_output_path_for(file_path)
+    try:
+        with tracer.span("ingest.parse", file=file_path.name) as span:
+            result = _convert_file(file_path, json_output_path)
+            span.set(**result)
+            if tracer.enabled:
+                span.set(input_bytes=file_path.stat().st_size,
+                         output_bytes=json_output_path.stat().st_size if json_output_path.exists() else 0)
+    finally:
+        # Process con của run_pool thoát bằng os._exit (không chạy atexit) -> ghi span ngay
+        tracer.flush()
+    return result
+
+
+def _convert_file(file_path: Path, json_output_path: Path) -> dict:
+    ext = file_path.suffix.lower()
+    json_output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"Processing: {file_path.name}")
+    parsed_data = None
+    data_type = "unknown" # Dùng để báo cho Giai đoạn 2 biết cách chunk
+
+    # --- LOGIC ĐỊNH TUYẾN (ROUTING) ---
+    if ext in DOC_EXTENSIONS:
+        data_type = "unstructured_doc" # PDF, DOCX
+        if ext == ".pdf":
+            parsed_data = parser.parse_pdf(file_path)
+        elif ext == ".docx":
+            parsed_data = parser.parse_docx(file_path)
     
-    processed_files = 0
+    elif ext in TXT_EXTENSIONS:
+        data_type = "plain_text"
+        parsed_data = parser.parse_text(file_path)
+    
+    elif ext in CODE_EXTENSIONS:
+        data_type = "code"
+        parsed_data = parser.parse_code(file_path)
+    
+    elif ext in TABLE_EXTENSIONS:
+        data_type = "table_rows" # Dữ liệu dạng hàng -> stream ra Parquet/JSONL
+        if ext in CSV_EXTENSIONS:
+            iter_blocks = parser.iter_csv_blocks
+        elif ext in XLSX_EXTENSIONS:
+            iter_blocks = parser.iter_excel_blocks
+        else:
+            iter_blocks = parser.iter_structured_text_blocks
+
+        def open_blocks():
+            return iter_blocks(file_path, PARSE_STREAM_BLOCK_ROWS)
+
+        if json_output_path.suffix == ".parquet":
+            row_count = write_table_parquet(file_path, json_output_path, open_blocks)
+        else:
+            row_count = write_table_jsonl(file_path, json_output_path, open_blocks())
+        if row_count:
+            _remove_stale_sibling(json_output_path)
+            print(f"  -> Saved {json_output_path.name} ({row_count} hàng)")
+        return {"data_type": data_type, "saved": row_count > 0, "rows": row_count}
+
+    # --- Lưu file JSON ---
+    if not parsed_data:
+        return {"data_type": data_type, "saved": False}
+
+    # Gói dữ liệu vào một object chuẩn
+    output_json = {
+        "source_path": str(file_path),
+        "source_filename": file_path.name,
+        "data_type": data_type, # Rất quan trọng cho Giai đoạn 2
+        "content": parsed_data
+    }
+    
+    with open(json_output_path, 'w', encoding='utf-8') as f:
+        json.dump(output_json, f, ensure_ascii=False, indent=2)
+    _remove_stale_sibling(json_output_path)
+    print(f"  -> Saved JSON: {json_output_path.name}")
+    return {"data_type": data_type, "saved": True}
+
+
+def collect_files() -> list[Path]:
+    """Danh sách file cần parse (bỏ qua ext không hỗ trợ và file JSON đã mới hơn file gốc)"""
+    files = []
     for file_path in SOURCE_DOCS_DIR.glob("**/*"):
         if not file_path.is_file():
             continue
-        
-        ext = file_path.suffix.lower()
-        
-        # --- Xác định đường dẫn output ---
-        # data/source_docs/folder/file.pdf -> data/json_output/folder/file.pdf.json
-        relative_path = file_path.relative_to(SOURCE_DOCS_DIR)
-        json_output_path = JSON_OUTPUT_DIR / relative_path.with_suffix(".json")
-        json_output_path.parent.mkdir(parents=True, exist_ok=True)
-        
+
+        if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            print(f"  Bỏ qua (không hỗ trợ ext): {file_path.name}")
+            continue
+
         # --- Logic: Bỏ qua nếu file JSON đã tồn tại và mới hơn file gốc ---
+        json_output_path = json_output_path_for(file_path)
         if json_output_path.exists():
             json_mod_time = json_output_path.stat().st_mtime
             file_mod_time = file_path.stat().st_mtime
@@ -47,61 +216,99 @@ def main():
                 # print(f"  Skipping (JSON is up-to-date): {file_path.name}")
                 continue
 
-        print(f"Processing: {file_path.name}")
-        parsed_data = None
-        data_type = "unknown" # Dùng để báo cho Giai đoạn 2 biết cách chunk
+        files.append(file_path)
+    return files
+
 
+def run_sequential(files: list[Path]):
+    """Chế độ cũ: parse lần lượt trong cùng process (dễ debug, không có timeout)"""
+    for file_path in files:
+        start = time.perf_counter()
         try:
-            # --- LOGIC ĐỊNH TUYẾN (ROUTING) ---
-            if ext in DOC_EXTENSIONS:
-                data_type = "unstructured_doc" # PDF, DOCX
-                if ext == ".pdf":
-                    parsed_data = parser.parse_pdf(file_path)
-                elif ext == ".docx":
-                    parsed_data = parser.parse_docx(file_path)
-            
-            elif ext in TXT_EXTENSIONS:
-                data_type = "plain_text"
-                parsed_data = parser.parse_text(file_path)
-            
-            elif ext in CODE_EXTENSIONS:
-                data_type = "code"
-                parsed_data = parser.parse_code(file_path)
-            
-            elif ext in CSV_EXTENSIONS:
-                data_type = "table_rows" # Dữ liệu dạng hàng
-                parsed_data = parser.parse_csv(file_path)
-            
-            elif ext in STRUCTURED_TEXT_EXTENSIONS:
-                data_type = "table_rows" # Dữ liệu dạng hàng
-                parsed_data = parser.parse_structured_text(file_path)
-            elif ext in XLSX_EXTENSIONS:
-                data_type = "table_rows" # Dữ liệu dạng hàng
-                parsed_data = parser.parse_excel(file_path)
-            
-            else:
-                print(f"  Bỏ qua (không hỗ trợ ext): {file_path.name}")
-                continue
+            result = convert_file(file_path)
+            yield {"item": file_path, "status": "ok", "result": result, "error": None,
+                   "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            yield {"item": file_path, "status": "error", "result": None, "error": str(e),
+                   "seconds": round(time.perf_counter() - start, 3)}
 
-            # --- Lưu file JSON ---
-            if parsed_data:
-                # Gói dữ liệu vào một object chuẩn
-                output_json = {
-                    "source_path": str(file_path),
-                    "source_filename": file_path.name,
-                    "data_type": data_type, # Rất quan trọng cho Giai đoạn 2
-                    "content": parsed_data
-                }
-                
-                with open(json_output_path, 'w', encoding='utf-8') as f:
-                    json.dump(output_json, f, ensure_ascii=False, indent=2)
+
+def write_report(records: list[dict], workers: int, wall_seconds: float) -> None:
+    """Báo cáo cuối lượt chạy: thời gian parse từng file (chậm nhất lên đầu)"""
+    files = sorted(
+        (
+            {
+                "file": str(rec["item"].relative_to(SOURCE_DOCS_DIR)),
+                "status": rec["status"],
+                "seconds": rec["seconds"],
+                "data_type": (rec["result"] or {}).get("data_type"),
+                "error": rec["error"],
+            }
+            for rec in records
+        ),
+        key=lambda r: r["seconds"],
+        reverse=True,
+    )
+    status_counts = {}
+    for r in files:
+        status_counts[r["status"]] = status_counts.get(r["status"], 0) + 1
+
+    report = {
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 3),
+        "parse_seconds_total": round(sum(r["seconds"] for r in files), 3),
+        "status_counts": status_counts,
+        "files": files,
+    }
+    PARSE_REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(PARSE_REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\nBáo cáo parse: {PARSE_REPORT_PATH}")
+    for r in files[:5]:
+        print(f"  {r['seconds']:>8.2f}s  [{r['status']}] {r['file']}")
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Giai đoạn 1: parse file gốc sang JSON")
+    cli.add_argument("--workers", type=int, default=PARSE_WORKERS,
+                     help="Số process parse song song (1 = chạy tuần tự trong process hiện tại)")
+    cli.add_argument("--timeout", type=float, default=PARSE_TIMEOUT_SECONDS,
+                     help="Thời gian tối đa (giây) cho mỗi file")
+    cli.add_argument("--max-memory-mb", type=int, default=PARSE_MAX_MEMORY_MB,
+                     help="Giới hạn RAM cho mỗi process parse (chỉ Unix)")
+    args = cli.parse_args(argv)
+
+    print("--- BẮT ĐẦU GIAI ĐOẠN 1: PARSE FILES SANG JSON ---")
+    # Bật trước khi tạo process con (fork) -> process con ghi span parse vào cùng file JSONL
+    configure_tracing()
+    JSON_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    files = collect_files()
+    start = time.perf_counter()
+    if args.workers <= 1:
+        results = run_sequential(files)
+    else:
+        print(f"Parse {len(files)} file trên {args.workers} process "
+              f"(timeout {args.timeout}s, RAM {args.max_memory_mb}MB/process)")
+        results = run_pool(convert_file, files, args.workers, args.timeout, args.max_memory_mb)
+
+    records = []
+    processed_files = 0
+    for rec in results:
+        records.append(rec)
+        if rec["status"] == "ok":
+            if rec["result"]["saved"]:
                 processed_files += 1
-                print(f"  -> Saved JSON: {json_output_path.name}")
+        else:
+            print(f"  LỖI khi xử lý {rec['item'].name} [{rec['status']}]: {rec['error']}")
 
-        except Exception as e:
-            print(f"  LỖI khi xử lý {file_path.name}: {e}")
-    
+    write_report(records, args.workers, time.perf_counter() - start)
+    if tracer.enabled:
+        # Chỉ số của process này (span parse của process con nằm trong file JSONL)
+        tracer.write_metrics(TRACE_METRICS_PATH)
     print(f"\n--- HOÀN TẤT GIAI ĐOẠN 1: Đã xử lý {processed_files} file mới. ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
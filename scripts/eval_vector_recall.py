@@ -0,0 +1,119 @@
+# eval_vector_recall.py
+# (Đánh giá lưu vector nén int8: recall@k so với float32, tốc độ quét, dung lượng RAM)
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# --- Setup Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import VECTOR_STORE_DIR, VECTOR_INDEX_NAME, VECTOR_INDEX_RESCORE_FACTOR, VECTOR_RECALL_REPORT_PATH
+from src.chatbot.core.vector_index import MmapVectorIndex, STORAGE_TYPES, quantize, approx_scores
+from src.chatbot.core.vector_index import rescored_search, top_k
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Vector giả lập có cụm (giống embedding thật hơn nhiễu đều), đã chuẩn hoá L2"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Câu hỏi giả lập: lấy ngẫu nhiên vector trong kho rồi thêm nhiễu (câu hỏi gần nhưng không trùng chunk)"""
+    rng = np.random.default_rng(seed + 1)
+    base = np.asarray(vectors[rng.integers(0, len(vectors), count)], dtype=np.float32)
+    queries = base + noise * rng.normal(size=base.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, k: int, rescore_factor: int) -> list[dict]:
+    exact = [set(top_k(vectors @ q, k).tolist()) for q in queries]
+
+    start = time.perf_counter()
+    for q in queries:
+        top_k(vectors @ q, k)
+    results = [{
+        "storage": "float32", "rescore_k": 0, "recall": 1.0,
+        "ms_per_query": round((time.perf_counter() - start) / len(queries) * 1000, 3),
+        "scan_mb": round(vectors.nbytes / 1e6, 2),
+    }]
+
+    for storage in STORAGE_TYPES:
+        if storage == "float32":
+            continue
+        codes, scales = quantize(vectors, storage)
+        scan_mb = (codes.nbytes + (scales.nbytes if scales is not None else 0)) / 1e6
+        # rescore_k = 0: chỉ dùng điểm gần đúng (không chấm lại) để thấy phần chấm lại đóng góp bao nhiêu
+        for rescore_k in (0, k * rescore_factor):
+            start = time.perf_counter()
+            found = []
+            for q in queries:
+                if rescore_k:
+                    rows = [row for row, _ in rescored_search(vectors, codes, scales, q, k, rescore_k)]
+                else:
+                    rows = top_k(approx_scores(codes, scales, q), k).tolist()
+                found.append(set(rows))
+            elapsed = time.perf_counter() - start
+            recall = np.mean([len(a & b) / max(len(a), 1) for a, b in zip(exact, found)])
+            results.append({
+                "storage": storage, "rescore_k": rescore_k, "recall": round(float(recall), 4),
+                "ms_per_query": round(elapsed / len(queries) * 1000, 3),
+                "scan_mb": round(scan_mb, 2),
+            })
+    return results
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Recall@k của vector nén (int8) so với float32")
+    cli.add_argument("--index-dir", type=Path, default=VECTOR_STORE_DIR / VECTOR_INDEX_NAME)
+    cli.add_argument("--synthetic", type=int, default=0,
+                     help="Dùng N vector giả lập thay vì index thật (ví dụ 200000)")
+    cli.add_argument("--dim", type=int, default=384)
+    cli.add_argument("--queries", type=int, default=200)
+    cli.add_argument("--k", type=int, default=10)
+    cli.add_argument("--rescore-factor", type=int, default=VECTOR_INDEX_RESCORE_FACTOR)
+    cli.add_argument("--seed", type=int, default=0)
+    args = cli.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_corpus(args.synthetic, args.dim, clusters=max(8, args.synthetic // 500), seed=args.seed)
+        source = f"synthetic:{args.synthetic}x{args.dim}"
+    else:
+        if not (args.index_dir / "index.json").exists():
+            print(f"Không có index tại {args.index_dir}. Chạy ingest (VECTOR_INDEX_EXPORT) hoặc dùng --synthetic N.")
+            return 1
+        index = MmapVectorIndex(args.index_dir)
+        vectors = np.asarray(index.vectors, dtype=np.float32)
+        source = str(args.index_dir)
+
+    queries = make_queries(vectors, args.queries, noise=0.5, seed=args.seed)
+    results = evaluate(vectors, queries, args.k, args.rescore_factor)
+
+    print(f"--- RECALL@{args.k}: {source} ({len(vectors)} vector, {len(queries)} câu hỏi) ---")
+    print(f"  {'kiểu lưu':<9} {'chấm lại':>8} {'recall':>8} {'ms/câu':>8} {'RAM quét (MB)':>14}")
+    for r in results:
+        print(f"  {r['storage']:<9} {r['rescore_k'] or '-':>8} {r['recall']:>8.4f} "
+              f"{r['ms_per_query']:>8.3f} {r['scan_mb']:>14.2f}")
+
+    report = {
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": source, "rows": len(vectors), "k": args.k, "queries": len(queries),
+        "results": results,
+    }
+    VECTOR_RECALL_REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(VECTOR_RECALL_REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nBáo cáo: {VECTOR_RECALL_REPORT_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# export_onnx_embedding.py
+# (Chuẩn bị model embedding ONNX int8 cho EMBEDDING_BACKEND="onnx": tải bản ONNX fp32 của MiniLM -> lượng tử hoá int8)
+
+import sys
+import shutil
+import argparse
+from pathlib import Path
+
+# --- Setup Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_FILE
+
+# File trong repo HuggingFace của model (sentence-transformers có sẵn bản ONNX fp32)
+HUB_ONNX_FILE = "onnx/model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def download_fp32(model_name: str, target_dir: Path) -> Path:
+    """Tải model.onnx (fp32) + tokenizer.json từ HuggingFace Hub vào target_dir"""
+    from huggingface_hub import hf_hub_download
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for filename in (HUB_ONNX_FILE, TOKENIZER_FILE):
+        print(f"Tải {model_name}/{filename} ...")
+        path = hf_hub_download(repo_id=model_name, filename=filename)
+        shutil.copy(path, target_dir / Path(filename).name)
+    return target_dir / Path(HUB_ONNX_FILE).name
+
+
+def quantize_int8(fp32_path: Path, int8_path: Path) -> None:
+    """Lượng tử hoá động: trọng số MatMul -> int8, activation tính lúc chạy (không cần dữ liệu hiệu chỉnh)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"Lượng tử hoá int8: {fp32_path.name} -> {int8_path.name}")
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Tạo model embedding ONNX int8 trong EMBEDDING_ONNX_DIR")
+    cli.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="Tên model trên HuggingFace Hub")
+    cli.add_argument("--out-dir", type=Path, default=EMBEDDING_ONNX_DIR)
+    cli.add_argument("--source", type=Path, default=None,
+                     help="Thư mục có sẵn model.onnx + tokenizer.json (bỏ qua bước tải)")
+    args = cli.parse_args(argv)
+
+    out_dir = args.out_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if args.source:
+        for name in ("model.onnx", TOKENIZER_FILE):
+            shutil.copy(args.source / name, out_dir / name)
+        fp32_path = out_dir / "model.onnx"
+    else:
+        fp32_path = download_fp32(args.model, out_dir)
+
+    int8_path = out_dir / EMBEDDING_ONNX_FILE
+    quantize_int8(fp32_path, int8_path)
+
+    fp32_mb = fp32_path.stat().st_size / 1e6
+    int8_mb = int8_path.stat().st_size / 1e6
+    print(f"Xong: {int8_path} ({int8_mb:.1f} MB, bản fp32 {fp32_mb:.1f} MB)")
+    print("Chạy scripts/check_embedding_parity.py để kiểm tra độ lệch so với backend torch.")
+
+
+if __name__ == "__main__":
+    main()
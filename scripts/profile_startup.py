@@ -0,0 +1,124 @@
+# profile_startup.py
+# (Báo cáo thời gian khởi động: import từng entry point trong process mới + thời gian tạo model)
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+# --- Setup Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import STARTUP_PROFILE_PATH
+
+# Module được đo (mỗi module import trong 1 process Python mới, như lúc worker / script khởi động)
+ENTRY_MODULES = [
+    "src.chatbot.core.utils",
+    "src.chatbot.core.agent",
+    "src.chatbot.api.server",
+    "scripts.convert_json",
+    "scripts.chunk_and_embedding",
+]
+# Số package import chậm nhất liệt kê cho mỗi entry point
+TOP_IMPORTS = 10
+
+# Dòng của `python -X importtime`: "import time:  self | cumulative | package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def profile_import(module: str) -> dict:
+    """Import `module` trong process mới với -X importtime; trả về tổng thời gian + các package nặng nhất"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": str(PROJECT_ROOT)},
+    )
+    wall_seconds = time.perf_counter() - start
+
+    total_ms = 0.0
+    by_package: dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        if name == module:
+            total_ms = int(cumulative_us) / 1000
+        # Cộng thời gian "self" theo package gốc (langchain_core, numpy, ...) -> biết ai nặng nhất
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + int(self_us) / 1000
+    imports = sorted(
+        ({"package": p, "self_ms": round(ms, 1)} for p, ms in by_package.items()),
+        key=lambda r: r["self_ms"], reverse=True,
+    )
+
+    error = None
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["?"])[-1]
+    return {
+        "module": module,
+        "wall_seconds": round(wall_seconds, 3),
+        "import_ms_total": round(total_ms, 1),
+        "slowest_packages": imports[:TOP_IMPORTS],
+        "error": error,
+    }
+
+
+def profile_warm_up(llm_backend: str | None) -> dict:
+    """Đo thời gian tạo model embedding / LLM client / vector store qua registry (trong process này)"""
+    from dotenv import load_dotenv
+    from src.chatbot.core.utils import warm_up, get_embedding_model
+
+    load_dotenv()
+    start = time.perf_counter()
+    timings = warm_up(llm_backend) if llm_backend else warm_up()
+    first = time.perf_counter() - start
+
+    # Lần gọi thứ 2 phải lấy lại bản đã tạo (không tải lại model)
+    start = time.perf_counter()
+    get_embedding_model()
+    again = time.perf_counter() - start
+    return {
+        "build_seconds": timings,
+        "warm_up_seconds": round(first, 3),
+        "second_get_ms": round(again * 1000, 3),
+    }
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Báo cáo thời gian import / khởi động")
+    cli.add_argument("--warm", action="store_true",
+                     help="Đo thêm thời gian tạo model embedding, LLM client, vector store")
+    cli.add_argument("--llm", choices=["gemini", "local"], default=None,
+                     help="Backend LLM khi --warm (mặc định theo LLM_BACKEND)")
+    args = cli.parse_args(argv)
+
+    report = {"finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "imports": []}
+    print("--- ĐO THỜI GIAN IMPORT (process mới cho mỗi module) ---")
+    for module in ENTRY_MODULES:
+        result = profile_import(module)
+        report["imports"].append(result)
+        status = f"LỖI: {result['error']}" if result["error"] else ""
+        print(f"  {result['wall_seconds']:>7.2f}s  {module} {status}")
+        for r in result["slowest_packages"][:3]:
+            print(f"           {r['self_ms']:>9.1f} ms  {r['package']}")
+
+    if args.warm:
+        print("--- ĐO THỜI GIAN TẠO MODEL (registry) ---")
+        report["warm_up"] = profile_warm_up(args.llm)
+        print(f"  {report['warm_up']}")
+
+    STARTUP_PROFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(STARTUP_PROFILE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nBáo cáo khởi động: {STARTUP_PROFILE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
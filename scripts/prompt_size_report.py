@@ -0,0 +1,139 @@
+# prompt_size_report.py
+# (Báo cáo kích thước prompt: render REPHRASE_PROMPT / ANSWER_PROMPT với dữ liệu mẫu,
+#  in số token từng phần (hướng dẫn, ngữ cảnh, lịch sử, câu hỏi) theo số chunk k)
+
+import sys
+import argparse
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+# --- Setup Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import (
+    VECTOR_STORE_DIR, LEXICAL_INDEX_NAME, RETRIEVER_SEARCH_K, CHUNK_SIZE, SESSION_CHARS_PER_TOKEN,
+)
+from src.chatbot.core.prompts import REPHRASE_PROMPT, ANSWER_PROMPT
+from src.chatbot.core.session_store import estimate_tokens
+
+# --- Dữ liệu mẫu ---
+SAMPLE_QUESTION = "Toyota Aqua 2018 ở Osaka giá bao nhiêu, có tiết kiệm xăng không?"
+SAMPLE_HISTORY = [
+    HumanMessage(content="Chào em, anh đang muốn tìm một chiếc xe cũ để đi làm trong thành phố."),
+    AIMessage(content="Dạ chào anh, em là Nhi. Anh dự định tầm tài chính khoảng bao nhiêu ạ?"),
+    HumanMessage(content="Khoảng 1 triệu yên, ưu tiên tiết kiệm nhiên liệu."),
+    AIMessage(content="Dạ, với tầm giá đó mình có thể tham khảo các dòng hybrid hạng nhỏ ạ."),
+]
+# Chunk giả lập khi chưa có index BM25 (chưa ingest)
+_SYNTHETIC_CHUNK = (
+    "brand: Toyota, model: Aqua, year: 2018, price_yen: 890000, mileage_km: 52000, fuel: Hybrid, "
+    "body_type: Hatchback, prefecture: Osaka, transmission: AT. "
+)
+
+
+def sample_chunks(k: int) -> tuple[list[str], str]:
+    """k chunk mẫu: lấy từ index BM25 (đúng dữ liệu thật) nếu có, không thì chunk giả lập dài CHUNK_SIZE"""
+    index_path = VECTOR_STORE_DIR / LEXICAL_INDEX_NAME
+    if index_path.exists():
+        from src.chatbot.core.lexical_index import LexicalIndex
+
+        index = LexicalIndex(index_path)
+        try:
+            docs = [doc.page_content for doc, _ in index.search(SAMPLE_QUESTION, k=k)]
+        finally:
+            index.close()
+        if len(docs) >= k:
+            return docs, str(index_path)
+    text = (_SYNTHETIC_CHUNK * (CHUNK_SIZE // len(_SYNTHETIC_CHUNK) + 1))[:CHUNK_SIZE]
+    return [text] * k, "synthetic"
+
+
+def render_context(chunks: list[str]) -> str:
+    """Giống định dạng tool retrieve_context (core/agent.py) ghép các chunk"""
+    return "\n\n".join(f"Nội dung: {chunk}" for chunk in chunks)
+
+
+class TokenCounter:
+    """Mặc định ước lượng theo số ký tự (như SessionStore); `llm`: đếm bằng model (ví dụ Gemini count_tokens)"""
+
+    def __init__(self, llm=None, chars_per_token: float = SESSION_CHARS_PER_TOKEN):
+        self.llm = llm
+        self.chars_per_token = chars_per_token
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.llm is not None:
+            return self.llm.get_num_tokens(text)
+        return estimate_tokens(HumanMessage(content=text), self.chars_per_token)
+
+
+def prompt_sections(prompt, inputs: dict, count: TokenCounter) -> dict:
+    """
+    Render prompt rồi tách token theo phần. Trong message system, ngữ cảnh được tính riêng
+    (số lần chèn x token của ngữ cảnh), phần còn lại là hướng dẫn.
+    """
+    messages = prompt.format_messages(**inputs)
+    history = inputs.get("chat_history") or []
+    context = inputs.get("context", "")
+    sections = {"instructions": 0, "context": 0, "chat_history": 0, "input": 0}
+    context_copies = 0
+    for message in messages:
+        text = message.content
+        if any(message is m for m in history):
+            sections["chat_history"] += count(text)
+        elif isinstance(message, SystemMessage):
+            context_copies = text.count(context) if context else 0
+            sections["context"] += context_copies * count(context)
+            sections["instructions"] += count(text.replace(context, "")) if context else count(text)
+        elif text == inputs.get("input"):
+            sections["input"] += count(text)
+        else:
+            sections["instructions"] += count(text)
+    sections["total"] = sum(sections.values())
+    sections["context_copies"] = context_copies
+    return sections
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Số token từng phần của REPHRASE_PROMPT / ANSWER_PROMPT")
+    cli.add_argument("--k", type=int, nargs="+",
+                     default=sorted({1, RETRIEVER_SEARCH_K, RETRIEVER_SEARCH_K * 2}),
+                     help="Số chunk ngữ cảnh (mặc định 1, RETRIEVER_SEARCH_K, 2 x RETRIEVER_SEARCH_K)")
+    cli.add_argument("--llm", action="store_true",
+                     help="Đếm token bằng LLM trong config (gọi API) thay vì ước lượng theo ký tự")
+    args = cli.parse_args(argv)
+
+    llm = None
+    if args.llm:
+        from src.chatbot.core.utils import get_llm
+        llm = get_llm()
+    count = TokenCounter(llm)
+    unit = "token (LLM)" if llm is not None else f"token (ước lượng ~{SESSION_CHARS_PER_TOKEN:g} ký tự / token)"
+
+    print(f"--- PROMPT SIZE: {unit} ---")
+    rephrase = prompt_sections(
+        REPHRASE_PROMPT, {"chat_history": SAMPLE_HISTORY, "input": SAMPLE_QUESTION}, count
+    )
+    print("\nREPHRASE_PROMPT")
+    for name in ("instructions", "chat_history", "input", "total"):
+        print(f"  {name:<13} {rephrase[name]:>7}")
+
+    chunks, source = sample_chunks(max(args.k))
+    print(f"\nANSWER_PROMPT (chunk mẫu: {source})")
+    print(f"  {'k':>3} {'hướng dẫn':>10} {'ngữ cảnh':>9} {'lần chèn':>9} {'lịch sử':>8} {'câu hỏi':>8} {'tổng':>7}")
+    for k in sorted(args.k):
+        row = prompt_sections(ANSWER_PROMPT, {
+            "context": render_context(chunks[:k]),
+            "chat_history": SAMPLE_HISTORY,
+            "input": SAMPLE_QUESTION,
+        }, count)
+        print(f"  {k:>3} {row['instructions']:>10} {row['context']:>9} {row['context_copies']:>9} "
+              f"{row['chat_history']:>8} {row['input']:>8} {row['total']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
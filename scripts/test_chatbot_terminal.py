@@ -2,198 +2,59 @@ from dotenv import load_dotenv
 import os
 import sys
 from pathlib import Path
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_chroma import Chroma
-from langchain.tools import tool
-from langchain.agents import create_agent
 from langchain_core.messages import HumanMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 # --- Thêm Path ---
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from src.chatbot.core.utils import get_embedding_model, get_llm
-from config import VECTOR_STORE_DIR
+from config import CHAT_STREAMING, PERSONA_PROMPTS_ENABLED, SPECULATIVE_RETRIEVAL_ENABLED
+from src.chatbot.core.agent import load_resources, build_agent, build_persona_router, clean_response
+from src.chatbot.core.agent import build_speculative_retriever
+from src.chatbot.core.streaming import stream_turn
+from src.chatbot.core.utils import get_session_store, warm_up
+from src.chatbot.core.registry import registry
+from src.chatbot.core.tracing import tracer
 
 # --- 1. Tải các ---
 load_dotenv()
 os.environ["LANGSMITH_TRACING"] = "false"
 
-print("LOG: Đang tải model embedding...")
-embeddings = get_embedding_model()
-print("LOG: Tải model embedding thành công.")
-
-print("LOG: Đang tải model Gemini từ LangChain...")
-model_llm = get_llm()
-print("LOG: Tải model Gemini thành công.")
-
-print(f"LOG: Đang tải Vector Store từ: {VECTOR_STORE_DIR}")
-vector_store = Chroma(
-    persist_directory=str(VECTOR_STORE_DIR),
-    embedding_function=embeddings
-)
-print("LOG: Tải Vector Store thành công.")
-
-# --- 2. Định nghĩa Tools ---
-
-@tool
-def retrieve_context(query: str) -> str:
-    """
-    Dùng khi người dùng hỏi thông tin cụ thể (xe, trường, thủ tục đổi bằng...).
-    """
-    print(f"\n[DEBUG] Tool retrieve_context đang tìm: '{query}'")
-    retrieved_docs = vector_store.similarity_search(query, k=3)
-
-    if not retrieved_docs:
-        return "Không tìm thấy thông tin nào khớp với truy vấn."
-
-    docs_content = "\n\n".join(
-        f"Nội dung: {doc.page_content}"
-        for doc in retrieved_docs
-    )
-    return clean_response(docs_content)
-
-
-@tool
-def count_documents_by_topic(topic: str) -> str:
-    """
-    Dùng khi người dùng hỏi tổng số lượng dữ liệu (xe, trường, thủ tục...).
-    """
-    print(f"\n[DEBUG] Tool count_documents_by_topic đang đếm: '{topic}'")
-    try:
-        count = vector_store._collection.count(where={"topic": topic})
-        return f"Tìm thấy tổng cộng {count} mục thuộc chủ đề '{topic}'."
-    except Exception as e:
-        return f"Lỗi khi đếm tài liệu: {e}"
-
-
-# --- 3. System Prompt ---
-AGENT_SYSTEM_PROMPT = """
-
-Bạn là một trợ lý ảo chuyên nghiệp, đa năng, có khả năng nhập vai. Khi bắt đầu cuộc trò chuyện, bạn cần **chủ động hỏi** người dùng về chủ đề và ý định của họ để xác định và nhập vai vào chuyên gia phù hợp nhất trong 3 vai trò dưới đây.
-
-Nhiệm vụ chính của bạn là:
-1.  **Phân tích** câu hỏi của người dùng để xác định chủ đề VÀ ý định (intent).
-2.  **Lựa chọn công cụ (Tool):**
-    * Nếu ý định là TÌM KIẾM THÔNG TIN CỤ THỂ (ví dụ: "giá xe A", "thủ tục ở B"), hãy dùng tool `retrieve_context`.
-    * Nếu ý định là ĐẾM SỐ LƯỢNG (ví dụ: "có bao nhiêu xe?", "tổng cộng bao nhiêu trường?"), hãy dùng tool `count_documents_by_topic`.
-3.  **Nhập vai** chính xác vào 1 trong 3 vai trò chuyên gia, thể hiện đúng **khí chất, kinh nghiệm và mục tiêu "chốt"** của vai trò đó.
-4.  **Sử dụng** kết quả từ tool để trả lời. TUYỆT ĐỐI không bịa đặt thông tin.
-
----
-
-### VAI TRÒ 1: Chuyên gia Tư vấn Xe hơi (Tên: Nhi)
-
-**Khi nào kích hoạt:** Khi chủ đề là "xe hơi".
-
-**Persona:** Bạn là Nhi, **Giám đốc Kinh doanh với hơn 10 năm kinh nghiệm** tại các showroom lớn. Bạn thân thiện, am hiểu kỹ thuật sâu, và là bậc thầy trong việc **"đọc vị" nhu cầu** để tìm ra chiếc xe hoàn hảo. **Mục tiêu của bạn không chỉ là tư vấn mà còn là giúp khách hàng tự tin ra quyết định sở hữu chiếc xe ưng ý nhất.**
-
-**Quy trình:**
-1.  **Chẩn đoán chuyên sâu:** ĐỪNG vội giới thiệu xe. Hãy dẫn dắt cuộc trò chuyện bằng cách **hỏi từng câu một** để hiểu rõ 4-5 yếu tố VÀNG (Mục đích? Số người? Tầm tài chính? Ưu tiên hàng đầu?).
-    * *Ví dụ câu hỏi đầu tiên:* "Dạ chào anh/chị, em là Nhi. Để em tìm chiếc xe hoàn hảo nhất cho mình, anh/chị chia sẻ giúp em mục đích chính mình dùng xe là đi làm trong phố, hay thường xuyên đi tỉnh, chở gia đình dã ngoại ạ?"
-2.  **Xác nhận thông tin:** Sau mỗi 2-3 câu hỏi, hãy tóm tắt lại nhu cầu của khách. ("Dạ, như vậy là mình đang tìm một chiếc 7 chỗ, tầm tài chính 1 tỷ, ưu tiên tiết kiệm nhiên liệu, đúng không ạ?")
-3.  **Liên kết & Đề xuất:** Sau khi có đủ thông tin (4-5 câu hỏi), hãy dùng tool `retrieve_context` với các từ khóa đã chẩn đoán (ví dụ: "xe 7 chỗ 1 tỷ tiết kiệm nhiên liệu") để tìm 1-2 mẫu xe phù hợp nhất và đề xuất.
-4.  **Giải quyết câu hỏi phụ:**
-    * **Đếm số lượng:** Nếu khách hỏi "Bạn có bao nhiêu xe?", dùng tool `count_documents_by_topic` với `topic="cars_data"`.
-    * **So sánh:** Nếu khách yêu cầu so sánh, hãy hỏi rõ tiêu chí rồi dùng `retrieve_context` để lấy thông tin.
-    * **Hậu mãi:** Nếu khách hỏi về bảo dưỡng, phụ tùng, hãy dùng `retrieve_context` để tìm thông tin chi tiết.
-5.  **Xử lý "Không tìm thấy":** Nếu không có xe chính xác theo yêu cầu, là một sale chuyên nghiệp, hãy tư vấn (pivot) sang một mẫu xe khác gần nhất trong kho dữ liệu và giải thích lý do tại sao nó vẫn phù hợp.
-6.  **Thúc đẩy "Chốt đơn":** Sau khi đề xuất xe phù hợp, hãy chủ động đưa ra lời kêu gọi hành động (Call to Action) để giúp khách hàng tiến tới bước tiếp theo.
-    * *Ví dụ:* "Với nhu cầu của mình, em thấy mẫu [Tên Xe] là lựa chọn tối ưu. Anh/chị có muốn em đặt lịch lái thử cuối tuần này để mình trải nghiệm thực tế không ạ?"
-    * *Hoặc:* "Anh/chị muốn em gửi báo giá lăn bánh chi tiết cho mẫu này tại [Tỉnh] của mình chứ ạ?"
-
----
-
-### VAI TRÒ 2: Chuyên gia Đổi Bằng Lái (Gaimen Kirikae) (Tên: Minh)
-
-**Khi nào kích hoạt:** Khi chủ đề là "đổi bằng lái".
-
-**Persona:** Bạn là Minh, **chuyên gia tư vấn Gaimen Kirikae với kinh nghiệm xử lý hàng ngàn hồ sơ**. Bạn cực kỳ tỉ mỉ, chính xác, và hiểu rõ mọi "ngóc ngách" thủ tục. **Mục tiêu của bạn là đảm bảo khách hàng chuẩn bị hồ sơ chính xác ngay từ lần đầu tiên, tiết kiệm tối đa thời gian và chi phí đi lại.**
-
-**Quy trình:**
-1.  **Xác định 2 Yếu tố:** Quy trình đổi bằng phụ thuộc vào 2 điều: **Tỉnh/Thành phố (Prefecture)** và **Quốc tịch (Nationality)** của bằng lái gốc. Nếu người dùng chưa cung cấp, hãy hỏi (hỏi 1 câu gộp):
-    * "Dạ, em là Minh, chuyên gia về thủ tục đổi bằng. Để em tra cứu chính xác, anh/chị đang ở tỉnh nào và bằng lái gốc của mình là của nước nào (ví dụ: Việt Nam, Mỹ) ạ?"
-2.  **Tra cứu:** Dùng tool `retrieve_context` với truy vấn là Tỉnh và Quốc tịch (ví dụ: "đổi bằng lái Việt Nam tại Osaka").
-3.  **Trích xuất Thông tin:** Trả lời thẳng vào vấn đề dựa trên kết quả từ tool (Địa điểm, Hồ sơ, Chi phí, Quy trình).
-4.  **Tư vấn "Đắt giá" (Pro-tip):** Sau khi cung cấp thông tin, hãy đưa ra một **"lời khuyên vàng"** dựa trên kinh nghiệm để giúp khách hàng "chốt" được việc, tránh sai sót.
-    * *Ví dụ:* "Thủ tục này quan trọng nhất là [mục], anh/chị nhớ kiểm tra kỹ... để tránh bị trả hồ sơ nhé."
-    * *Hoặc:* "Kinh nghiệm của em là anh/chị nên gọi điện/đặt lịch hẹn trước khi đến [Địa điểm] vì họ xử lý hồ sơ rất lâu, đến nơi không có hẹn sẽ phải về đó ạ."
-
----
-
-### VAI TRÒ 3: Chuyên gia Tìm Trường Dạy Lái (Tên: An)
-
-**Khi nào kích hoạt:** Khi chủ đề là "học lái xe" hoặc "trường dạy lái".
-
-**Persona:** Bạn là An, **Trưởng phòng Tuyển sinh với nhiều năm kinh nghiệm** giúp học viên (đặc biệt là người Việt) lấy bằng lái tại Nhật. Bạn năng động, thấu hiểu những khó khăn (ngôn ngữ, chi phí, thời gian) của học viên. **Mục tiêu của bạn là tìm ra lộ trình học hiệu quả và nhanh chóng nhất, giúp học viên đăng ký được suất học phù hợp.**
-
-**Quy trình:**
-1.  **Xác định Nhu cầu:** Để tìm trường phù hợp, hãy hỏi **từng câu một** nếu người dùng chưa cung cấp:
-    * "Dạ em là An, cố vấn tuyển sinh. Anh/chị muốn tìm trường ở tỉnh nào (Prefecture) ạ?"
-    * "Anh/chị có cần hỗ trợ ngôn ngữ cụ thể (ví dụ: Tiếng Việt, Tiếng Anh) trong quá trình học không ạ?"
-    * "Mình dự định học số sàn (MT) hay số tự động (AT) ạ?"
-2.  **Tra cứu:** Dùng tool `retrieve_context` với các từ khóa đã thu thập được.
-3.  **Tư vấn Lựa chọn:** Giới thiệu 1-2 trường phù hợp nhất dựa trên kết quả từ tool, **nhấn mạnh các lợi ích (ví dụ: "Có giáo viên Việt Nam", "Chi phí trọn gói", "Tỷ lệ đỗ cao")**.
-4.  **Hỗ trợ "Chốt" Ghi danh:** Sau khi tư vấn, hãy chủ động hỗ trợ khách hàng đăng ký (đây là hành động "chốt" của vai trò này).
-    * *Ví dụ:* "Trường [Tên Trường] đang có gói ưu đãi giảm 10% cho học viên đăng ký trong tháng này, rất hợp với mình. Anh/chị có muốn em hỗ trợ làm thủ tục ghi danh luôn không ạ?"
-    * *Hoặc:* "Gói học [Tên gói] này có giáo viên người Việt hỗ trợ 1 kèm 1. Anh/chị muốn đăng ký khóa khai giảng ngày [Ngày] tới chứ ạ?"
-
----
-
-### QUY TẮC CHUNG (BẮT BUỘC)
-
-* **Xưng hô:** Luôn xưng hô lịch sự, sử dụng "em" (vai trò) và "anh/chị" (người dùng).
-* **Giọng điệu:** Thân thiện, chuyên nghiệp, đáng tin cậy và **thể hiện rõ kinh nghiệm**.
-* **Câu trả lời:** Rõ ràng, chi tiết, đi thẳng vào vấn đề.
-* **Hỏi từng câu một:** TUYỆT ĐỐI không hỏi một lần nhiều câu (trừ Vai trò 2 khi hỏi Tỉnh/Quốc tịch).
-* **Xác nhận thông tin:** Luôn xác nhận lại thông tin và nhu cầu của người dùng trước khi đề xuất.
-* **Tránh bịa đặt:** Nếu tool `retrieve_context` trả về "Không tìm thấy thông tin" hoặc không có dữ liệu, hãy nói rõ: "Dạ, em xin lỗi, hiện tại em chưa có thông tin chính xác về [Nội dung khách hỏi]. Anh/chị có thể cung cấp thêm chi tiết hoặc tham khảo yêu cầu khác không ạ?"
-* **Bám sát vai trò:** Đã vào vai nào thì phải giữ đúng giọng điệu và mục tiêu của vai đó.
-* **Nếu khách hàng hỏi một mẫu xe nào đó có trong kho dữ liệu không:** Hãy sử dụng tool `retrieve_context` để lấy thông tin chi tiết về mẫu xe đó, sau đó tư vấn dựa trên thông tin thu thập được. Nếu không tìm thấy, hãy hỏi khách về các câu hỏi để lấy thông tin tư vấn và đề xuất các mẫu xe hiện có.
-"""
-
-# --- 4. Tạo Agent ---
-
-agent = create_agent(
-    model=model_llm,
-    tools=[retrieve_context, count_documents_by_topic],
-    system_prompt=AGENT_SYSTEM_PROMPT
-)
-def clean_response(response):
-    """
-    Làm sạch kết quả trả về từ agent hoặc model, loại bỏ các trường metadata như 'extras', 'signature', v.v.
-    """
-    import json
-
-    def _remove_extras(obj):
-        if isinstance(obj, dict):
-            return {
-                k: _remove_extras(v)
-                for k, v in obj.items()
-                if k not in ["extras", "signature"]
-            }
-        elif isinstance(obj, list):
-            return [_remove_extras(x) for x in obj]
-        else:
-            return obj
-
-    try:
-        cleaned = _remove_extras(response)
-        # Nếu có content nằm sâu bên trong
-        if isinstance(cleaned, dict) and "messages" in cleaned:
-            msgs = cleaned["messages"]
-            if msgs and hasattr(msgs[-1], "content"):
-                return msgs[-1].content
-            elif isinstance(msgs[-1], dict) and "content" in msgs[-1]:
-                return msgs[-1]["content"]
-        return json.dumps(cleaned, ensure_ascii=False)
-    except Exception:
-        return str(response)
-
+SESSION_ID = "terminal"
+
+
+# --- 2. Khởi động: tạo tài nguyên + agent khi chạy (không phải lúc import) ---
+def start():
+    """Tạo sẵn model (registry), nạp tài nguyên, tạo agent; in thời gian khởi động"""
+    # Embedding, LLM client, vector store: tạo 1 lần / process qua registry
+    warm_up()
+    # Index BM25, cache, thống kê, bảng xe (xem core/agent.py)
+    resources = load_resources()
+    # Tools + system prompt nằm trong core/agent.py, core/prompts.py
+    # PERSONA_PROMPTS_ENABLED: 1 agent / vai trò, mỗi lượt chọn theo chủ đề của phiên
+    personas = build_persona_router(resources) if PERSONA_PROMPTS_ENABLED else None
+    agent = personas.agents[None] if personas is not None else build_agent(resources)
+    # SPECULATIVE_RETRIEVAL_ENABLED: tra cứu trước khi gọi LLM -> thường chỉ cần 1 lần gọi LLM / lượt
+    speculator = build_speculative_retriever(resources) if SPECULATIVE_RETRIEVAL_ENABLED else None
+    print(f"LOG: Thời gian khởi tạo (giây): {registry.report()}")
+    # Lịch sử chat: giới hạn theo token, lượt cũ gộp thành tóm tắt, snapshot ra đĩa
+    return agent, personas, speculator, get_session_store()
+
+# --- 3. In câu trả lời dạng stream ---
+def stream_reply(agent, messages):
+    """In token ngay khi LLM sinh ra (kèm tiến trình gọi tool), trả về lịch sử đã cập nhật"""
+    print("Bot: ", end="", flush=True)
+    for event in stream_turn(agent, messages):
+        if event["type"] == "token":
+            print(event["text"], end="", flush=True)
+        elif event["type"] == "tool_call":
+            print(f"[đang tra cứu: {event['name']} {event['args']}] ", end="", flush=True)
+        elif event["type"] == "done":
+            print(f"\nLOG: TTFT {event['ttft_ms']} ms, tổng {event['total_ms']} ms", flush=True)
+            return event["messages"]
 
 # --- 5. Vòng lặp Chat ---
 def main_chat():
+    default_agent, personas, speculator, session_store = start()
     print("\n--- Bắt đầu Chat RAG (gõ 'exit' để thoát') ---")
-    messages = []
 
     while True:
         try:
@@ -202,24 +63,45 @@ def main_chat():
                 continue
             if user_query.lower() in ["exit", "quit", "thoát"]:
                 print("Tạm biệt!")
+                session_store.save_all()
                 break
 
-            # Thêm câu hỏi vào lịch sử
-            messages.append(HumanMessage(content=user_query))
-
-            # Gọi Agent
-            response = agent.invoke({"messages": messages})
-
-            ai_response = clean_response(response["messages"][-1].content)
-            print(f"Bot: {ai_response}", flush=True)
-
-            # Cập nhật lịch sử
-            messages = response["messages"]
-            if len(messages) > 10:
-                messages = messages[-10:]
+            # Vai trò theo chủ đề của phiên (chưa rõ -> agent đủ 3 vai trò)
+            topic, agent = None, default_agent
+            if personas is not None:
+                topic, agent = personas.select(user_query, session_store.topic(SESSION_ID))
+
+            # Lịch sử (tóm tắt + các lượt gần nhất) + câu hỏi mới (+ kết quả tra cứu đón trước)
+            prefetch = speculator.start(user_query, session_store.history(SESSION_ID)) if speculator else None
+            history = session_store.history(SESSION_ID) + [HumanMessage(content=user_query)]
+            if speculator is not None:
+                history += speculator.messages(prefetch)
+            messages = history
+
+            # Gọi Agent (span "chat.turn" chứa các span LLM / tool / retrieval khi bật TRACING_ENABLED)
+            with tracer.span("chat.turn", session=SESSION_ID, streaming=CHAT_STREAMING, persona=topic):
+                if CHAT_STREAMING:
+                    messages = stream_reply(agent, messages)
+                else:
+                    response = agent.invoke({"messages": messages})
+
+                    ai_response = clean_response(response["messages"][-1].content)
+                    print(f"Bot: {ai_response}", flush=True)
+
+                    messages = response["messages"]
+
+            # Cập nhật lịch sử (store tự cắt theo ngân sách token, giữ nguyên cặp tool_call / kết quả)
+            session_store.update(SESSION_ID, messages, topic=topic)
+            if prefetch is not None:
+                outcome = speculator.record(prefetch, messages[len(history):])
+                print(f"LOG: Retrieval đón trước: {outcome} (tỉ lệ trúng {speculator.stats['hit_rate']:.0%})")
+            if personas is not None:
+                saved = personas.record(topic, messages[len(history):])
+                print(f"LOG: Vai trò: {topic or 'đủ 3 vai trò'}, system prompt bớt ~{saved} token")
 
         except KeyboardInterrupt:
             print("\nTạm biệt!")
+            session_store.save_all()
             break
         except Exception as e:
             print(f"\n[Lỗi]: {e}")
@@ -0,0 +1,30 @@
+# src/chatbot/__main__.py
+# Chạy HTTP chat service: cd src && python -m chatbot [--host 0.0.0.0] [--port 8000] [--llm local]
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+
+def main(argv=None):
+    load_dotenv()
+    os.environ["LANGSMITH_TRACING"] = "false"
+
+    # Import sau load_dotenv: config đọc biến môi trường lúc import
+    import uvicorn
+    from .api import create_app
+    from config import API_HOST, API_PORT
+
+    parser = argparse.ArgumentParser(description="HTTP chat service cho chatbot RAG")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--llm", choices=["gemini", "local"], default=None,
+                        help="Backend LLM (mặc định theo LLM_BACKEND)")
+    args = parser.parse_args(argv)
+
+    uvicorn.run(create_app(llm_backend=args.llm), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# src/chatbot/api/__init__.py
+from .server import create_app, ChatService
@@ -0,0 +1,264 @@
+# src/chatbot/api/server.py
+# (HTTP chat service bất đồng bộ: 1 process, tài nguyên nạp 1 lần, phục vụ nhiều phiên chat song song)
+
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
+from langchain_core.messages import HumanMessage
+
+from ..core.agent import load_resources, build_agent, build_persona_router, build_speculative_retriever
+from ..core.agent import clean_response
+from ..core.utils import get_llm, get_session_store, warm_up
+from ..core.registry import registry
+from ..core.streaming import astream_turn
+from ..core.tracing import tracer, payload_bytes
+from config import API_MAX_CONCURRENT_TURNS, LLM_BACKEND, PERSONA_PROMPTS_ENABLED, SPECULATIVE_RETRIEVAL_ENABLED
+
+
+# --- Schema request / response ---
+class ChatRequest(BaseModel):
+    message: str
+    # Bỏ trống -> tạo phiên mới
+    session_id: str | None = None
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    answer: str
+    latency_ms: float
+
+
+# --- Quản lý phiên + giới hạn đồng thời ---
+class ChatService:
+    """
+    Chạy agent bất đồng bộ cho nhiều phiên; lịch sử nằm trong SessionStore
+    (giới hạn token / phiên, LRU + snapshot ra đĩa -> RAM không tăng theo số khách).
+    - Mỗi phiên có 1 lock: các lượt trong cùng phiên chạy tuần tự (lịch sử không bị ghi đè).
+      Lock chỉ tồn tại khi phiên đang có lượt chạy / chờ.
+    - Semaphore chung: giới hạn số lượt chạy cùng lúc trên toàn process.
+    LLM gọi bằng async (không chặn event loop); tool đồng bộ (embedding, Chroma, SQLite)
+    được agent đẩy sang thread pool.
+    `personas` (PersonaRouter): mỗi lượt chọn agent theo chủ đề của phiên (system prompt chỉ có
+    vai trò đang dùng); None -> luôn dùng `agent`.
+    `speculator` (SpeculativeRetriever): retrieval bắt đầu ngay khi nhận câu hỏi (trước khi chờ lock /
+    semaphore), kết quả chèn sẵn vào lượt -> agent trả lời trong 1 lần gọi LLM; None -> tắt.
+    """
+
+    def __init__(self, agent, session_store, max_concurrent_turns: int = API_MAX_CONCURRENT_TURNS,
+                 personas=None, speculator=None):
+        self.agent = agent
+        self.sessions = session_store
+        self.personas = personas
+        self.speculator = speculator
+        self._semaphore = asyncio.Semaphore(max_concurrent_turns)
+        # session_id -> [lock, số lượt đang giữ / chờ lock]
+        self._locks: dict[str, list] = {}
+
+    @property
+    def session_count(self) -> int:
+        return len(self.sessions)
+
+    @asynccontextmanager
+    async def _session_lock(self, session_id: str):
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    def _select_agent(self, session_id: str, message: str) -> tuple:
+        """(chủ đề, agent) cho lượt này; gọi khi đang giữ lock của phiên"""
+        if self.personas is None:
+            return None, self.agent
+        return self.personas.select(message, self.sessions.topic(session_id))
+
+    def _prefetch(self, session_id: str, message: str):
+        if self.speculator is None:
+            return None
+        return self.speculator.start(message, self.sessions.history(session_id))
+
+    async def _turn_messages(self, session_id: str, message: str, prefetch) -> list:
+        """Lịch sử + câu hỏi (+ kết quả retrieval đón trước nếu đã xong); gọi khi đang giữ lock của phiên"""
+        messages = self.sessions.history(session_id) + [HumanMessage(content=message)]
+        if prefetch is not None:
+            messages += await asyncio.to_thread(self.speculator.messages, prefetch)
+        return messages
+
+    def _record_turn(self, session_id: str, topic, messages: list, new_history: list, prefetch=None) -> None:
+        if self.speculator is not None:
+            outcome = self.speculator.record(prefetch, new_history[len(messages):])
+            if prefetch is not None:
+                print(f"LOG: [{session_id[:8]}] Retrieval đón trước: {outcome} "
+                      f"(tỉ lệ trúng {self.speculator.stats['hit_rate']:.0%})")
+        if self.personas is None:
+            return
+        saved = self.personas.record(topic, new_history[len(messages):])
+        print(f"LOG: [{session_id[:8]}] Vai trò: {topic or 'đủ 3 vai trò'}, system prompt bớt ~{saved} token")
+
+    async def chat(self, session_id: str, message: str) -> str:
+        # Span gốc của lượt chat: các span LLM / tool / retrieval bên trong nằm dưới nó
+        with tracer.span("chat.turn", session=session_id[:8], input_bytes=payload_bytes(message)) as span:
+            prefetch = self._prefetch(session_id, message)
+            async with self._session_lock(session_id):
+                # Chọn vai trò có thể phải embed câu hỏi -> chạy ngoài event loop
+                topic, agent = await asyncio.to_thread(self._select_agent, session_id, message)
+                span.set(persona=topic)
+                async with self._semaphore:
+                    messages = await self._turn_messages(session_id, message, prefetch)
+                    response = await agent.ainvoke({"messages": messages})
+
+                # Cập nhật lịch sử (store tự cắt theo ngân sách token + tóm tắt lượt cũ)
+                self.sessions.update(session_id, response["messages"], topic=topic)
+                self._record_turn(session_id, topic, messages, response["messages"], prefetch)
+                content = response["messages"][-1].content
+                # Gemini có thể trả content dạng list block -> làm sạch; chuỗi thì trả thẳng
+                answer = content if isinstance(content, str) else clean_response(content)
+                span.set(output_bytes=payload_bytes(answer))
+                return answer
+
+    async def stream_chat(self, session_id: str, message: str):
+        """
+        Như chat() nhưng yield event (token / tool_call / tool_result / done) ngay khi có.
+        Event "done" kèm ttft_ms, total_ms; lịch sử được cập nhật trước khi yield "done".
+        """
+        with tracer.span("chat.turn", session=session_id[:8], input_bytes=payload_bytes(message),
+                         streaming=True) as span:
+            prefetch = self._prefetch(session_id, message)
+            async with self._session_lock(session_id):
+                topic, agent = await asyncio.to_thread(self._select_agent, session_id, message)
+                span.set(persona=topic)
+                async with self._semaphore:
+                    messages = await self._turn_messages(session_id, message, prefetch)
+                    async for event in astream_turn(agent, messages):
+                        if event["type"] == "done":
+                            history = event.pop("messages")
+                            self.sessions.update(session_id, history, topic=topic)
+                            self._record_turn(session_id, topic, messages, history, prefetch)
+                            print(f"LOG: [{session_id[:8]}] TTFT {event['ttft_ms']} ms, tổng {event['total_ms']} ms")
+                            span.set(ttft_ms=event["ttft_ms"], output_bytes=payload_bytes(event["answer"]))
+                        yield event
+
+    def reset(self, session_id: str) -> bool:
+        return self.sessions.reset(session_id)
+
+
+# --- App ---
+def create_app(agent=None, llm_backend: str | None = None, session_store=None) -> FastAPI:
+    """
+    Tạo FastAPI app. `agent`: truyền sẵn (test) để bỏ qua bước nạp tài nguyên;
+    `llm_backend`: "gemini" / "local", mặc định theo LLM_BACKEND trong config;
+    `session_store`: mặc định get_session_store() (snapshot vào SESSION_SNAPSHOT_DIR).
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        chat_agent = agent
+        personas = speculator = None
+        app.state.query_embeddings = None
+        app.state.router = None
+        if chat_agent is None:
+            # Tạo sẵn model embedding, LLM client, Chroma (registry: 1 lần / process, ngoài event loop)
+            await asyncio.to_thread(warm_up, llm_backend or LLM_BACKEND)
+            resources = await asyncio.to_thread(load_resources)
+            llm = get_llm(llm_backend) if llm_backend else None
+            if PERSONA_PROMPTS_ENABLED:
+                # 1 agent / vai trò; phiên chưa rõ chủ đề dùng agent đủ 3 vai trò
+                personas = build_persona_router(resources, llm=llm)
+                chat_agent = personas.agents[None]
+            else:
+                chat_agent = build_agent(resources, llm=llm)
+            if SPECULATIVE_RETRIEVAL_ENABLED:
+                speculator = build_speculative_retriever(resources)
+            app.state.query_embeddings = resources.embeddings
+            app.state.router = resources.router
+        app.state.personas = personas
+        app.state.speculator = speculator
+        sessions = session_store if session_store is not None else get_session_store()
+        app.state.chat_service = ChatService(chat_agent, sessions, personas=personas, speculator=speculator)
+        print("LOG: Chat service sẵn sàng.")
+        yield
+        # Tắt service: ghi snapshot các phiên còn trong RAM
+        sessions.save_all()
+        if speculator is not None:
+            speculator.close()
+
+    app = FastAPI(title="Chatbot RAG VINAJAPANE", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        return {
+            "status": "ok",
+            "sessions": app.state.chat_service.session_count,
+            # Thời gian tạo model / client / store lúc khởi động (giây)
+            "startup": registry.report(),
+            # Dịch vụ embedding câu hỏi: độ sâu hàng đợi, kích thước lô, cache
+            "query_embeddings": getattr(app.state.query_embeddings, "stats", None),
+            # Định tuyến topic: số lần theo từ khoá / centroid / fallback, tỉ lệ shard phải tìm
+            "router": getattr(app.state.router, "stats", None),
+            # Vai trò: số lượt theo vai, token system prompt mỗi vai, số token tiết kiệm được
+            "personas": getattr(app.state.personas, "stats", None),
+            # Retrieval đón trước: số lượt chèn sẵn ngữ cảnh, trúng / trượt, quá giờ chờ, tỉ lệ trúng
+            "speculative_retrieval": getattr(app.state.speculator, "stats", None),
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """Chỉ số dạng Prometheus: histogram thời gian từng bước, số lỗi, token / byte (cần TRACING_ENABLED)"""
+        return PlainTextResponse(tracer.render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @app.post("/chat", response_model=ChatResponse)
+    async def chat(request: ChatRequest):
+        message = request.message.strip()
+        if not message:
+            raise HTTPException(status_code=400, detail="message không được để trống")
+        session_id = request.session_id or uuid.uuid4().hex
+
+        start = time.perf_counter()
+        try:
+            answer = await app.state.chat_service.chat(session_id, message)
+        except Exception as e:
+            print(f"\n[Lỗi]: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        latency_ms = (time.perf_counter() - start) * 1000
+        return ChatResponse(session_id=session_id, answer=answer, latency_ms=round(latency_ms, 1))
+
+    @app.post("/chat/stream")
+    async def chat_stream(request: ChatRequest):
+        """Server-Sent Events: mỗi event là 1 dòng `data: {json}` (event cuối có type="done")"""
+        message = request.message.strip()
+        if not message:
+            raise HTTPException(status_code=400, detail="message không được để trống")
+        session_id = request.session_id or uuid.uuid4().hex
+
+        async def event_source():
+            yield _sse({"type": "session", "session_id": session_id})
+            try:
+                async for event in app.state.chat_service.stream_chat(session_id, message):
+                    yield _sse(event)
+            except Exception as e:
+                print(f"\n[Lỗi]: {e}")
+                yield _sse({"type": "error", "detail": str(e)})
+
+        return StreamingResponse(event_source(), media_type="text/event-stream")
+
+    @app.delete("/sessions/{session_id}")
+    async def delete_session(session_id: str):
+        if not app.state.chat_service.reset(session_id):
+            raise HTTPException(status_code=404, detail="Không có phiên này")
+        return {"session_id": session_id, "deleted": True}
+
+    return app
+
+
+def _sse(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
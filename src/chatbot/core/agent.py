@@ -0,0 +1,401 @@
+# src/chatbot/core/agent.py
+# (Tài nguyên nạp 1 lần / process + tools + agent: dùng chung cho terminal và HTTP service)
+
+import json
+
+# utils thêm thư mục gốc project vào sys.path -> import trước config
+from .utils import get_query_embeddings, get_llm, get_vector_store, get_lexical_index, get_hybrid_retriever
+from .utils import get_facet_stats, get_retrieval_cache, get_query_router, get_context_packer
+from config import VECTOR_STORE_DIR, RETRIEVER_SEARCH_K, JSON_OUTPUT_DIR, RETRIEVAL_CACHE_ENABLED
+from config import CONTEXT_PACKING_ENABLED, CONTEXT_CANDIDATE_K
+from config import SPECULATIVE_MAX_WAIT_MS, SPECULATIVE_MAX_WORKERS
+from config import QUERY_ROUTER_ENABLED, ROUTER_ROUTED_SEARCH_K, SESSION_CHARS_PER_TOKEN
+from config import CAR_CATALOG_TOPIC, CAR_CATALOG_DOCUMENT_ID, CAR_CATALOG_CATEGORICAL_COLUMNS
+from .hybrid_retrieval import topic_filter
+from .table_query import load_structured_table
+from .prompts import build_system_prompt
+from .persona_router import PersonaRouter
+from .speculative_retrieval import SpeculativeRetriever, RETRIEVAL_TOOL
+from .tracing import tracer, TracingCallbackHandler, payload_bytes
+
+
+class ChatResources:
+    """
+    Mọi thứ nặng mà agent cần: model embedding, vector store, index BM25, cache retrieval,
+    thống kê, bảng xe, bộ định tuyến topic, bộ ghép ngữ cảnh.
+    Tạo 1 lần cho cả process rồi dùng chung cho mọi phiên chat.
+    """
+
+    def __init__(self, embeddings, vector_store, lexical_index=None, retrieval_cache=None,
+                 facet_stats=None, car_catalog=None, router=None, context_packer=None):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.hybrid_retriever = (
+            get_hybrid_retriever(vector_store, lexical_index) if lexical_index is not None else None
+        )
+        self.retrieval_cache = retrieval_cache
+        self.facet_stats = facet_stats
+        self.car_catalog = car_catalog
+        self.router = router
+        self.context_packer = context_packer
+
+    def stored_embeddings(self, docs: list) -> list | None:
+        """
+        Vector đã lưu lúc ingest của các chunk (theo id, không embed lại): index mmap hoặc Chroma.
+        None nếu store không hỗ trợ / chunk không có id.
+        """
+        ids = [getattr(doc, "id", None) for doc in docs]
+        if not ids or any(chunk_id is None for chunk_id in ids):
+            return None
+        if hasattr(self.vector_store, "get_embeddings"):
+            return self.vector_store.get_embeddings(ids)
+        collection = getattr(self.vector_store, "_collection", None)
+        if collection is None:
+            return None
+        found = collection.get(ids=list(dict.fromkeys(ids)), include=["embeddings"])
+        by_id = dict(zip(found["ids"], found["embeddings"]))
+        return [by_id.get(chunk_id) for chunk_id in ids]
+
+    def exact_match(self, query: str) -> list | None:
+        """
+        Lối tắt khớp chính xác BM25 cho truy vấn ngắn (ví dụ "N-BOX"): không cần embed, không định tuyến.
+        None nếu không có index BM25 / không khớp.
+        """
+        if self.hybrid_retriever is None:
+            return None
+        k = max(RETRIEVER_SEARCH_K, CONTEXT_CANDIDATE_K) if self.context_packer is not None else RETRIEVER_SEARCH_K
+        with tracer.span("retrieval.exact_match", k=k) as span:
+            docs = self.hybrid_retriever.exact_match(query, k=k)
+            span.set(results=len(docs or []))
+        return docs
+
+    def search_documents(self, query: str, embedding: list[float] | None = None,
+                         check_exact: bool = True) -> tuple[list, list[float] | None]:
+        """
+        Tìm chunk liên quan (hybrid nếu có index BM25) -> (docs, vector câu hỏi | None nếu không phải embed).
+        `embedding`: vector câu hỏi đã tính sẵn.
+        Chưa có thì chỉ embed khi thật sự cần (không khớp chính xác BM25, không định tuyến được bằng từ khoá).
+        Có bộ định tuyến -> chỉ search shard của topic liên quan (không chắc -> mọi shard).
+        Có bộ ghép ngữ cảnh -> lấy CONTEXT_CANDIDATE_K ứng viên, retrieve_context lọc / cắt lại sau.
+        `check_exact=False`: người gọi đã thử exact_match rồi (cache retrieval).
+        """
+
+        def embed():
+            nonlocal embedding
+            if embedding is None and self.embeddings is not None:
+                # Embed qua dịch vụ micro-batch (gom với các phiên khác đang hỏi cùng lúc)
+                with tracer.span("query.embed", query_bytes=payload_bytes(query)):
+                    embedding = self.embeddings.embed_query(query)
+            return embedding
+
+        topics, k = None, RETRIEVER_SEARCH_K
+        if check_exact and self.router is not None:
+            # Khớp chính xác -> trả thẳng từ BM25 trước khi định tuyến (bước centroid cần embed câu hỏi)
+            docs = self.exact_match(query)
+            if docs is not None:
+                return docs, embedding
+        if self.router is not None:
+            with tracer.span("retrieval.route") as span:
+                route = self.router.route(query, embed_fn=embed)
+                span.set(method=route.method, topics=route.topics)
+            print(f"[DEBUG] Router: {route.method} -> {route.topics or 'mọi topic'} (độ tin cậy {route.confidence})")
+            topics = route.topics
+            if topics is not None and len(topics) == 1:
+                k = ROUTER_ROUTED_SEARCH_K
+        if self.context_packer is not None:
+            k = max(k, CONTEXT_CANDIDATE_K)
+
+        with tracer.span("retrieval.search", k=k, hybrid=self.hybrid_retriever is not None) as span:
+            if self.hybrid_retriever is not None:
+                docs = self.hybrid_retriever.search(query, k=k, topic=topics, embed_fn=embed)
+            else:
+                search_kwargs = {"filter": topic_filter(topics)} if topics is not None else {}
+                if embed() is not None:
+                    docs = self.vector_store.similarity_search_by_vector(embedding, k=k, **search_kwargs)
+                else:
+                    docs = self.vector_store.similarity_search(query, k=k, **search_kwargs)
+            span.set(results=len(docs))
+        return docs, embedding
+
+
+def load_resources() -> ChatResources:
+    """
+    Nạp toàn bộ tài nguyên cho agent (chậm: tải model embedding, mở Chroma...).
+    Model embedding / vector store lấy từ registry -> gọi lại không tải lại.
+    """
+    print("LOG: Đang tải model embedding...")
+    # Embedding câu hỏi: model dùng chung, bọc bởi dịch vụ gom lô + LRU (xem embedding_service.py)
+    embeddings = get_query_embeddings()
+    print("LOG: Tải model embedding thành công.")
+
+    vector_store = get_vector_store(VECTOR_STORE_DIR)
+    print("LOG: Tải Vector Store thành công.")
+
+    facet_stats = get_facet_stats()
+    return ChatResources(
+        embeddings=embeddings,
+        vector_store=vector_store,
+        # Index từ khoá BM25 (nếu đã ingest) -> tìm kiếm lai BM25 + vector
+        lexical_index=get_lexical_index(),
+        # Cache kết quả retrieval (câu hỏi lặp lại / diễn đạt khác -> không phải search lại)
+        retrieval_cache=get_retrieval_cache(embeddings, facet_stats=facet_stats) if RETRIEVAL_CACHE_ENABLED else None,
+        # Thống kê dựng sẵn lúc ingest (đếm theo topic / document / giá trị cột)
+        facet_stats=facet_stats,
+        # Bảng xe nạp vào RAM (mảng NumPy theo cột) cho tool query_car_catalog
+        car_catalog=load_structured_table(
+            JSON_OUTPUT_DIR, CAR_CATALOG_TOPIC, CAR_CATALOG_DOCUMENT_ID, CAR_CATALOG_CATEGORICAL_COLUMNS
+        ),
+        # Định tuyến câu hỏi -> shard topic (từ khoá + centroid lấy từ index mmap)
+        router=get_query_router(facet_stats) if QUERY_ROUTER_ENABLED else None,
+        # Bỏ phần lặp / chunk gần trùng, MMR, xếp vào ngân sách token trước khi gửi LLM
+        context_packer=get_context_packer() if CONTEXT_PACKING_ENABLED else None,
+    )
+
+
+def build_tools(resources: ChatResources) -> list:
+    """Tạo các tool của agent, gắn với bộ tài nguyên dùng chung"""
+    from langchain.tools import tool
+
+    @tool
+    def retrieve_context(query: str) -> str:
+        """
+        Dùng khi người dùng hỏi thông tin cụ thể (xe, trường, thủ tục đổi bằng...).
+        """
+        print(f"\n[DEBUG] Tool retrieve_context đang tìm: '{query}'")
+        if resources.retrieval_cache is not None:
+            # Khớp chính xác BM25 thử trước khi cache embed câu hỏi cho chế độ gần đúng
+            retrieved_docs, query_embedding = resources.retrieval_cache.retrieve(
+                query,
+                lambda q, embedding: resources.search_documents(q, embedding, check_exact=False),
+                exact_match=resources.exact_match,
+            )
+            print(f"[DEBUG] Retrieval cache: {resources.retrieval_cache.stats}")
+        else:
+            retrieved_docs, query_embedding = resources.search_documents(query)
+
+        if not retrieved_docs:
+            return "Không tìm thấy thông tin nào khớp với truy vấn."
+
+        with tracer.span("context.assemble", chunks=len(retrieved_docs)) as span:
+            if resources.context_packer is not None:
+                # Vector câu hỏi chỉ có khi search đã phải embed (khớp chính xác BM25 -> None, ghép theo túi-từ)
+                packed = resources.context_packer.pack(
+                    retrieved_docs, query, query_embedding, resources.stored_embeddings(retrieved_docs)
+                )
+                print(f"[DEBUG] Context packing: {packed.stats}")
+                span.set(**{k: v for k, v in packed.stats.items() if k != "vectors"})
+                docs_content = packed.text
+            else:
+                docs_content = "\n\n".join(
+                    f"Nội dung: {doc.page_content}"
+                    for doc in retrieved_docs
+                )
+            context = clean_response(docs_content)
+            span.set(context_bytes=payload_bytes(context))
+        return context
+
+    @tool
+    def count_documents_by_topic(topic: str) -> str:
+        """
+        Dùng khi người dùng hỏi tổng số lượng dữ liệu (xe, trường, thủ tục...).
+        topic: "car" (xe hơi), "license" (đổi bằng lái), "driving school" (trường dạy lái).
+        """
+        print(f"\n[DEBUG] Tool count_documents_by_topic đang đếm: '{topic}'")
+        if resources.facet_stats is None:
+            return "Chưa có thống kê dữ liệu (cần chạy ingest)."
+
+        resolved = resources.facet_stats.resolve_topic(topic)
+        if resolved is None:
+            available = ", ".join(f"'{t}'" for t in resources.facet_stats.topics())
+            return f"Không có chủ đề '{topic}'. Các chủ đề hiện có: {available}."
+
+        summary = resources.facet_stats.topic_summary(resolved)
+        details = ", ".join(f"{source}: {n}" for source, n in summary["documents"].items())
+        return f"Tìm thấy tổng cộng {summary['total']} mục thuộc chủ đề '{resolved}' ({details})."
+
+    @tool
+    def describe_available_data() -> str:
+        """
+        Dùng khi người dùng hỏi "bạn có những gì?", "có những loại xe / hãng / tỉnh nào?":
+        tóm tắt các chủ đề và phân bố theo hãng, nhiên liệu, kiểu xe, tỉnh, hộp số.
+        """
+        print("\n[DEBUG] Tool describe_available_data")
+        if resources.facet_stats is None:
+            return "Chưa có thống kê dữ liệu (cần chạy ingest)."
+
+        lines = []
+        for topic in resources.facet_stats.topics():
+            summary = resources.facet_stats.topic_summary(topic)
+            lines.append(f"Chủ đề '{topic}': {summary['total']} mục")
+            for col, counts in summary["columns"].items():
+                top = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+                lines.append(f"  - {col}: " + ", ".join(f"{v} ({n})" for v, n in top))
+        return "\n".join(lines) if lines else "Chưa có dữ liệu nào."
+
+    @tool
+    def query_car_catalog(
+        fuel: str = "",
+        body_type: str = "",
+        prefecture: str = "",
+        transmission: str = "",
+        brand: str = "",
+        model: str = "",
+        min_price_yen: int = 0,
+        max_price_yen: int = 0,
+        min_year: int = 0,
+        max_year: int = 0,
+        max_mileage_km: int = 0,
+        sort_by: str = "price_yen",
+        descending: bool = False,
+        limit: int = 5,
+        group_by: str = "",
+    ) -> str:
+        """
+        Lọc / sắp xếp / thống kê CHÍNH XÁC trong kho xe theo điều kiện cụ thể
+        (ví dụ: "xe hybrid dưới 1.000.000 yên ở Osaka", "xe rẻ nhất", "mỗi loại nhiên liệu có bao nhiêu xe").
+        fuel: Hybrid/Gasoline/Diesel/PHEV; body_type: SUV/Sedan/Hatchback/Kei Car/Minivan...;
+        transmission: AT/MT; sort_by: price_yen/year/mileage_km; group_by: fuel/body_type/prefecture/transmission/brand.
+        Bỏ trống (hoặc 0) các điều kiện không dùng.
+        """
+        print(f"\n[DEBUG] Tool query_car_catalog: fuel={fuel!r}, body_type={body_type!r}, "
+              f"prefecture={prefecture!r}, price=[{min_price_yen}, {max_price_yen}], group_by={group_by!r}")
+        catalog = resources.car_catalog
+        if catalog is None:
+            return "Chưa có dữ liệu bảng xe để truy vấn."
+
+        filters = []
+        for col, value in (("fuel", fuel), ("body_type", body_type),
+                           ("prefecture", prefecture), ("transmission", transmission)):
+            if value:
+                filters.append((col, "eq", value))
+        if brand:
+            filters.append(("brand", "contains", brand))
+        if model:
+            filters.append(("model", "contains", model))
+        for col, op, value in (("price_yen", "gte", min_price_yen), ("price_yen", "lte", max_price_yen),
+                               ("year", "gte", min_year), ("year", "lte", max_year),
+                               ("mileage_km", "lte", max_mileage_km)):
+            if value:
+                filters.append((col, op, value))
+
+        try:
+            if group_by:
+                counts = catalog.aggregate(filters, metric="count", group_by=group_by)
+                prices = catalog.aggregate(filters, metric="mean", column="price_yen", group_by=group_by)
+                lines = [
+                    f"- {group}: {count} xe, giá trung bình {prices[group] or 0:,.0f} yên"
+                    for group, count in counts.items()
+                ]
+                return "\n".join(lines) if lines else "Không có xe nào khớp điều kiện."
+
+            total, rows = catalog.query(filters, sort_by=sort_by or None,
+                                        descending=descending, limit=limit)
+        except (KeyError, ValueError) as e:
+            return f"Lỗi truy vấn: {e}"
+
+        if total == 0:
+            return "Không có xe nào khớp điều kiện."
+        lines = [", ".join(f"{k}: {v}" for k, v in row.items() if v not in (None, "")) for row in rows]
+        return f"Có {total} xe khớp điều kiện. {len(rows)} xe đầu tiên:\n" + "\n".join(
+            f"- {line}" for line in lines
+        )
+
+    return [retrieve_context, count_documents_by_topic, describe_available_data, query_car_catalog]
+
+
+def build_agent(resources: ChatResources, llm=None, topic: str | None = None):
+    """
+    Tạo agent (LLM + tools + system prompt). `llm` mặc định theo LLM_BACKEND trong config.
+    `topic`: chủ đề đã biết -> system prompt chỉ gồm phần chung + vai trò đó (None = đủ 3 vai trò).
+    """
+    from langchain.agents import create_agent
+
+    if llm is None:
+        print("LOG: Đang tải LLM từ LangChain...")
+        llm = get_llm()
+    agent = create_agent(
+        model=llm,
+        tools=build_tools(resources),
+        system_prompt=build_system_prompt(topic)
+    )
+    if tracer.enabled:
+        # Span cho mỗi lần gọi LLM (kèm token) và mỗi lần gọi tool
+        agent = agent.with_config({"callbacks": [TracingCallbackHandler(tracer)]})
+    return agent
+
+
+def build_persona_router(resources: ChatResources, llm=None) -> PersonaRouter:
+    """
+    1 agent cho mỗi vai trò (cùng LLM, tools) + bộ chọn vai trò theo chủ đề của phiên.
+    Nhận diện chủ đề bằng từ khoá của bộ định tuyến topic (tạo riêng nếu QUERY_ROUTER_ENABLED tắt);
+    không có từ khoá -> topic của chunk khớp chính xác BM25, rồi centroid embedding.
+    """
+    if llm is None:
+        print("LOG: Đang tải LLM từ LangChain...")
+        llm = get_llm()
+    router = resources.router if resources.router is not None else get_query_router(resources.facet_stats)
+
+    def classify(message: str) -> str | None:
+        if resources.hybrid_retriever is not None:
+            docs = resources.hybrid_retriever.exact_match(message)
+            if docs:
+                return docs[0].metadata.get("topic")
+        if router is not None and resources.embeddings is not None:
+            # Vector câu hỏi vào LRU của dịch vụ embedding -> lượt retrieval sau đó không phải embed lại
+            route = router.match_centroid(resources.embeddings.embed_query(message))
+            return route.topics[0] if route is not None else None
+        return None
+
+    return PersonaRouter(
+        lambda topic: build_agent(resources, llm=llm, topic=topic),
+        router=router,
+        classify=classify,
+        chars_per_token=SESSION_CHARS_PER_TOKEN,
+    )
+
+
+def build_speculative_retriever(resources: ChatResources) -> SpeculativeRetriever:
+    """
+    Retrieval đón trước: chạy đúng tool retrieve_context (cache, định tuyến, ghép ngữ cảnh như khi
+    agent tự gọi) trên câu hỏi khớp từ khoá topic, trước / song song với lần gọi LLM đầu.
+    """
+    retrieve = next(t for t in build_tools(resources) if t.name == RETRIEVAL_TOOL)
+    router = resources.router if resources.router is not None else get_query_router(resources.facet_stats)
+    return SpeculativeRetriever(
+        lambda query: retrieve.invoke({"query": query}),
+        router=router,
+        max_wait_seconds=SPECULATIVE_MAX_WAIT_MS / 1000,
+        max_workers=SPECULATIVE_MAX_WORKERS,
+    )
+
+
+def clean_response(response):
+    """
+    Làm sạch kết quả trả về từ agent hoặc model, loại bỏ các trường metadata như 'extras', 'signature', v.v.
+    """
+
+    def _remove_extras(obj):
+        if isinstance(obj, dict):
+            return {
+                k: _remove_extras(v)
+                for k, v in obj.items()
+                if k not in ["extras", "signature"]
+            }
+        elif isinstance(obj, list):
+            return [_remove_extras(x) for x in obj]
+        else:
+            return obj
+
+    try:
+        cleaned = _remove_extras(response)
+        # Nếu có content nằm sâu bên trong
+        if isinstance(cleaned, dict) and "messages" in cleaned:
+            msgs = cleaned["messages"]
+            if msgs and hasattr(msgs[-1], "content"):
+                return msgs[-1].content
+            elif isinstance(msgs[-1], dict) and "content" in msgs[-1]:
+                return msgs[-1]["content"]
+        return json.dumps(cleaned, ensure_ascii=False)
+    except Exception:
+        return str(response)
@@ -0,0 +1,194 @@
+# src/chatbot/core/context_packing.py
+# (Ghép ngữ cảnh gửi LLM: bỏ phần lặp do chunk overlap, bỏ chunk gần trùng, xếp lại bằng MMR
+#  rồi xếp vào ngân sách token, mỗi đoạn kèm nguồn)
+
+from dataclasses import dataclass, field
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .lexical_index import tokenize
+
+
+@dataclass
+class PackedContext:
+    text: str
+    docs: list[Document]          # chunk đã dùng (theo thứ tự trong ngữ cảnh)
+    tokens: int                   # ước lượng số token của `text`
+    stats: dict = field(default_factory=dict)
+
+
+def overlap_length(head: str, tail: str, min_chars: int) -> int:
+    """Độ dài phần cuối của `head` trùng với phần đầu của `tail` (0 nếu ngắn hơn min_chars)"""
+    if min_chars <= 0 or len(head) < min_chars or len(tail) < min_chars:
+        return 0
+    probe = tail[:min_chars]
+    start = head.find(probe)
+    while start != -1:
+        size = len(head) - start
+        if size <= len(tail) and tail.startswith(head[start:]):
+            return size
+        start = head.find(probe, start + 1)
+    return 0
+
+
+def _same_document(a: Document, b: Document) -> bool:
+    keys = ("topic", "document_id", "source")
+    return all(a.metadata.get(key) == b.metadata.get(key) for key in keys)
+
+
+def _token_vectors(texts: list[str]) -> np.ndarray:
+    """Vector túi-từ nhị phân (đã chuẩn hoá L2) khi không có embedding lưu sẵn: cosine = độ trùng từ"""
+    vocab: dict[str, int] = {}
+    rows = [[vocab.setdefault(token, len(vocab)) for token in set(tokenize(text))] for text in texts]
+    matrix = np.zeros((len(texts), max(len(vocab), 1)), dtype=np.float32)
+    for i, cols in enumerate(rows):
+        matrix[i, cols] = 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def mmr_order(relevance: np.ndarray, similarity: np.ndarray, lambda_mult: float, limit: int) -> list[int]:
+    """
+    Maximal Marginal Relevance: mỗi bước chọn ứng viên có
+    lambda * relevance - (1 - lambda) * (độ giống lớn nhất với các ứng viên đã chọn).
+    `similarity`: ma trận cosine (n x n); tính theo vector, mỗi bước O(n).
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    selected = [int(np.argmax(relevance))]
+    max_sim = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(limit, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+    return selected
+
+
+class ContextPacker:
+    """
+    Từ tập ứng viên (đã xếp hạng, lấy rộng hơn k thường) tạo ngữ cảnh gọn cho LLM:
+
+    1. Overlap: chunk liền nhau của cùng document lặp lại tới CHUNK_OVERLAP ký tự -> cắt phần lặp
+       ở chunk xếp hạng thấp hơn (phần còn lại < min_chunk_chars -> bỏ); chunk nằm trọn trong chunk khác -> bỏ.
+    2. Gần trùng: cosine giữa 2 chunk >= `dedup_threshold` -> bỏ chunk xếp hạng thấp hơn.
+       Vector: embedding lưu sẵn trong vector store (nếu đủ), không thì túi-từ.
+    3. MMR (`mmr_lambda`): ưu tiên chunk liên quan nhưng khác các chunk đã chọn.
+    4. Xếp lần lượt vào `token_budget` (ước lượng chars_per_token), tối đa `max_chunks` đoạn;
+       đoạn không vừa thì bỏ qua, thử đoạn sau. Mỗi đoạn có dòng nguồn (file, topic).
+    """
+
+    def __init__(self, token_budget: int = 600, max_chunks: int = 6, mmr_lambda: float = 0.7,
+                 dedup_threshold: float = 0.95, min_overlap_chars: int = 50, min_chunk_chars: int = 80,
+                 chars_per_token: float = 4.0):
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+        self.min_overlap_chars = min_overlap_chars
+        self.min_chunk_chars = min_chunk_chars
+        self.chars_per_token = chars_per_token
+
+    def estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token)
+
+    # --- 1. Overlap giữa các chunk cùng document ---
+
+    def _trim_overlaps(self, docs: list[Document]) -> tuple[list[int], list[str], int]:
+        """Trả về (vị trí ứng viên còn giữ, nội dung sau khi cắt, số ký tự đã cắt)"""
+        kept, texts, trimmed = [], [], 0
+        for i, doc in enumerate(docs):
+            text = doc.page_content
+            for j, other in zip(kept, texts):
+                if not _same_document(doc, docs[j]):
+                    continue
+                if text in other:
+                    text = ""
+                    break
+                # Chunk này đứng sau (đầu trùng đuôi chunk kia) hoặc đứng trước (đuôi trùng đầu chunk kia)
+                head = overlap_length(other, text, self.min_overlap_chars)
+                if head:
+                    text = text[head:]
+                tail = overlap_length(text, other, self.min_overlap_chars)
+                if tail:
+                    text = text[:-tail]
+            text = text.strip()
+            trimmed += len(doc.page_content) - len(text)
+            # Chỉ bỏ phần còn lại quá ngắn của chunk ĐÃ bị cắt; chunk ngắn nguyên vẹn vẫn giữ
+            shortened = len(text) < len(doc.page_content.strip())
+            if text and (not shortened or len(text) >= self.min_chunk_chars or not kept):
+                kept.append(i)
+                texts.append(text)
+        return kept, texts, trimmed
+
+    # --- Ghép ---
+
+    def pack(self, docs: list[Document], query: str = "", query_embedding=None,
+             doc_embeddings: list | None = None) -> PackedContext:
+        """
+        `docs`: ứng viên theo thứ tự xếp hạng. `doc_embeddings`: vector lưu sẵn cùng thứ tự
+        (None / thiếu vector nào -> dùng túi-từ cho cả tập, relevance theo từ khoá của `query`).
+        """
+        stats = {"candidates": len(docs)}
+        kept, texts, trimmed = self._trim_overlaps(docs)
+        stats["overlap_chars_trimmed"] = trimmed
+        stats["dropped_overlap"] = len(docs) - len(kept)
+        if not kept:
+            return PackedContext("", [], 0, stats)
+
+        vectors = None
+        if query_embedding is not None and doc_embeddings is not None \
+                and all(doc_embeddings[i] is not None for i in kept):
+            vectors = np.asarray([doc_embeddings[i] for i in kept], dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+            query_vec /= max(float(np.linalg.norm(query_vec)), 1e-12)
+            stats["vectors"] = "embedding"
+        else:
+            matrix = _token_vectors(texts + [query])
+            vectors, query_vec = matrix[:-1], matrix[-1]
+            stats["vectors"] = "tokens"
+        similarity = vectors @ vectors.T
+
+        # --- 2. Gần trùng: giữ chunk xếp hạng cao hơn ---
+        unique = []
+        for i in range(len(kept)):
+            if not unique or similarity[i, unique].max() < self.dedup_threshold:
+                unique.append(i)
+        stats["dropped_near_duplicate"] = len(kept) - len(unique)
+
+        # --- 3. MMR: relevance = cosine với câu hỏi + chút ưu tiên theo thứ hạng gốc ---
+        rank_prior = 1.0 - np.arange(len(unique), dtype=np.float32) / (10 * len(unique))
+        relevance = (vectors[unique] @ query_vec) * rank_prior if len(query_vec) else rank_prior
+        order = mmr_order(relevance, similarity[np.ix_(unique, unique)], self.mmr_lambda, len(unique))
+
+        # --- 4. Ngân sách token ---
+        blocks, used = [], []
+        tokens = 0
+        for position in order:
+            index = unique[position]
+            doc = docs[kept[index]]
+            source = doc.metadata.get("source") or doc.metadata.get("document_id") or "?"
+            block = f"[{len(blocks) + 1}] Nguồn: {source} ({doc.metadata.get('topic', '?')})\n{texts[index]}"
+            cost = self.estimate_tokens(block)
+            if tokens + cost > self.token_budget:
+                if blocks:
+                    continue
+                # Đoạn đầu tiên đã vượt ngân sách -> cắt bớt thay vì trả về rỗng
+                block = block[: int(self.token_budget * self.chars_per_token)]
+                cost = self.estimate_tokens(block)
+            blocks.append(block)
+            used.append(doc)
+            tokens += cost
+            if len(blocks) >= self.max_chunks:
+                break
+
+        stats["packed"] = len(blocks)
+        stats["tokens"] = tokens
+        return PackedContext("\n\n".join(blocks), used, tokens, stats)
@@ -2,17 +2,17 @@
 # (File này giờ CHỈ làm nhiệm vụ PARSE, không chunk)
 
 import pandas as pd
+import csv
 import re
 from pathlib import Path
-from langchain_community.document_loaders import TextLoader
+from typing import Iterator
 import pandas as pd
 # Cần cài đặt: 
 # pip install unstructured "unstructured[pdf]" "unstructured[docx]" pandas
-from unstructured.partition.pdf import partition_pdf
-from unstructured.partition.docx import partition_docx
-from unstructured.documents.elements import Element
+# unstructured / TextLoader / openpyxl được import trong hàm parse tương ứng (import rất chậm,
+# mà mỗi process parse chỉ cần 1 loại)
 
-def _elements_to_dicts(elements: list[Element]) -> list[dict]:
+def _elements_to_dicts(elements: list) -> list[dict]:
     """Helper: Chuyển list Element của unstructured sang list dict"""
     output = []
     for el in elements:
@@ -27,6 +27,8 @@ def _elements_to_dicts(elements: list[Element]) -> list[dict]:
 
 def parse_pdf(file_path: Path) -> list[dict]:
     """Phân vùng PDF và trả về list[dict] các elements"""
+    from unstructured.partition.pdf import partition_pdf
+
     print(f"  Parsing PDF: {file_path.name}")
     elements = partition_pdf(
         filename=str(file_path),
@@ -38,12 +40,16 @@ def parse_pdf(file_path: Path) -> list[dict]:
 
 def parse_docx(file_path: Path) -> list[dict]:
     """Phân vùng DOCX và trả về list[dict] các elements"""
+    from unstructured.partition.docx import partition_docx
+
     print(f"  Parsing DOCX: {file_path.name}")
     elements = partition_docx(filename=str(file_path))
     return _elements_to_dicts(elements)
 
 def parse_text(file_path: Path) -> dict:
     """Đọc file .txt đơn giản và trả về content"""
+    from langchain_community.document_loaders import TextLoader
+
     print(f"  Parsing TXT: {file_path.name}")
     loader = TextLoader(str(file_path), encoding="utf-8")
     text = loader.load()[0].page_content
@@ -70,6 +76,13 @@ def parse_csv(file_path: Path) -> list[dict]:
     return df.to_dict('records')
 
 # --- XỬ LÝ EXCEL ---
+def _is_packed_csv(columns: list[str]) -> bool:
+    """Sheet chỉ có 1 cột mà header chứa dấu phẩy -> mỗi ô thực ra là 1 dòng CSV"""
+    return len(columns) == 1 and "," in str(columns[0])
+
+def _split_packed_csv_row(cell) -> list[str]:
+    return next(csv.reader([str(cell)]), []) if cell not in ("", None) else []
+
 def parse_excel(file_path: Path) -> list[dict]:
     """
     Đọc file Excel (mặc định lấy sheet đầu tiên) và trả về list các hàng.
@@ -80,6 +93,11 @@ def parse_excel(file_path: Path) -> list[dict]:
         df = pd.read_excel(file_path, sheet_name=0, keep_default_na=False)
         # Chuyển đổi tất cả dữ liệu sang string để đảm bảo JSON serialize được
         df = df.astype(str) 
+        if _is_packed_csv(list(df.columns)):
+            # Tách dòng CSV trong ô thành các cột thật
+            columns = _split_packed_csv_row(df.columns[0])
+            rows = [_split_packed_csv_row(cell) for cell in df.iloc[:, 0]]
+            return [dict(zip(columns, row)) for row in rows if row]
         return df.to_dict('records')
     except Exception as e:
         print(f"  Lỗi khi đọc Excel {file_path.name}: {e}")
@@ -95,4 +113,63 @@ def parse_structured_text(file_path: Path) -> list[dict]:
         engine='python',
         keep_default_na=False
     )
-    return df.to_dict('records')
\ No newline at end of file
+    return df.to_dict('records')
+
+# --- STREAMING (file bảng lớn) ---
+# Các hàm dưới đây đọc theo từng block `block_rows` hàng, mỗi lần yield (columns, rows)
+# với rows là list[list[str]] -> RAM không phụ thuộc số hàng của file.
+
+def iter_csv_blocks(file_path: Path, block_rows: int) -> Iterator[tuple[list[str], list[list[str]]]]:
+    """Đọc CSV theo từng block hàng"""
+    print(f"  Streaming CSV: {file_path.name}")
+    reader = pd.read_csv(file_path, encoding='utf-8', keep_default_na=False, chunksize=block_rows)
+    for block in reader:
+        yield [str(c) for c in block.columns], block.astype(str).values.tolist()
+
+def iter_structured_text_blocks(file_path: Path, block_rows: int) -> Iterator[tuple[list[str], list[list[str]]]]:
+    """Đọc file .dat (whitespace-delimited) theo từng block hàng"""
+    print(f"  Streaming DAT: {file_path.name}")
+    reader = pd.read_csv(
+        file_path,
+        encoding='utf-8',
+        sep=r'\s\s+',
+        engine='python',
+        keep_default_na=False,
+        chunksize=block_rows
+    )
+    for block in reader:
+        yield [str(c) for c in block.columns], block.astype(str).values.tolist()
+
+def iter_excel_blocks(file_path: Path, block_rows: int) -> Iterator[tuple[list[str], list[list[str]]]]:
+    """
+    Đọc sheet đầu tiên của file Excel theo từng block hàng (openpyxl read-only,
+    không dựng DataFrame cho cả sheet).
+    """
+    from openpyxl import load_workbook
+
+    print(f"  Streaming Excel: {file_path.name}")
+    wb = load_workbook(filename=str(file_path), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"column_{i}" for i, c in enumerate(header)]
+        packed = _is_packed_csv(columns)
+        if packed:
+            columns = _split_packed_csv_row(columns[0])
+        block = []
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            if packed:
+                block.append(_split_packed_csv_row(row[0]))
+            else:
+                block.append(["" if v is None else str(v) for v in row[:len(columns)]])
+            if len(block) >= block_rows:
+                yield columns, block
+                block = []
+        if block:
+            yield columns, block
+    finally:
+        wb.close()
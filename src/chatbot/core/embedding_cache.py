@@ -0,0 +1,125 @@
+# src/chatbot/core/embedding_cache.py
+# (Cache embedding trên đĩa: key = hash nội dung chunk + tên model embedding)
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite giới hạn số tham số trong 1 câu lệnh -> tra cứu theo từng lô
+_SQLITE_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """Hash SHA-256 của nội dung chunk (dùng làm key cache)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+
+class EmbeddingCache:
+    """
+    Kho key-value (SQLite) lưu vector đã embed: (model, text_hash) -> float32 blob.
+    Dùng chung được giữa nhiều thread (có lock).
+    """
+
+    def __init__(self, db_path: Path):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, list[float]]:
+        """Trả về dict {text_hash: vector} cho các hash đã có trong cache"""
+        found = {}
+        hashes = list(hashes)
+        with self._lock:
+            for start in range(0, len(hashes), _SQLITE_BATCH):
+                batch = hashes[start:start + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                )
+                for h, blob in rows:
+                    found[h] = _unpack(blob)
+        return found
+
+    def put_many(self, model: str, items: dict[str, list[float]]) -> None:
+        """Ghi (hoặc ghi đè) các vector mới vào cache"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, _pack(vec)) for h, vec in items.items()],
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Bọc 1 model embedding: chỉ những chunk MỚI hoặc ĐÃ SỬA mới phải chạy qua model,
+    các chunk không đổi lấy lại vector từ cache.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()  # embed_documents có thể chạy trên nhiều thread
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [text_hash(t) for t in texts]
+        vectors = self.cache.get_many(self.model_name, set(hashes))
+
+        # Gom các text chưa có trong cache (bỏ trùng lặp trong cùng 1 lô)
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in vectors and h not in missing:
+                missing[h] = t
+
+        with self._stats_lock:
+            self.hits += len(hashes) - sum(1 for h in hashes if h in missing)
+            self.misses += len(missing)
+
+        if missing:
+            new_vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(self.model_name, computed)
+            vectors.update(computed)
+
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        # Query không cache ở đây (mỗi câu hỏi thường khác nhau)
+        return self.underlying.embed_query(text)
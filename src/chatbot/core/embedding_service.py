@@ -0,0 +1,143 @@
+# src/chatbot/core/embedding_service.py
+# (Dịch vụ embedding câu hỏi trong process: gom các request đồng thời thành micro-batch + LRU cache)
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from .tracing import tracer
+
+_STOP = object()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Bọc 1 model embedding cho đường truy vấn (nhiều phiên chat hỏi cùng lúc):
+    - embed_query() đưa câu hỏi vào hàng đợi; 1 thread worker lấy ra theo lô (tối đa
+      max_batch_size câu) và chạy 1 lần forward cho cả lô.
+    - Chỉ có 1 request -> chạy ngay (không chờ, độ trễ 1 câu không đổi). Khi lô có từ 2 request
+      trở lên (đang có tải), worker chờ thêm tối đa max_wait_ms để gom cho đầy lô.
+    - LRU cache (cache_size câu) cho câu hỏi lặp lại; câu trùng nhau trong 1 lô chỉ tính 1 lần.
+    - stats: độ sâu hàng đợi, số lô, kích thước lô trung bình / lớn nhất, hit/miss cache.
+    embed_documents() (ingest) gọi thẳng model gốc, không qua hàng đợi.
+    """
+
+    def __init__(self, base: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 cache_size: int = 2048):
+        self.base = base
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, list[float]] = OrderedDict()
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._batched_texts = 0
+        self._max_batch_seen = 0
+        self._hits = 0
+        self._misses = 0
+        self._wait_seconds = 0.0
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    # --- Interface Embeddings ---
+    def embed_query(self, text: str) -> list[float]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self._hits += 1
+                return vector
+            self._misses += 1
+
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.base.embed_documents(texts)
+
+    # --- Worker ---
+    def _collect(self, first) -> list:
+        batch = [first]
+        # Lấy ngay mọi request đang chờ sẵn
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                return batch
+            batch.append(item)
+
+        # Có tải (>= 2 request) -> chờ thêm 1 chút cho lô đầy hơn
+        if len(batch) > 1 and self.max_wait > 0:
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            started = time.perf_counter()
+
+            unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                # Thread worker không thuộc lượt chat nào -> span gốc riêng (kích thước lô, thời gian forward)
+                with tracer.span("embedding.batch", texts=len(unique_texts), requests=len(batch)):
+                    vectors = dict(zip(unique_texts, self.base.embed_documents(unique_texts)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._batches += 1
+                self._batched_texts += len(unique_texts)
+                self._max_batch_seen = max(self._max_batch_seen, len(unique_texts))
+                self._wait_seconds += sum(started - queued for _, _, queued in batch)
+                for text, vector in vectors.items():
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for text, future, _ in batch:
+                future.set_result(vectors[text])
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._worker.join(timeout=5)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "avg_batch_size": round(self._batched_texts / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "avg_queue_wait_ms": round(self._wait_seconds / self._misses * 1000, 3) if self._misses else 0.0,
+                "cache_hits": self._hits,
+                "cache_misses": self._misses,
+                "cache_hit_rate": round(self._hits / requests, 3) if requests else 0.0,
+            }
@@ -0,0 +1,135 @@
+# src/chatbot/core/facet_stats.py
+# (Thống kê dựng sẵn khi ingest: số mục theo topic, theo document nguồn, theo giá trị cột chính.
+#  Nạp 1 lần lúc khởi động -> câu hỏi "có bao nhiêu...", "bạn có gì" trả lời ngay từ RAM)
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from .lexical_index import fold_text
+
+
+class FacetStats:
+    """
+    Lưu dạng JSON nhỏ nằm cạnh Chroma store:
+        {"documents": {"topic/document_id": {"topic", "document_id", "source", "chunks",
+                                             "columns": {cột: {giá trị: số mục}}}}}
+    Khi ingest, object này là 1 `sink` của pipeline: gom số liệu từ metadata của chunk,
+    chỉ ghi nhận khi document ingest thành công (`commit_document`).
+    """
+
+    def __init__(self, path: Path, facet_columns=(), topic_aliases: dict | None = None):
+        self.path = Path(path)
+        self.facet_columns = tuple(facet_columns)
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._pending = {}
+        self._topic_totals = {}
+        self._summaries = {}
+        self._aliases = {}
+        for topic, aliases in (topic_aliases or {}).items():
+            for name in (topic, *aliases):
+                self._aliases[fold_text(name).strip()] = topic
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._documents = json.load(f).get("documents", {})
+        self._recount_topics()
+
+    @staticmethod
+    def _key(topic: str, document_id: str) -> str:
+        return f"{topic}/{document_id}"
+
+    def _recount_topics(self) -> None:
+        """Dựng lại tổng hợp theo topic (chạy khi có document thay đổi, không chạy lúc đọc)"""
+        summaries = {}
+        for doc in self._documents.values():
+            summary = summaries.setdefault(doc["topic"], {
+                "topic": doc["topic"], "total": 0, "documents": {}, "columns": {},
+            })
+            summary["total"] += doc["chunks"]
+            summary["documents"][doc["source"] or doc["document_id"]] = doc["chunks"]
+            for col, counts in doc["columns"].items():
+                merged = summary["columns"].setdefault(col, {})
+                for value, n in counts.items():
+                    merged[value] = merged.get(value, 0) + n
+        self._summaries = summaries
+        self._topic_totals = {topic: s["total"] for topic, s in summaries.items()}
+
+    # --- Ghi (sink của pipeline ingest) ---
+
+    def upsert(self, ids: list[str], metadatas: list[dict], documents=None, embeddings=None) -> None:
+        with self._lock:
+            for meta in metadatas:
+                key = self._key(meta.get("topic"), meta.get("document_id"))
+                entry = self._pending.setdefault(key, {
+                    "topic": meta.get("topic"),
+                    "document_id": meta.get("document_id"),
+                    "source": meta.get("source"),
+                    "chunks": 0,
+                    "columns": {},
+                })
+                entry["chunks"] += 1
+                for col in self.facet_columns:
+                    value = meta.get(col)
+                    if value in (None, ""):
+                        continue
+                    counts = entry["columns"].setdefault(col, {})
+                    counts[str(value)] = counts.get(str(value), 0) + 1
+
+    def commit_document(self, topic: str, document_id: str) -> None:
+        """Document đã ghi xong -> thay số liệu cũ bằng số liệu vừa gom"""
+        key = self._key(topic, document_id)
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                self._documents.pop(key, None)
+            else:
+                self._documents[key] = entry
+            self._recount_topics()
+
+    def discard_document(self, topic: str, document_id: str) -> None:
+        """Document ingest lỗi -> bỏ số liệu đang gom, giữ số liệu cũ"""
+        with self._lock:
+            self._pending.pop(self._key(topic, document_id), None)
+
+    def remove_document(self, topic: str, document_id: str) -> None:
+        with self._lock:
+            self._pending.pop(self._key(topic, document_id), None)
+            self._documents.pop(self._key(topic, document_id), None)
+            self._recount_topics()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"documents": self._documents}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # --- Đọc ---
+
+    def has_document(self, topic: str, document_id: str) -> bool:
+        return self._key(topic, document_id) in self._documents
+
+    def topics(self) -> dict[str, int]:
+        return dict(self._topic_totals)
+
+    def resolve_topic(self, name: str) -> str | None:
+        """Tên topic / alias / document_id ("cars_data", "xe hơi", "car_sales") -> topic thật"""
+        folded = fold_text(name).strip()
+        if name in self._topic_totals:
+            return name
+        if folded in self._aliases:
+            return self._aliases[folded]
+        for topic in self._topic_totals:
+            if fold_text(topic) == folded:
+                return topic
+        for doc in self._documents.values():
+            if fold_text(doc["document_id"]) == folded:
+                return doc["topic"]
+        return None
+
+    def topic_summary(self, topic: str) -> dict | None:
+        """Tổng số mục của topic + chi tiết theo document và theo giá trị cột"""
+        return self._summaries.get(topic)
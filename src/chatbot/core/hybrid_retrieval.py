@@ -0,0 +1,120 @@
+# src/chatbot/core/hybrid_retrieval.py
+# (Retriever lai: BM25 (khớp từ khoá chính xác) + vector (MiniLM), trộn bằng Reciprocal Rank Fusion)
+
+from typing import Any, Callable
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .lexical_index import LexicalIndex, tokenize
+from .tracing import tracer
+
+
+def _doc_key(doc: Document) -> str:
+    # Kết quả từ Chroma và từ BM25 được so khớp theo nội dung chunk
+    return doc.page_content
+
+
+def topic_filter(topic: str | list[str] | None) -> dict:
+    """Điều kiện metadata (cú pháp where của Chroma, MmapVectorStore hiểu được) cho 1 hoặc nhiều topic"""
+    if topic is None:
+        return {}
+    if isinstance(topic, str):
+        return {"topic": topic}
+    if len(topic) == 1:
+        return {"topic": topic[0]}
+    return {"topic": {"$in": list(topic)}}
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: list[tuple[list[Document], float]],
+    k: int,
+    rrf_k: int = 60,
+) -> list[Document]:
+    """
+    Trộn nhiều danh sách đã xếp hạng: score(d) = Σ weight / (rrf_k + rank).
+    Không cần chuẩn hoá điểm BM25 và cosine về cùng thang đo.
+    """
+    scores = {}
+    docs = {}
+    for docs_ranked, weight in ranked_lists:
+        for rank, doc in enumerate(docs_ranked, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Lấy ứng viên từ cả BM25 và vector store rồi trộn bằng RRF.
+    Truy vấn ngắn mà chunk BM25 top-1 chứa đủ mọi token (ví dụ "N-BOX", "Spacia")
+    được trả về ngay từ index từ khoá, không cần embed câu hỏi.
+    """
+
+    vector_store: Any
+    lexical_index: LexicalIndex
+    k: int = 3
+    candidates_k: int = 20
+    rrf_k: int = 60
+    lexical_weight: float = 1.0
+    vector_weight: float = 1.0
+    exact_match_shortcut: bool = True
+    exact_match_max_tokens: int = 3
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _is_exact_hit(self, query: str, lexical_docs: list[Document]) -> bool:
+        query_tokens = set(tokenize(query))
+        if not lexical_docs or not query_tokens or len(query.split()) > self.exact_match_max_tokens:
+            return False
+        return query_tokens <= set(tokenize(lexical_docs[0].page_content))
+
+    def exact_match(self, query: str, k: int | None = None,
+                    topic: str | list[str] | None = None) -> list[Document] | None:
+        """Lối tắt khớp chính xác (chỉ BM25, không cần vector); None nếu không áp dụng được"""
+        if not self.exact_match_shortcut or len(query.split()) > self.exact_match_max_tokens:
+            return None
+        lexical_docs = [doc for doc, _ in self.lexical_index.search(query, k=self.candidates_k, topic=topic)]
+        return lexical_docs[:k or self.k] if self._is_exact_hit(query, lexical_docs) else None
+
+    def search(self, query: str, k: int | None = None, topic: str | list[str] | None = None,
+               embedding: list[float] | None = None,
+               embed_fn: Callable[[], list[float] | None] | None = None) -> list[Document]:
+        """
+        `topic`: 1 topic / list topic (shard do bộ định tuyến chọn), None = mọi shard.
+        `embedding`: vector câu hỏi đã tính sẵn (nếu có) để không phải embed lại.
+        `embed_fn`: tính vector câu hỏi khi cần - chỉ gọi sau khi lối tắt khớp chính xác không dùng được.
+        """
+        k = k or self.k
+        with tracer.span("retrieval.lexical") as span:
+            lexical_docs = [
+                doc for doc, _ in self.lexical_index.search(query, k=self.candidates_k, topic=topic)
+            ]
+            span.set(results=len(lexical_docs))
+        if self.exact_match_shortcut and self._is_exact_hit(query, lexical_docs):
+            return lexical_docs[:k]
+
+        if embedding is None and embed_fn is not None:
+            embedding = embed_fn()
+        search_kwargs = {"filter": topic_filter(topic)} if topic is not None else {}
+        with tracer.span("retrieval.vector") as span:
+            if embedding is not None:
+                vector_docs = self.vector_store.similarity_search_by_vector(
+                    embedding, k=self.candidates_k, **search_kwargs
+                )
+            else:
+                vector_docs = self.vector_store.similarity_search(query, k=self.candidates_k, **search_kwargs)
+            span.set(results=len(vector_docs))
+        return reciprocal_rank_fusion(
+            [(lexical_docs, self.lexical_weight), (vector_docs, self.vector_weight)],
+            k=k,
+            rrf_k=self.rrf_k,
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self.search(query)
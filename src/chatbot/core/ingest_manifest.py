@@ -0,0 +1,155 @@
+# src/chatbot/core/ingest_manifest.py
+# (Manifest ingest: (topic, document_id) -> chunk IDs + hash nguồn + hash cấu hình chunk)
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+def file_hash(path: Path) -> str:
+    """Hash SHA-256 của 1 file (đọc theo block, không nạp cả file vào RAM)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def config_hash(*parts) -> str:
+    """Hash các tham số ảnh hưởng tới chunk/vector (chunk size, overlap, model...)"""
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def make_chunk_id(topic: str, document_id: str, index: int) -> str:
+    """ID chunk cố định theo vị trí -> ingest lại sẽ upsert đúng chỗ"""
+    return f"{topic}/{document_id}/{index}"
+
+
+class IngestManifest:
+    """
+    Index bền (SQLite) của những gì đã nạp vào vector store.
+    Thay cho việc dump toàn bộ metadata từ Chroma rồi quét tuyến tính.
+    """
+
+    def __init__(self, db_path: Path):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                topic TEXT NOT NULL,
+                document_id TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                config_hash TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (topic, document_id)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                topic TEXT NOT NULL,
+                document_id TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (topic, document_id, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    # --- Đọc ---
+
+    def get(self, topic: str, document_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_hash, config_hash, chunk_count, updated_at FROM documents "
+                "WHERE topic = ? AND document_id = ?",
+                (topic, document_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "source_hash": row[0],
+            "config_hash": row[1],
+            "chunk_count": row[2],
+            "updated_at": row[3],
+        }
+
+    def is_unchanged(self, topic: str, document_id: str, source_hash: str, cfg_hash: str) -> bool:
+        entry = self.get(topic, document_id)
+        return (
+            entry is not None
+            and entry["source_hash"] == source_hash
+            and entry["config_hash"] == cfg_hash
+        )
+
+    def chunk_ids(self, topic: str, document_id: str) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE topic = ? AND document_id = ?",
+                (topic, document_id),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def documents(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return self._conn.execute("SELECT topic, document_id FROM documents").fetchall()
+
+    @property
+    def revision(self) -> int:
+        """Tăng mỗi lần manifest thay đổi (dùng để invalidate cache phía đọc)"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+
+    # --- Ghi ---
+
+    def _bump_revision(self) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('revision', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def record(self, topic: str, document_id: str, source_hash: str, cfg_hash: str,
+               chunk_ids: list[str]) -> None:
+        """Ghi (thay thế) entry của 1 document sau khi đã nạp xong chunk"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE topic = ? AND document_id = ?", (topic, document_id)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (topic, document_id, chunk_id) VALUES (?, ?, ?)",
+                [(topic, document_id, cid) for cid in chunk_ids],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(topic, document_id, source_hash, config_hash, chunk_count, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (topic, document_id, source_hash, cfg_hash, len(chunk_ids), time.time()),
+            )
+            self._bump_revision()
+            self._conn.commit()
+
+    def remove(self, topic: str, document_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE topic = ? AND document_id = ?", (topic, document_id)
+            )
+            self._conn.execute(
+                "DELETE FROM documents WHERE topic = ? AND document_id = ?", (topic, document_id)
+            )
+            self._bump_revision()
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
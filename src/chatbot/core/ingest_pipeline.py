@@ -0,0 +1,202 @@
+# src/chatbot/core/ingest_pipeline.py
+# (Pipeline ingest 3 tầng chạy chồng lên nhau:
+#  chunk (nhiều thread) -> embed theo lô cố định, gom qua nhiều file -> 1 writer ghi vào Chroma)
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .tracing import tracer, payload_bytes
+
+_DONE = object()  # Sentinel báo hết dữ liệu cho tầng sau
+
+
+class IngestPipeline:
+    """
+    Chạy ingest theo 3 tầng nối với nhau bằng queue có giới hạn (backpressure):
+
+    1. Chunk producers: `prepare(task)` trả về (doc_key, iterable các (chunk_id, Document)).
+       Có thể là list hoặc generator (đọc dần từng phần của file lớn).
+    2. Embed: gom chunk thành lô `batch_size` (vượt qua ranh giới file) và embed
+       song song trên `embed_workers` thread.
+    3. Writer: 1 thread duy nhất (thread gọi `run`) ghi vector đã tính sẵn vào Chroma
+       và vào các `sinks` phụ (ví dụ index BM25) có cùng interface `upsert`.
+       Khi tất cả chunk của 1 document đã ghi xong -> gọi `on_document_done(doc_key, chunk_ids)`.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        collection,
+        batch_size: int = 64,
+        embed_workers: int = 1,
+        chunk_workers: int = 1,
+        queue_size: int = 1024,
+        sinks: list | None = None,
+        on_document_done: Callable[[tuple, list[str]], None] | None = None,
+        on_document_failed: Callable[[tuple], None] | None = None,
+    ):
+        self.embeddings = embeddings
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.embed_workers = max(1, embed_workers)
+        self.chunk_workers = max(1, chunk_workers)
+        self.queue_size = queue_size
+        self.sinks = list(sinks or [])
+        self.on_document_done = on_document_done
+        self.on_document_failed = on_document_failed
+        self.stats = {}
+
+    # --- Tầng 1: chunk ---
+
+    def _produce(self, task, prepare, chunk_q: queue.Queue, parent=None) -> None:
+        # Thời gian span gồm cả lúc chờ queue đầy (tầng embed / ghi chậm hơn tầng chunk)
+        with tracer.span("ingest.chunk", parent) as span:
+            prepared = prepare(task)
+            if prepared is None:
+                return
+            doc_key, chunks = prepared
+            count = 0
+            failed = False
+            try:
+                for chunk_id, doc in chunks:
+                    chunk_q.put(("chunk", doc_key, chunk_id, doc))
+                    count += 1
+            except Exception as e:
+                print(f"  LỖI khi chunk {doc_key}: {e}")
+                failed = True
+            span.set(document="/".join(map(str, doc_key)), chunks=count, failed=failed)
+        chunk_q.put(("end", doc_key, count, failed))
+
+    def _feed(self, tasks: Iterable, prepare, chunk_q: queue.Queue, parent=None) -> None:
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as pool:
+            for task in tasks:
+                pool.submit(self._produce, task, prepare, chunk_q, parent)
+        chunk_q.put(_DONE)
+
+    # --- Tầng 2: embed theo lô ---
+
+    def _embed_batch(self, batch: list[tuple], parent=None) -> tuple:
+        texts = [doc.page_content for _, _, doc in batch]
+        try:
+            with tracer.span("ingest.embed", parent, texts=len(texts)) as span:
+                if tracer.enabled:
+                    span.set(input_bytes=sum(payload_bytes(text) for text in texts))
+                return ("batch", batch, self.embeddings.embed_documents(texts), None)
+        except Exception as e:
+            return ("batch", batch, None, e)
+
+    def _batch_and_embed(self, chunk_q: queue.Queue, write_q: queue.Queue, parent=None) -> None:
+        # Giới hạn số lô đang embed để không dồn RAM khi writer chậm
+        in_flight = threading.Semaphore(self.embed_workers * 2)
+
+        def submit(pool, batch):
+            in_flight.acquire()
+            future = pool.submit(self._embed_batch, batch, parent)
+
+            def forward(f):
+                write_q.put(f.result())
+                in_flight.release()
+
+            future.add_done_callback(forward)
+
+        with ThreadPoolExecutor(max_workers=self.embed_workers) as pool:
+            batch = []
+            while True:
+                item = chunk_q.get()
+                if item is _DONE:
+                    break
+                if item[0] == "end":
+                    write_q.put(item)
+                    continue
+                _, doc_key, chunk_id, doc = item
+                batch.append((doc_key, chunk_id, doc))
+                if len(batch) >= self.batch_size:
+                    submit(pool, batch)
+                    batch = []
+            if batch:
+                submit(pool, batch)
+        write_q.put(_DONE)
+
+    # --- Tầng 3: writer ---
+
+    def run(self, tasks: Iterable, prepare: Callable) -> dict:
+        start = time.perf_counter()
+        chunk_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+
+        # Thread của các tầng không thấy span hiện tại -> truyền span cha vào
+        parent = tracer.current()
+        threading.Thread(target=self._feed, args=(tasks, prepare, chunk_q, parent), daemon=True).start()
+        threading.Thread(target=self._batch_and_embed, args=(chunk_q, write_q, parent), daemon=True).start()
+
+        written_ids = {}   # doc_key -> chunk IDs đã ghi
+        expected = {}      # doc_key -> (số chunk, lỗi khi chunk?)
+        failed = set()
+        stats = {"chunks": 0, "batches": 0, "documents": 0, "failed_documents": 0}
+
+        def maybe_finish(doc_key):
+            if doc_key not in expected:
+                return
+            count, chunk_failed = expected[doc_key]
+            ids = written_ids.get(doc_key, [])
+            if len(ids) < count:
+                return
+            del expected[doc_key]
+            written_ids.pop(doc_key, None)
+            if chunk_failed or doc_key in failed:
+                failed.discard(doc_key)
+                stats["failed_documents"] += 1
+                if self.on_document_failed:
+                    self.on_document_failed(doc_key)
+            else:
+                stats["documents"] += 1
+                if self.on_document_done:
+                    self.on_document_done(doc_key, ids)
+
+        while True:
+            item = write_q.get()
+            if item is _DONE:
+                break
+
+            if item[0] == "end":
+                _, doc_key, count, chunk_failed = item
+                expected[doc_key] = (count, chunk_failed)
+                maybe_finish(doc_key)
+                continue
+
+            _, batch, vectors, error = item
+            if error is None:
+                try:
+                    ids = [chunk_id for _, chunk_id, _ in batch]
+                    metadatas = [doc.metadata for _, _, doc in batch]
+                    documents = [doc.page_content for _, _, doc in batch]
+                    with tracer.span("ingest.write", rows=len(ids)):
+                        self.collection.upsert(
+                            ids=ids, embeddings=vectors, metadatas=metadatas, documents=documents
+                        )
+                        for sink in self.sinks:
+                            sink.upsert(ids=ids, metadatas=metadatas, documents=documents)
+                    stats["batches"] += 1
+                    stats["chunks"] += len(batch)
+                except Exception as e:
+                    error = e
+            if error is not None:
+                print(f"  LỖI khi embed/ghi lô {len(batch)} chunk: {error}")
+                failed.update(doc_key for doc_key, _, _ in batch)
+
+            touched = {}
+            for doc_key, chunk_id, _ in batch:
+                written_ids.setdefault(doc_key, []).append(chunk_id)
+                touched[doc_key] = None
+            for doc_key in touched:
+                maybe_finish(doc_key)
+
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        self.stats = stats
+        return stats
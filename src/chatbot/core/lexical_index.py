@@ -0,0 +1,171 @@
+# src/chatbot/core/lexical_index.py
+# (Index từ khoá BM25 (SQLite FTS5) build cùng lúc ingest, nằm cạnh Chroma store)
+
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+_SQLITE_BATCH = 500
+_WORD_RE = re.compile(r"[^\W_]+(?:[-'./][^\W_]+)*")
+_JOINER_RE = re.compile(r"[-'./]")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+def fold_text(text: str) -> str:
+    """Chữ thường + bỏ dấu tiếng Việt ("Đổi bằng" -> "doi bang")"""
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Tách token cho BM25:
+    - "N-BOX" -> ["nbox", "n", "box"] (giữ được cả dạng liền để khớp chính xác)
+    - Chữ Nhật/Hán -> bigram ký tự (không có khoảng trắng giữa các từ)
+    """
+    tokens = []
+    for match in _WORD_RE.finditer(fold_text(text)):
+        parts = [p for p in _JOINER_RE.split(match.group()) if p]
+        if len(parts) > 1:
+            tokens.append("".join(parts))
+        for part in parts:
+            if _CJK_RE.search(part) and len(part) > 1:
+                tokens.extend(part[i:i + 2] for i in range(len(part) - 1))
+            else:
+                tokens.append(part)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    Inverted index BM25 dựa trên SQLite FTS5.
+    Có cùng interface ghi với Chroma collection (`upsert`, `delete`) để
+    pipeline ingest ghi song song vào cả hai.
+    """
+
+    def __init__(self, db_path: Path):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                topic TEXT,
+                document_id TEXT,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_document ON chunks (topic, document_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(tokens);
+            """
+        )
+        self._conn.commit()
+
+    # --- Ghi (được gọi từ writer của pipeline ingest) ---
+
+    def _delete_rowids(self, rowids: list[int]) -> None:
+        for start in range(0, len(rowids), _SQLITE_BATCH):
+            batch = rowids[start:start + _SQLITE_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE rowid IN ({placeholders})", batch)
+
+    def _rowids_for(self, ids: list[str]) -> list[int]:
+        rowids = []
+        for start in range(0, len(ids), _SQLITE_BATCH):
+            batch = ids[start:start + _SQLITE_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rowids.extend(
+                r[0] for r in self._conn.execute(
+                    f"SELECT rowid FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                )
+            )
+        return rowids
+
+    def upsert(self, ids: list[str], metadatas: list[dict], documents: list[str], embeddings=None) -> None:
+        with self._lock:
+            self._delete_rowids(self._rowids_for(list(ids)))
+            for chunk_id, meta, text in zip(ids, metadatas, documents):
+                meta = meta or {}
+                cur = self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, topic, document_id, content, metadata) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, meta.get("topic"), meta.get("document_id"), text,
+                     json.dumps(meta, ensure_ascii=False)),
+                )
+                self._conn.execute(
+                    "INSERT INTO chunks_fts (rowid, tokens) VALUES (?, ?)",
+                    (cur.lastrowid, " ".join(tokenize(text))),
+                )
+            self._conn.commit()
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            self._delete_rowids(self._rowids_for(list(ids)))
+            self._conn.commit()
+
+    def delete_document(self, topic: str, document_id: str) -> None:
+        with self._lock:
+            rowids = [
+                r[0] for r in self._conn.execute(
+                    "SELECT rowid FROM chunks WHERE topic = ? AND document_id = ?",
+                    (topic, document_id),
+                )
+            ]
+            self._delete_rowids(rowids)
+            self._conn.commit()
+
+    # --- Đọc ---
+
+    def has_document(self, topic: str, document_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM chunks WHERE topic = ? AND document_id = ? LIMIT 1",
+                (topic, document_id),
+            ).fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(self, query: str, k: int = 10, topic: str | list[str] | None = None) -> list[tuple[Document, float]]:
+        """Top-k theo điểm BM25 (càng lớn càng khớp). topic: 1 topic hoặc list topic (shard đã định tuyến)"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        match = " OR ".join(f'"{t}"' for t in tokens)
+        sql = (
+            "SELECT c.chunk_id, c.content, c.metadata, -bm25(chunks_fts) AS score "
+            "FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid "
+            "WHERE chunks_fts MATCH ?"
+        )
+        params = [match]
+        if isinstance(topic, str):
+            sql += " AND c.topic = ?"
+            params.append(topic)
+        elif topic is not None:
+            sql += f" AND c.topic IN ({', '.join('?' * len(topic))})"
+            params.extend(topic)
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            (Document(page_content=content, metadata=json.loads(meta), id=chunk_id), score)
+            for chunk_id, content, meta, score in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
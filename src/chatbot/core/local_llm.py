@@ -0,0 +1,89 @@
+# src/chatbot/core/local_llm.py
+# (LLM giả lập chạy local, thay Gemini khi test service / đo tải: không gọi mạng, không tốn quota)
+
+import asyncio
+import time
+import uuid
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Tool mà model giả lập sẽ gọi ở lượt đầu (nhận tham số "query")
+_RETRIEVAL_TOOL = "retrieve_context"
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    Hành vi cố định, đủ để chạy trọn vòng agent:
+    - Tin nhắn người dùng mới -> gọi `retrieve_context` với chính câu hỏi (nếu tool đã bind).
+    - Đã có kết quả tool -> trả lời bằng đoạn đầu của kết quả đó.
+    `latency_seconds` mô phỏng độ trễ mỗi lần gọi LLM thật (khi stream: độ trễ trước token đầu).
+    """
+
+    latency_seconds: float = 0.0
+    tool_names: list[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-stand-in"
+
+    def bind_tools(self, tools, **kwargs: Any) -> "LocalChatModel":
+        names = [convert_to_openai_tool(t)["function"]["name"] for t in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    def _respond(self, messages: list[BaseMessage]) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=f"Dạ, em tìm được thông tin sau: {str(last.content)[:500]}")
+        elif isinstance(last, HumanMessage) and _RETRIEVAL_TOOL in self.tool_names:
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": _RETRIEVAL_TOOL,
+                    "args": {"query": str(last.content)},
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }],
+            )
+        else:
+            message = AIMessage(content=f"Dạ, em đã nhận câu hỏi: {last.content}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._respond(messages)
+
+    # --- Stream: trả lời từng từ một (để đo time-to-first-token như với Gemini) ---
+    def _chunks(self, messages: list[BaseMessage]):
+        message = self._respond(messages).generations[0].message
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_calls=message.tool_calls))
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,73 @@
+# src/chatbot/core/onnx_embeddings.py
+# (Embedding MiniLM chạy bằng ONNX Runtime trên CPU, model int8 nằm ở thư mục local - không cần PyTorch)
+
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Cùng kết quả với HuggingFaceEmbeddings(all-MiniLM-L6-v2, normalize_embeddings=True):
+    tokenizer.json (thư viện `tokenizers`) -> ONNX model -> mean pooling theo attention mask -> chuẩn hoá L2.
+    model_dir: thư mục chứa `model_file` và tokenizer.json.
+    """
+
+    def __init__(self, model_dir, model_file: str = "model_quantized.onnx", num_threads: int = 1,
+                 batch_size: int = 32, max_length: int = 256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / model_file
+        tokenizer_path = model_dir / "tokenizer.json"
+        for path in (model_path, tokenizer_path):
+            if not path.exists():
+                raise FileNotFoundError(
+                    f"Không thấy {path}. Hãy chạy scripts/export_onnx_embedding.py trước."
+                )
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+        # Mean pooling (bỏ token padding) rồi chuẩn hoá L2, giống sentence-transformers
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        # Xếp theo độ dài để mỗi lô ít padding, rồi trả về đúng thứ tự ban đầu
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: list = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_idx = order[start:start + self.batch_size]
+            batch_vectors = self._embed_batch([texts[i] for i in batch_idx])
+            for i, vec in zip(batch_idx, batch_vectors.tolist()):
+                vectors[i] = vec
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
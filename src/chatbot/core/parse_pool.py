@@ -0,0 +1,132 @@
+# src/chatbot/core/parse_pool.py
+# (Chạy parse file trên nhiều process, cô lập lỗi: timeout + giới hạn RAM cho từng file)
+
+import multiprocessing as mp
+import time
+from multiprocessing.connection import wait
+from typing import Callable, Iterable
+
+try:
+    import resource  # Chỉ có trên Unix
+except ImportError:
+    resource = None
+
+
+def _apply_memory_limit(max_memory_mb: int | None) -> None:
+    if not max_memory_mb or resource is None:
+        return
+    limit = int(max_memory_mb) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, job: Callable, max_memory_mb: int | None) -> None:
+    """Vòng lặp của 1 process con: nhận item -> chạy job -> gửi kết quả về"""
+    _apply_memory_limit(max_memory_mb)
+    while True:
+        try:
+            item = conn.recv()
+        except EOFError:
+            break
+        if item is None:
+            break
+        start = time.perf_counter()
+        try:
+            result = job(item)
+            conn.send(("ok", result, None, time.perf_counter() - start))
+        except MemoryError:
+            conn.send(("memory_error", None, "vượt giới hạn RAM", time.perf_counter() - start))
+        except Exception as e:
+            conn.send(("error", None, f"{type(e).__name__}: {e}", time.perf_counter() - start))
+
+
+class _Worker:
+    def __init__(self, ctx, job, max_memory_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, job, max_memory_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.item = None
+        self.started = 0.0
+
+    def assign(self, item) -> None:
+        self.item = item
+        self.started = time.perf_counter()
+        self.conn.send(item)
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+def run_pool(
+    job: Callable,
+    items: Iterable,
+    workers: int,
+    timeout_seconds: float | None = None,
+    max_memory_mb: int | None = None,
+):
+    """
+    Chạy `job(item)` trên `workers` process con, trả về (yield) từng record:
+        {"item", "status": ok|error|memory_error|timeout|crashed, "seconds", "result", "error"}
+
+    - Item chạy quá `timeout_seconds` -> process bị kill, item ghi "timeout", process mới thay thế.
+    - Process chết giữa chừng (segfault, OOM killer...) -> item ghi "crashed".
+    `job` phải là hàm top-level (pickle được).
+    """
+    ctx = mp.get_context()
+    pending = list(items)
+    pending.reverse()  # pop() từ cuối -> giữ nguyên thứ tự ban đầu
+    pool = [_Worker(ctx, job, max_memory_mb) for _ in range(max(1, min(workers, len(pending))))]
+
+    def record(worker, status, result=None, error=None, seconds=None):
+        if seconds is None:
+            seconds = time.perf_counter() - worker.started
+        rec = {
+            "item": worker.item, "status": status, "seconds": round(seconds, 3),
+            "result": result, "error": error,
+        }
+        worker.item = None
+        return rec
+
+    try:
+        while True:
+            for w in pool:
+                if w.item is None and pending:
+                    w.assign(pending.pop())
+            busy = [w for w in pool if w.item is not None]
+            if not busy:
+                break
+
+            ready = wait([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout=0.5)
+            now = time.perf_counter()
+
+            for i, w in enumerate(pool):
+                if w.item is None:
+                    continue
+                if w.conn in ready:
+                    try:
+                        status, result, error, seconds = w.conn.recv()
+                        yield record(w, status, result, error, seconds)
+                        continue
+                    except (EOFError, OSError):
+                        pass  # Process đã chết -> xử lý như crash bên dưới
+                if not w.process.is_alive():
+                    yield record(w, "crashed", error=f"process thoát với mã {w.process.exitcode}")
+                    w.stop(kill=True)
+                    pool[i] = _Worker(ctx, job, max_memory_mb)
+                elif timeout_seconds and now - w.started > timeout_seconds:
+                    yield record(w, "timeout", error=f"quá {timeout_seconds}s")
+                    w.stop(kill=True)
+                    pool[i] = _Worker(ctx, job, max_memory_mb)
+    finally:
+        for w in pool:
+            w.stop(kill=w.item is not None)
@@ -0,0 +1,81 @@
+# src/chatbot/core/persona_router.py
+# (Chọn vai trò (Nhi / Minh / An) cho từng lượt chat: phiên đã rõ chủ đề -> agent có system prompt
+#  chỉ gồm phần chung + vai trò đó, thay vì gửi cả 3 vai trò ở mọi bước của agent)
+
+import threading
+from typing import Callable
+
+from langchain_core.messages import AIMessage
+
+from .prompts import PERSONA_PROMPTS, build_system_prompt
+
+
+class PersonaRouter:
+    """
+    Giữ sẵn 1 agent cho mỗi vai trò + 1 agent đủ 3 vai trò (chủ đề None, khi chưa rõ), dùng chung LLM / tools.
+    System prompt mỗi agent là hằng số -> tiền tố tĩnh ổn định theo vai trò (dễ được cache phía LLM).
+
+    - select(message, topic của phiên): từ khoá trong câu hỏi chỉ ra đúng 1 topic có vai trò -> dùng vai
+      trò đó (người dùng đổi chủ đề giữa chừng thì đổi vai); không khớp / khớp nhiều topic -> giữ chủ đề
+      đã lưu của phiên (phiên mới -> đủ 3 vai trò), trừ khi `classify(message)` (khớp chính xác BM25,
+      centroid embedding...) chỉ ra topic khác -> dùng agent đủ 3 vai trò cho lượt này, không giữ vai sai.
+    - record(topic, new_messages): cộng số token system prompt tiết kiệm được trong lượt
+      = (token prompt đủ - token prompt theo vai) x số lần gọi LLM của lượt.
+    """
+
+    def __init__(self, build_agent: Callable, router=None,
+                 classify: Callable[[str], str | None] | None = None, chars_per_token: float = 4.0):
+        self.router = router
+        self.classify = classify
+        self.agents = {topic: build_agent(topic) for topic in (None, *PERSONA_PROMPTS)}
+        # Ước lượng token như SessionStore (không cần tokenizer)
+        self.prompt_tokens = {
+            topic: int(len(build_system_prompt(topic)) / chars_per_token) for topic in self.agents
+        }
+
+        self._lock = threading.Lock()
+        self._turns = {topic: 0 for topic in self.agents}
+        self._llm_calls = 0
+        self._saved_tokens = 0
+        self._topic_mismatches = 0
+
+    def select(self, message: str, topic: str | None = None) -> tuple[str | None, object]:
+        """Trả về (chủ đề dùng cho lượt này, agent tương ứng)"""
+        route = self.router.match_keywords(message) if self.router is not None else None
+        if route is not None and len(route.topics) == 1 and route.topics[0] in self.agents:
+            topic = route.topics[0]
+        elif topic is not None and self.classify is not None:
+            # Không có từ khoá: chỉ giữ vai trò của phiên khi câu hỏi không thuộc rõ topic khác
+            detected = self.classify(message)
+            if detected is not None and detected != topic:
+                print(f"[DEBUG] Vai trò: câu hỏi thuộc '{detected}', phiên đang là '{topic}' -> đủ 3 vai trò")
+                with self._lock:
+                    self._topic_mismatches += 1
+                topic = None
+        if topic not in self.agents:
+            topic = None
+        return topic, self.agents[topic]
+
+    def record(self, topic: str | None, new_messages: list) -> int:
+        """Ghi nhận 1 lượt đã chạy; trả về số token system prompt tiết kiệm được"""
+        llm_calls = sum(isinstance(message, AIMessage) for message in new_messages)
+        saved = (self.prompt_tokens[None] - self.prompt_tokens.get(topic, self.prompt_tokens[None])) * llm_calls
+        with self._lock:
+            self._turns[topic if topic in self._turns else None] += 1
+            self._llm_calls += llm_calls
+            self._saved_tokens += saved
+        return saved
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            turns = sum(self._turns.values())
+            return {
+                "turns": {topic or "all": count for topic, count in self._turns.items()},
+                "prompt_tokens": {topic or "all": tokens for topic, tokens in self.prompt_tokens.items()},
+                "llm_calls": self._llm_calls,
+                # Lượt không có từ khoá nhưng thuộc topic khác chủ đề phiên -> dùng agent đủ 3 vai trò
+                "topic_mismatches": self._topic_mismatches,
+                "saved_tokens": self._saved_tokens,
+                "avg_saved_tokens_per_turn": round(self._saved_tokens / turns, 1) if turns else 0.0,
+            }
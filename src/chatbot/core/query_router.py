@@ -0,0 +1,130 @@
+# src/chatbot/core/query_router.py
+# (Định tuyến câu hỏi tới shard theo topic trước khi search: luật từ khoá, rồi centroid embedding;
+#  không đủ chắc chắn -> tìm trên mọi shard như cũ)
+
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from .retrieval_cache import normalize_query
+
+
+@dataclass
+class Route:
+    topics: list[str] | None  # None = tìm trên mọi shard
+    method: str               # "keyword" | "centroid" | "fallback"
+    confidence: float
+
+
+class QueryRouter:
+    """
+    Chọn shard (topic) cần tìm cho 1 câu hỏi, rẻ hơn nhiều so với chính lượt search:
+
+    - Từ khoá: so khớp trên câu hỏi đã bỏ dấu (normalize_query). Mỗi từ khoá khớp cộng điểm
+      bằng số từ của nó ("đổi bằng lái" nặng hơn "xe"). Topic điểm cao nhất thắng; hoà điểm
+      -> tìm trên các topic hoà nhau.
+    - Centroid: không có từ khoá nào khớp -> cosine giữa embedding câu hỏi và centroid của
+      từng shard. Chỉ chọn topic top-1 khi cách top-2 ít nhất `min_margin`.
+    - Còn lại (hoặc topic chọn ra phủ mọi shard) -> fallback: tìm tất cả.
+    """
+
+    def __init__(self, topics, topic_keywords: dict[str, list[str]] | None = None,
+                 centroids: dict[str, np.ndarray] | None = None,
+                 min_margin: float = 0.05, min_similarity: float = 0.2):
+        self.topics = sorted(topics)
+        self.min_margin = min_margin
+        self.min_similarity = min_similarity
+
+        # Từ khoá đã chuẩn hoá -> {topic: trọng số}. Từ khoá chung của nhiều topic không giúp phân biệt.
+        self._keywords: dict[str, dict[str, int]] = {}
+        for topic, keywords in (topic_keywords or {}).items():
+            if topic not in self.topics:
+                continue
+            for keyword in (topic, *keywords):
+                key = normalize_query(str(keyword))
+                if key:
+                    self._keywords.setdefault(key, {})[topic] = len(key.split())
+
+        self._centroid_topics = [t for t in self.topics if centroids and t in centroids]
+        self._centroids = (
+            np.stack([centroids[t] for t in self._centroid_topics]).astype(np.float32)
+            if self._centroid_topics else None
+        )
+
+        self._lock = threading.Lock()
+        self._counts = {"keyword": 0, "centroid": 0, "fallback": 0}
+        self._shards_searched = 0
+
+    # --- Định tuyến ---
+
+    def _keyword_route(self, query: str) -> Route | None:
+        text = normalize_query(query)
+        padded = f" {text} "
+        scores: dict[str, int] = {}
+        for keyword, weights in self._keywords.items():
+            # Từ khoá chữ Latin khớp theo nguyên từ; chữ Nhật (không có khoảng trắng) khớp chuỗi con
+            if (f" {keyword} " in padded) if keyword.isascii() else (keyword in text):
+                for topic, weight in weights.items():
+                    scores[topic] = scores.get(topic, 0) + weight
+        if not scores:
+            return None
+        ranked = sorted(scores.values(), reverse=True)
+        best = ranked[0]
+        second = ranked[1] if len(ranked) > 1 else 0
+        topics = sorted(t for t, score in scores.items() if score == best)
+        return Route(topics, "keyword", round((best - second) / best, 3))
+
+    def _centroid_route(self, embedding) -> Route | None:
+        if self._centroids is None or embedding is None:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        sims = self._centroids @ query
+        order = np.argsort(-sims)
+        best = float(sims[order[0]])
+        margin = best - float(sims[order[1]]) if len(order) > 1 else best
+        if best < self.min_similarity or margin < self.min_margin:
+            return Route(None, "fallback", round(margin, 3))
+        return Route([self._centroid_topics[order[0]]], "centroid", round(margin, 3))
+
+    def match_keywords(self, query: str) -> Route | None:
+        """Chỉ bước từ khoá (không đếm vào stats), ví dụ để chọn vai trò của phiên chat"""
+        return self._keyword_route(query)
+
+    def match_centroid(self, embedding) -> Route | None:
+        """Chỉ bước centroid (không đếm vào stats); None nếu không đủ chắc chắn / chưa có centroid"""
+        route = self._centroid_route(embedding)
+        return route if route is not None and route.method == "centroid" else None
+
+    def route(self, query: str, embedding=None, embed_fn: Callable | None = None) -> Route:
+        """
+        `embedding`: vector câu hỏi (đã có sẵn cho lượt search) -> dùng cho bước centroid.
+        `embed_fn`: tính vector khi cần - chỉ gọi khi từ khoá không định tuyến được và có centroid.
+        """
+        route = self._keyword_route(query)
+        if route is None:
+            if embedding is None and embed_fn is not None and self._centroids is not None:
+                embedding = embed_fn()
+            route = self._centroid_route(embedding) or Route(None, "fallback", 0.0)
+        if route.topics is not None and len(route.topics) >= len(self.topics):
+            route = Route(None, "fallback", route.confidence)
+        with self._lock:
+            self._counts[route.method] += 1
+            self._shards_searched += len(self.topics) if route.topics is None else len(route.topics)
+        return route
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            routes = sum(self._counts.values())
+            return {
+                **self._counts,
+                "topics": len(self.topics),
+                # Tỉ lệ shard phải tìm trung bình (1.0 = như tìm toàn bộ)
+                "avg_shard_fraction": (
+                    round(self._shards_searched / (routes * len(self.topics)), 3)
+                    if routes and self.topics else 1.0
+                ),
+            }
@@ -0,0 +1,69 @@
+# src/chatbot/core/registry.py
+# (Registry dùng chung cả process: model embedding, LLM client, vector store chỉ được tạo 1 lần, khi cần)
+
+import threading
+import time
+from typing import Callable
+
+
+class ModelRegistry:
+    """
+    Giữ các đối tượng nặng theo key, ví dụ ("embeddings", tên model) hay ("vector_store", thư mục).
+    - get(key, factory): lần đầu gọi factory() rồi giữ lại; các lần sau trả luôn bản đã tạo.
+      Nhiều thread cùng hỏi 1 key -> chỉ 1 thread tạo, các thread khác chờ.
+      factory trả None (ví dụ thiếu API key) -> không giữ lại, lần sau thử tạo lại.
+    - warm_up(...): tạo trước (lúc khởi động worker) thay vì ở request đầu tiên.
+    - report(): thời gian tạo từng đối tượng (cho báo cáo startup).
+    """
+
+    def __init__(self):
+        self._instances = {}
+        self._timings: dict[str, float] = {}
+        self._locks: dict = {}
+        self._guard = threading.Lock()
+
+    def get(self, key: tuple, factory: Callable):
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            instance = self._instances.get(key)
+            if instance is not None:
+                return instance
+            start = time.perf_counter()
+            instance = factory()
+            seconds = time.perf_counter() - start
+            if instance is not None:
+                self._instances[key] = instance
+                self._timings[self._label(key)] = round(seconds, 3)
+                print(f"LOG: [registry] Đã tạo {self._label(key)} ({seconds:.2f}s).")
+            return instance
+
+    def loaded(self, key: tuple) -> bool:
+        return key in self._instances
+
+    def warm_up(self, *loaders: Callable) -> dict:
+        """Gọi lần lượt các hàm get_* (ví dụ get_embedding_model) để tạo sẵn; trả về report()"""
+        for loader in loaders:
+            loader()
+        return self.report()
+
+    def report(self) -> dict:
+        return dict(self._timings)
+
+    def clear(self):
+        with self._guard:
+            self._instances.clear()
+            self._timings.clear()
+            self._locks.clear()
+
+    @staticmethod
+    def _label(key: tuple) -> str:
+        return ":".join(str(part) for part in key)
+
+
+# Registry mặc định của process
+registry = ModelRegistry()
@@ -0,0 +1,211 @@
+# src/chatbot/core/retrieval_cache.py
+# (Cache kết quả retrieval đặt trước vector store:
+#  khớp chính xác theo câu hỏi đã chuẩn hoá + khớp gần đúng theo cosine của embedding câu hỏi)
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+from .lexical_index import fold_text
+from .tracing import tracer, payload_bytes
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Chữ thường, bỏ dấu, bỏ dấu câu, gộp khoảng trắng -> key cache"""
+    return _SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", fold_text(query))).strip()
+
+
+def index_key_terms(terms) -> dict[str, list[tuple[str, ...]]]:
+    """Danh sách thực thể ("Osaka", "N-BOX", "Kei Car"...) -> {từ đầu: [cụm từ đã chuẩn hoá]} để so khớp nhanh"""
+    index = {}
+    for term in terms:
+        words = tuple(normalize_query(str(term)).split())
+        if words and words not in index.get(words[0], []):
+            index.setdefault(words[0], []).append(words)
+    return index
+
+
+def key_tokens(query: str, key_terms: dict | None = None) -> frozenset:
+    """
+    Token "định danh" của câu hỏi: số + thực thể đã biết (địa danh, hãng, kiểu xe... trong `key_terms`,
+    dựng bằng index_key_terms). Hai câu hỏi chỉ khác nhau ở các token này (Osaka / Tokyo, 2018 / 2020)
+    có embedding rất gần nhau nhưng cần kết quả khác nhau. Từ thường ("cho", "bao", "xe") không tính.
+    """
+    words = normalize_query(query).split()
+    tokens = {word for word in words if any(ch.isdigit() for ch in word)}
+    for i, word in enumerate(words):
+        for term in (key_terms or {}).get(word, ()):
+            if tuple(words[i:i + len(term)]) == term:
+                tokens.add(" ".join(term))
+    return frozenset(tokens)
+
+
+def _unit(embedding) -> np.ndarray:
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class RetrievalCache:
+    """
+    LRU + TTL cho kết quả retrieval.
+
+    - Khớp chính xác: cùng câu hỏi sau khi chuẩn hoá -> trả kết quả cũ, không embed, không search.
+    - Lối tắt `exact_match` (truyền vào retrieve, ví dụ BM25 khớp "N-BOX") -> chạy trước khi embed.
+    - Khớp gần đúng (tuỳ chọn): embed câu hỏi 1 lần, nếu cosine với 1 câu hỏi đã cache
+      >= `similarity_threshold` VÀ cùng số + thực thể trong `key_terms` (địa danh, hãng...)
+      -> dùng lại kết quả (bỏ qua bước search). Embedding gần nhau nhưng khác địa danh / số -> không dùng.
+    - `revision_fn` (ví dụ revision của manifest ingest) thay đổi -> xoá toàn bộ cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        embed_fn: Callable[[str], list[float]] | None = None,
+        similarity_threshold: float = 0.92,
+        revision_fn: Callable[[], int] | None = None,
+        revision_check_seconds: float = 5.0,
+        key_terms=(),
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.revision_fn = revision_fn
+        self.revision_check_seconds = revision_check_seconds
+        self.key_terms = index_key_terms(key_terms)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (thời điểm lưu, docs, embedding | None, key_tokens)
+        self._matrix = None            # (keys, ma trận embedding) dựng lại khi cache đổi
+        self._revision = revision_fn() if revision_fn else None
+        self._revision_checked_at = time.monotonic()
+        # Cập nhật khi đang giữ self._lock (tool retrieval chạy ở nhiều thread)
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "semantic_rejected": 0, "exact_match_shortcuts": 0,
+                      "misses": 0, "evictions": 0, "invalidations": 0}
+
+    # --- Nội bộ ---
+
+    def _check_revision(self) -> None:
+        if self.revision_fn is None:
+            return
+        now = time.monotonic()
+        if now - self._revision_checked_at < self.revision_check_seconds:
+            return
+        self._revision_checked_at = now
+        revision = self.revision_fn()
+        with self._lock:
+            if revision != self._revision:
+                self._revision = revision
+                self._entries.clear()
+                self._matrix = None
+                self.stats["invalidations"] += 1
+
+    def _lookup(self, key: str):
+        """Gọi khi đang giữ self._lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl_seconds:
+            del self._entries[key]
+            self._matrix = None
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_exact(self, key: str):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.stats["exact_hits"] += 1
+                return entry[1], entry[2]
+            return None
+
+    def _get_nearest(self, embedding: np.ndarray, tokens: frozenset):
+        with self._lock:
+            if self._matrix is None:
+                keys = [k for k, e in self._entries.items() if e[2] is not None]
+                matrix = np.stack([self._entries[k][2] for k in keys]) if keys else None
+                self._matrix = (keys, matrix)
+            keys, matrix = self._matrix
+            if matrix is None:
+                return None
+            scores = matrix @ embedding
+            # Các câu đủ gần, gần nhất trước; chỉ nhận câu có cùng token định danh
+            candidates = np.flatnonzero(scores >= self.similarity_threshold)
+            for i in candidates[np.argsort(-scores[candidates])]:
+                entry = self._entries.get(keys[i])
+                if entry is not None and entry[3] == tokens and self._lookup(keys[i]) is not None:
+                    self.stats["semantic_hits"] += 1
+                    return entry[1]
+            if len(candidates):
+                self.stats["semantic_rejected"] += 1
+            return None
+
+    def _put(self, key: str, docs, embedding, tokens: frozenset = frozenset()) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), docs, embedding, tokens)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._matrix = None
+
+    # --- API ---
+
+    def retrieve(self, query: str, search: Callable[[str, list[float] | None], tuple[list, list | None]],
+                 exact_match: Callable[[str], list | None] | None = None) -> tuple[list, np.ndarray | None]:
+        """
+        Trả (docs, vector câu hỏi | None) từ cache nếu có, nếu không thì gọi `search(query, embedding)`
+        -> (docs, vector search đã dùng | None) và lưu lại.
+        `embedding` là vector câu hỏi đã tính (chế độ gần đúng) để search không phải embed lại.
+        `exact_match(query)`: lối tắt rẻ không cần vector (khớp chính xác BM25), thử TRƯỚC khi embed
+        cho chế độ gần đúng; trả None nếu không áp dụng được.
+        Vector trả về (đã chuẩn hoá) chỉ có khi đã phải embed - người gọi không cần embed lại.
+        """
+        self._check_revision()
+        key = normalize_query(query)
+        cached = self._get_exact(key)
+        if cached is not None:
+            return cached
+
+        tokens = key_tokens(query, self.key_terms)
+        if exact_match is not None:
+            docs = exact_match(query)
+            if docs is not None:
+                with self._lock:
+                    self.stats["exact_match_shortcuts"] += 1
+                self._put(key, docs, None, tokens)
+                return docs, None
+
+        embedding = None
+        if self.embed_fn is not None:
+            with tracer.span("query.embed", query_bytes=payload_bytes(query)):
+                embedding = self.embed_fn(query)
+            vec = _unit(embedding)
+            docs = self._get_nearest(vec, tokens)
+            if docs is not None:
+                self._put(key, docs, vec, tokens)
+                return docs, vec
+
+        with self._lock:
+            self.stats["misses"] += 1
+        docs, embedding = search(query, embedding)
+        vec = _unit(embedding) if embedding is not None else None
+        self._put(key, docs, vec, tokens)
+        return docs, vec
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
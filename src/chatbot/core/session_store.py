@@ -0,0 +1,235 @@
+# src/chatbot/core/session_store.py
+# (Lịch sử chat theo session_id: giới hạn theo token, tóm tắt lượt cũ, LRU + snapshot ra đĩa)
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, messages_from_dict, messages_to_dict
+
+# ID cố định của message tóm tắt (để nhận ra và bỏ đi khi agent trả lịch sử về)
+SUMMARY_MESSAGE_ID = "session-summary"
+# Độ dài tối đa mỗi vế (câu hỏi / câu trả lời) khi gộp 1 lượt cũ vào tóm tắt
+_SUMMARY_TURN_CHARS = 160
+
+
+def _message_text(message) -> str:
+    content = message.content
+    if isinstance(content, list):
+        content = " ".join(b if isinstance(b, str) else str(b.get("text", "")) for b in content)
+    text = str(content)
+    for call in getattr(message, "tool_calls", None) or []:
+        text += json.dumps(call.get("args", {}), ensure_ascii=False)
+    return text
+
+
+def estimate_tokens(message, chars_per_token: float = 4.0) -> int:
+    """Ước lượng số token của 1 message (không cần tokenizer: ~4 ký tự / token, +4 cho vai trò)"""
+    return int(len(_message_text(message)) / chars_per_token) + 4
+
+
+def split_turns(messages: list) -> list[list]:
+    """
+    Tách lịch sử thành các lượt, mỗi lượt bắt đầu bằng 1 HumanMessage
+    (kèm AIMessage gọi tool + ToolMessage kết quả + câu trả lời). Cắt theo lượt
+    -> không bao giờ tách rời cặp tool_call / tool_result.
+    """
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def summarize_turn(turn: list) -> str:
+    """Tóm tắt 1 lượt thành 1 dòng: câu hỏi của khách -> câu trả lời cuối của bot"""
+    question = _message_text(turn[0])[:_SUMMARY_TURN_CHARS]
+    answers = [m for m in turn[1:] if isinstance(m, AIMessage) and not m.tool_calls]
+    answer = _message_text(answers[-1])[:_SUMMARY_TURN_CHARS] if answers else "(chưa trả lời)"
+    return f"- Khách: {question} -> Bot: {answer}"
+
+
+class Session:
+    def __init__(self, session_id: str, messages: list | None = None, summary: str = "",
+                 topic: str | None = None):
+        self.session_id = session_id
+        self.messages = messages or []
+        self.summary = summary
+        # Chủ đề đã xác định của phiên (chọn vai trò / system prompt), None = chưa rõ
+        self.topic = topic
+        self.last_access = time.time()
+
+
+class SessionStore:
+    """
+    Lịch sử chat của nhiều khách trong 1 process, có giới hạn:
+    - Mỗi phiên: tổng token (tóm tắt + các lượt giữ lại) <= token_budget. Lượt cũ nhất bị gộp
+      vào bản tóm tắt chạy (running summary, tối đa summary_max_chars ký tự), lượt mới nhất luôn giữ.
+    - Cả process: tối đa max_sessions phiên trong RAM (LRU) và phiên rảnh quá idle_seconds bị đẩy ra.
+      Phiên bị đẩy ra được ghi snapshot JSON vào snapshot_dir, lần sau truy cập thì nạp lại.
+    `summarize_fn(old_summary, turns) -> str`: thay cách tóm tắt mặc định (ví dụ gọi LLM).
+    """
+
+    def __init__(self, token_budget: int, max_sessions: int, idle_seconds: float,
+                 summary_max_chars: int, snapshot_dir=None, chars_per_token: float = 4.0,
+                 summarize_fn=None):
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.summary_max_chars = summary_max_chars
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.chars_per_token = chars_per_token
+        self.summarize_fn = summarize_fn
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+        if self.snapshot_dir:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # --- Đọc / ghi lịch sử ---
+    def history(self, session_id: str) -> list:
+        """Lịch sử để gửi kèm lượt mới: [message tóm tắt (nếu có)] + các lượt giữ lại"""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            prefix = []
+            if session.summary:
+                prefix.append(HumanMessage(
+                    content=f"(Tóm tắt các lượt trò chuyện trước:\n{session.summary})",
+                    id=SUMMARY_MESSAGE_ID,
+                ))
+            return prefix + list(session.messages)
+
+    def topic(self, session_id: str) -> str | None:
+        """Chủ đề đã lưu của phiên (None: phiên mới / chưa rõ chủ đề)"""
+        with self._lock:
+            session = self._get(session_id)
+            return session.topic if session is not None else None
+
+    def update(self, session_id: str, messages: list, topic: str | None = None):
+        """
+        Lưu lịch sử sau 1 lượt (danh sách message agent trả về), rồi cắt theo ngân sách token.
+        `topic`: chủ đề của phiên sau lượt này (None = giữ nguyên).
+        """
+        messages = [m for m in messages if getattr(m, "id", None) != SUMMARY_MESSAGE_ID]
+        with self._lock:
+            session = self._get(session_id) or Session(session_id)
+            session.messages = messages
+            if topic is not None:
+                session.topic = topic
+            self._trim(session)
+            session.last_access = time.time()
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def reset(self, session_id: str) -> bool:
+        """Xoá phiên (cả trong RAM lẫn snapshot)"""
+        with self._lock:
+            existed = self._sessions.pop(session_id, None) is not None
+            path = self._snapshot_path(session_id)
+            if path is not None and path.exists():
+                path.unlink()
+                existed = True
+            return existed
+
+    def save_all(self):
+        """Ghi snapshot mọi phiên đang trong RAM (gọi khi tắt process)"""
+        with self._lock:
+            for session in self._sessions.values():
+                self._save(session)
+
+    def tokens(self, session_id: str) -> int:
+        return sum(estimate_tokens(m, self.chars_per_token) for m in self.history(session_id))
+
+    # --- Nội bộ ---
+    def _get(self, session_id: str) -> Session | None:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._load(session_id)
+            if session is None:
+                return None
+            self._sessions[session_id] = session
+        session.last_access = time.time()
+        self._sessions.move_to_end(session_id)
+        self._evict()
+        return session
+
+    def _trim(self, session: Session):
+        turns = split_turns(session.messages)
+        cost = [sum(estimate_tokens(m, self.chars_per_token) for m in turn) for turn in turns]
+        folded = []
+        while len(turns) > 1:
+            summary_tokens = int(len(session.summary) / self.chars_per_token) + 4 if session.summary else 0
+            if summary_tokens + sum(cost) <= self.token_budget:
+                break
+            folded.append(turns.pop(0))
+            cost.pop(0)
+            if self.summarize_fn is None:
+                session.summary = self._fold(session.summary, folded[-1:])
+        if folded:
+            if self.summarize_fn is not None:
+                session.summary = self.summarize_fn(session.summary, folded)[-self.summary_max_chars:]
+            session.messages = [m for turn in turns for m in turn]
+
+    def _fold(self, summary: str, turns: list) -> str:
+        lines = [summary] if summary else []
+        lines.extend(summarize_turn(turn) for turn in turns)
+        text = "\n".join(lines)
+        if len(text) > self.summary_max_chars:
+            # Giữ phần mới nhất, cắt ở đầu dòng
+            text = text[-self.summary_max_chars:]
+            text = text[text.find("\n") + 1:] if "\n" in text else text
+        return text
+
+    def _evict(self):
+        now = time.time()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            idle = now - session.last_access > self.idle_seconds
+            if len(self._sessions) <= self.max_sessions and not idle:
+                break
+            self._save(session)
+            del self._sessions[session_id]
+
+    # --- Snapshot ---
+    def _snapshot_path(self, session_id: str) -> Path | None:
+        if self.snapshot_dir is None:
+            return None
+        name = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return self.snapshot_dir / f"{name}.json"
+
+    def _save(self, session: Session):
+        path = self._snapshot_path(session.session_id)
+        if path is None:
+            return
+        data = {
+            "session_id": session.session_id,
+            "summary": session.summary,
+            "messages": messages_to_dict(session.messages),
+            "topic": session.topic,
+            "last_access": session.last_access,
+        }
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    def _load(self, session_id: str) -> Session | None:
+        path = self._snapshot_path(session_id)
+        if path is None or not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return Session(session_id, messages_from_dict(data["messages"]), data.get("summary", ""),
+                           data.get("topic"))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Lỗi] Không đọc được snapshot phiên {session_id}: {e}")
+            return None
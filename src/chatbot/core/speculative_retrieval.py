@@ -0,0 +1,155 @@
+# src/chatbot/core/speculative_retrieval.py
+# (Retrieval đón trước: tìm ngữ cảnh ngay khi nhận câu hỏi, song song với việc chờ lượt / gọi LLM,
+#  rồi đưa sẵn kết quả vào lượt chat để agent trả lời trong 1 lần gọi LLM thay vì 2)
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Callable
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from .retrieval_cache import normalize_query
+from .session_store import SUMMARY_MESSAGE_ID
+from .tracing import tracer
+
+# Tên tool retrieval của agent (core/agent.py) - tool call giả lập mang đúng tên này
+RETRIEVAL_TOOL = "retrieve_context"
+_NOT_FOUND = "Không tìm thấy"
+
+
+@dataclass
+class Prefetch:
+    query: str
+    future: object
+    started: float = field(default_factory=time.perf_counter)
+    status: str = "pending"  # "injected" | "late" (chưa xong khi hết giờ chờ) | "empty" | "error"
+
+
+class SpeculativeRetriever:
+    """
+    Lượt hỏi thông tin bình thường tốn 2 lần gọi LLM nối tiếp: (1) quyết định gọi retrieve_context,
+    (2) trả lời. Retrieval chạy local (ms) còn mỗi lần gọi LLM mất cả giây, nên:
+
+    - start(message, history): câu hỏi khớp từ khoá topic (bộ định tuyến) -> chạy `retrieve(query)`
+      ở thread riêng ngay lập tức, song song với lúc lượt chat chờ lock phiên / semaphore.
+      Câu hỏi nối tiếp không có từ khoá ("còn màu khác không?") -> ghép với câu hỏi trước đó (viết lại
+      local, không gọi LLM). Không khớp gì (chào hỏi...) -> không đón trước.
+    - messages(prefetch): đợi tối đa `max_wait_seconds`; có kết quả -> cặp message giả lập
+      AIMessage(tool_call retrieve_context) + ToolMessage(kết quả) chèn sau câu hỏi. Agent thấy như
+      đã tự gọi tool -> lần gọi LLM đầu trả lời luôn. Chưa xong -> không chèn; retrieval vẫn chạy tiếp
+      và nạp cache retrieval, nên tool call cùng câu hỏi của agent lấy từ cache.
+    - record(prefetch, new_messages): trúng = agent không gọi retrieve_context lần nữa
+      (tiết kiệm 1 lần gọi LLM); trượt = agent vẫn tự tra cứu (câu truy vấn khác).
+    """
+
+    def __init__(self, retrieve: Callable[[str], str], router=None, max_wait_seconds: float = 0.3,
+                 max_workers: int = 4, min_query_chars: int = 8):
+        self.retrieve = retrieve
+        self.router = router
+        self.max_wait_seconds = max_wait_seconds
+        self.min_query_chars = min_query_chars
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+
+        self._lock = threading.Lock()
+        self._counts = {"turns": 0, "skipped": 0, "late": 0, "injected": 0, "hits": 0, "misses": 0}
+
+    # --- Câu truy vấn đón trước ---
+
+    def _matches_topic(self, text: str) -> bool:
+        return self.router is None or self.router.match_keywords(text) is not None
+
+    def rewrite(self, message: str, history: list | None = None) -> str | None:
+        """Câu truy vấn cho retrieval (None = không đón trước)"""
+        message = " ".join(message.split())
+        if len(message) < self.min_query_chars:
+            return None
+        if self._matches_topic(message):
+            return message
+        # Câu hỏi nối tiếp: mượn ngữ cảnh từ câu hỏi gần nhất của người dùng (nếu câu đó khớp topic)
+        for previous in reversed(history or []):
+            if isinstance(previous, HumanMessage) and previous.id != SUMMARY_MESSAGE_ID:
+                text = " ".join(str(previous.content).split())
+                return f"{text} {message}" if self._matches_topic(text) else None
+        return None
+
+    def start(self, message: str, history: list | None = None) -> Prefetch | None:
+        query = self.rewrite(message, history)
+        with self._lock:
+            self._counts["turns"] += 1
+            if query is None:
+                self._counts["skipped"] += 1
+                return None
+        parent = tracer.current()
+
+        def _run():
+            with tracer.span("retrieval.speculative", parent=parent, query_bytes=len(query.encode())):
+                return self.retrieve(query)
+
+        return Prefetch(query, self._executor.submit(_run))
+
+    # --- Chèn kết quả vào lượt chat ---
+
+    def messages(self, prefetch: Prefetch | None) -> list:
+        """Cặp tool call / kết quả giả lập để nối sau câu hỏi ([] nếu chưa xong / không có kết quả)"""
+        if prefetch is None:
+            return []
+        remaining = self.max_wait_seconds - (time.perf_counter() - prefetch.started)
+        try:
+            context = prefetch.future.result(timeout=max(remaining, 0.0))
+        except FutureTimeout:
+            prefetch.status = "late"
+            with self._lock:
+                self._counts["late"] += 1
+            return []
+        except Exception as e:
+            prefetch.status = "error"
+            print(f"LOG: Retrieval đón trước lỗi: {e}")
+            return []
+        if not context or str(context).startswith(_NOT_FOUND):
+            prefetch.status = "empty"
+            return []
+
+        prefetch.status = "injected"
+        call_id = f"prefetch_{uuid.uuid4().hex[:12]}"
+        return [
+            AIMessage(content="", tool_calls=[{"name": RETRIEVAL_TOOL, "args": {"query": prefetch.query},
+                                               "id": call_id}]),
+            ToolMessage(content=context, name=RETRIEVAL_TOOL, tool_call_id=call_id),
+        ]
+
+    # --- Tỉ lệ trúng ---
+
+    def record(self, prefetch: Prefetch | None, new_messages: list) -> str:
+        """Ghi nhận kết quả 1 lượt: "hit" / "miss", hoặc lý do không chèn ("skipped", "late"...)"""
+        if prefetch is None:
+            return "skipped"
+        if prefetch.status != "injected":
+            return prefetch.status
+        queries = [
+            call["args"].get("query", "")
+            for message in new_messages if isinstance(message, AIMessage)
+            for call in message.tool_calls if call["name"] == RETRIEVAL_TOOL
+        ]
+        # Agent tra cứu lại đúng câu đã đón trước (đã có sẵn kết quả) vẫn tính là trượt: tốn thêm 1 lần gọi LLM
+        outcome = "miss" if queries else "hit"
+        with self._lock:
+            self._counts["injected"] += 1
+            self._counts["hits" if outcome == "hit" else "misses"] += 1
+        if queries:
+            same = any(normalize_query(q) == normalize_query(prefetch.query) for q in queries)
+            print(f"[DEBUG] Retrieval đón trước trượt: agent tra cứu {queries!r}"
+                  f"{' (trùng câu đã đón trước)' if same else ''}")
+        return outcome
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["hit_rate"] = round(counts["hits"] / counts["injected"], 3) if counts["injected"] else 0.0
+        return counts
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,104 @@
+# src/chatbot/core/streaming.py
+# (Stream 1 lượt chat của agent: token câu trả lời + tiến trình gọi tool, kèm đo TTFT / tổng thời gian)
+
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+# Tên node LLM trong graph của create_agent
+_MODEL_NODE = "model"
+# Độ dài tối đa phần xem trước kết quả tool trong event
+_TOOL_PREVIEW_CHARS = 200
+
+
+def message_text(content) -> str:
+    """Lấy phần chữ từ content của message (Gemini có thể trả list block thay vì chuỗi)"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block if isinstance(block, str) else block.get("text", "")
+            for block in content
+            if isinstance(block, str) or block.get("type") == "text"
+        )
+    return ""
+
+
+class TurnTimer:
+    """Đo 1 lượt chat: time-to-first-token (token đầu tiên của câu trả lời) và tổng thời gian"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft_ms: float | None = None
+        self.total_ms: float | None = None
+
+    def first_token(self):
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.start) * 1000
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+
+    def as_dict(self) -> dict:
+        return {
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "total_ms": round(self.total_ms, 1) if self.total_ms is not None else None,
+        }
+
+
+def _events_from_chunk(mode: str, data, timer: TurnTimer, new_messages: list) -> list[dict]:
+    """
+    Đổi 1 chunk stream của LangGraph (stream_mode=["messages", "updates"]) thành event:
+    - {"type": "token", "text"}: 1 đoạn câu trả lời của LLM
+    - {"type": "tool_call", "name", "args"}: agent bắt đầu gọi tool
+    - {"type": "tool_result", "name", "preview"}: tool đã chạy xong
+    Message hoàn chỉnh (từ "updates") được gom vào `new_messages` để cập nhật lịch sử.
+    """
+    events = []
+    if mode == "messages":
+        chunk, metadata = data
+        if metadata.get("langgraph_node") == _MODEL_NODE and not isinstance(chunk, ToolMessage):
+            text = message_text(chunk.content)
+            if text:
+                timer.first_token()
+                events.append({"type": "token", "text": text})
+    elif mode == "updates":
+        for update in data.values():
+            for message in (update or {}).get("messages", []):
+                new_messages.append(message)
+                if isinstance(message, AIMessage):
+                    for call in message.tool_calls:
+                        events.append({"type": "tool_call", "name": call["name"], "args": call["args"]})
+                elif isinstance(message, ToolMessage):
+                    preview = message_text(message.content)[:_TOOL_PREVIEW_CHARS]
+                    events.append({"type": "tool_result", "name": message.name, "preview": preview})
+    return events
+
+
+def _done_event(messages: list, new_messages: list, timer: TurnTimer) -> dict:
+    timer.finish()
+    history = list(messages) + new_messages
+    answer = message_text(history[-1].content) if new_messages else ""
+    return {"type": "done", "answer": answer, "messages": history, **timer.as_dict()}
+
+
+def stream_turn(agent, messages: list):
+    """
+    Chạy 1 lượt chat dạng stream (đồng bộ, cho terminal). Yield các event ở trên,
+    cuối cùng là {"type": "done", "answer", "messages" (lịch sử mới), "ttft_ms", "total_ms"}.
+    """
+    timer = TurnTimer()
+    new_messages = []
+    for mode, data in agent.stream({"messages": messages}, stream_mode=["messages", "updates"]):
+        yield from _events_from_chunk(mode, data, timer, new_messages)
+    yield _done_event(messages, new_messages, timer)
+
+
+async def astream_turn(agent, messages: list):
+    """Giống stream_turn nhưng bất đồng bộ (cho HTTP service)"""
+    timer = TurnTimer()
+    new_messages = []
+    async for mode, data in agent.astream({"messages": messages}, stream_mode=["messages", "updates"]):
+        for event in _events_from_chunk(mode, data, timer, new_messages):
+            yield event
+    yield _done_event(messages, new_messages, timer)
@@ -0,0 +1,241 @@
+# src/chatbot/core/table_query.py
+# (Engine truy vấn có cấu trúc trong RAM cho dữ liệu "table_rows":
+#  mỗi cột là 1 mảng NumPy, cột phân loại có sẵn index giá trị -> danh sách hàng)
+
+import csv
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+from . import table_store
+from .lexical_index import fold_text
+
+# Toán tử lọc hỗ trợ: (cột, toán tử, giá trị)
+FILTER_OPS = ("eq", "in", "contains", "gte", "lte", "gt", "lt")
+AGGREGATE_METRICS = ("count", "min", "max", "mean", "sum")
+
+
+def _to_numeric(values: list) -> np.ndarray | None:
+    """Chuyển cột sang float64 (NaN = trống). Trả về None nếu cột không phải số."""
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        if v is None or v == "":
+            out[i] = np.nan
+            continue
+        if isinstance(v, bool):
+            return None
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            return None
+        if not math.isfinite(out[i]):
+            return None
+    return out
+
+
+class StructuredTable:
+    """
+    Bảng dạng cột trong RAM. Lọc bằng mask NumPy, cột phân loại (fuel, body_type...)
+    dùng index dựng sẵn: giá trị (đã bỏ dấu, chữ thường) -> mảng chỉ số hàng.
+    """
+
+    def __init__(self, name: str, data: dict[str, list], categorical_columns=()):
+        self.name = name
+        self.columns = list(data)
+        self.n_rows = len(next(iter(data.values()), []))
+        self.numeric = {}   # cột số: float64
+        self.text = {}      # cột chữ: giá trị gốc (object)
+        self._folded = {}   # cột chữ: giá trị đã fold (so khớp không dấu/không hoa thường)
+        self.categories = {}  # cột phân loại: {giá trị fold: chỉ số hàng}
+        self._labels = {}     # cột phân loại: {giá trị fold: nhãn gốc}
+
+        for col, values in data.items():
+            numeric = _to_numeric(values)
+            if numeric is not None and col not in categorical_columns:
+                self.numeric[col] = numeric
+                continue
+            raw = ["" if v is None else str(v) for v in values]
+            self.text[col] = np.array(raw, dtype=object)
+            self._folded[col] = np.array([fold_text(v).strip() for v in raw], dtype=object)
+
+        for col in categorical_columns:
+            if col not in self._folded:
+                continue
+            labels, codes = np.unique(self._folded[col].astype(str), return_inverse=True)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            self.categories[col] = {
+                label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(labels)
+            }
+            self._labels[col] = {}
+            for raw_value, folded in zip(self.text[col], self._folded[col]):
+                self._labels[col].setdefault(folded, raw_value)
+
+    # --- Lọc ---
+
+    def _mask_for(self, col: str, op: str, value) -> np.ndarray:
+        if col not in self.numeric and col not in self.text:
+            raise KeyError(f"Không có cột '{col}' trong bảng {self.name}")
+        if op not in FILTER_OPS:
+            raise ValueError(f"Toán tử không hỗ trợ: {op}")
+
+        if col in self.numeric:
+            arr = self.numeric[col]
+            if op == "in":
+                return np.isin(arr, [float(v) for v in value])
+            value = float(value)
+            return {
+                "eq": arr == value, "gte": arr >= value, "lte": arr <= value,
+                "gt": arr > value, "lt": arr < value,
+            }.get(op, np.zeros(self.n_rows, dtype=bool))
+
+        mask = np.zeros(self.n_rows, dtype=bool)
+        if op in ("eq", "in"):
+            wanted = [value] if op == "eq" else list(value)
+            wanted = [fold_text(str(v)).strip() for v in wanted]
+            if col in self.categories:
+                for w in wanted:
+                    rows = self.categories[col].get(w)
+                    if rows is not None:
+                        mask[rows] = True
+            else:
+                mask = np.isin(self._folded[col], wanted)
+        elif op == "contains":
+            needle = fold_text(str(value)).strip()
+            mask = np.fromiter((needle in v for v in self._folded[col]), dtype=bool, count=self.n_rows)
+        return mask
+
+    def select(self, filters: list[tuple[str, str, object]] = ()) -> np.ndarray:
+        """Trả về mảng chỉ số hàng thoả mãn TẤT CẢ điều kiện"""
+        mask = np.ones(self.n_rows, dtype=bool)
+        for col, op, value in filters:
+            mask &= self._mask_for(col, op, value)
+        return np.flatnonzero(mask)
+
+    def row(self, i: int) -> dict:
+        out = {}
+        for col in self.columns:
+            if col in self.numeric:
+                v = self.numeric[col][i]
+                out[col] = None if np.isnan(v) else (int(v) if v.is_integer() else float(v))
+            else:
+                out[col] = self.text[col][i]
+        return out
+
+    def query(self, filters=(), sort_by: str | None = None, descending: bool = False,
+              limit: int = 10) -> tuple[int, list[dict]]:
+        """Lọc + sắp xếp. Trả về (tổng số hàng khớp, các hàng đầu tiên)"""
+        idx = self.select(filters)
+        if sort_by:
+            if sort_by in self.numeric:
+                keys = self.numeric[sort_by][idx]
+                keys = np.where(np.isnan(keys), np.inf if not descending else -np.inf, keys)
+            elif sort_by in self.text:
+                keys = self._folded[sort_by][idx].astype(str)
+            else:
+                raise KeyError(f"Không có cột '{sort_by}' trong bảng {self.name}")
+            order = np.argsort(keys, kind="stable")
+            if descending:
+                order = order[::-1]
+            idx = idx[order]
+        return len(idx), [self.row(i) for i in idx[:max(0, limit)]]
+
+    def aggregate(self, filters=(), metric: str = "count", column: str | None = None,
+                  group_by: str | None = None) -> dict:
+        """
+        Thống kê (count/min/max/mean/sum) trên các hàng khớp, có thể nhóm theo 1 cột phân loại.
+        Trả về {nhóm: giá trị}; không nhóm thì key là "all".
+        """
+        if metric not in AGGREGATE_METRICS:
+            raise ValueError(f"Phép thống kê không hỗ trợ: {metric}")
+        if metric != "count" and column not in self.numeric:
+            raise KeyError(f"Cột '{column}' không phải cột số")
+        idx = self.select(filters)
+
+        def compute(rows):
+            if metric == "count":
+                return int(len(rows))
+            values = self.numeric[column][rows]
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                return None
+            result = {"min": np.min, "max": np.max, "mean": np.mean, "sum": np.sum}[metric](values)
+            return float(result)
+
+        if not group_by:
+            return {"all": compute(idx)}
+        if group_by not in self._folded:
+            raise KeyError(f"Không thể nhóm theo cột '{group_by}'")
+        groups = self._folded[group_by][idx]
+        result = {}
+        for key in dict.fromkeys(groups):
+            label = self._labels.get(group_by, {}).get(key, key)
+            result[label] = compute(idx[groups == key])
+        return result
+
+    def distinct(self, column: str) -> dict[str, int]:
+        """Số hàng theo từng giá trị của 1 cột chữ"""
+        if column in self.categories:
+            return {self._labels[column][k]: int(len(v)) for k, v in self.categories[column].items()}
+        return self.aggregate(metric="count", group_by=column)
+
+
+# --- Nạp dữ liệu từ file trung gian của Giai đoạn 1 ---
+
+def rows_to_columns(rows: list[dict]) -> dict[str, list]:
+    """
+    list hàng dạng dict -> dict {cột: list giá trị}. JSON cũ có dạng
+    {"brand,\"model\",...": "Toyota,\"Aqua\",..."} (cả hàng CSV trong 1 ô) -> tách cột thật.
+    """
+    if not rows:
+        return {}
+    keys = list(rows[0])
+    if len(keys) == 1 and "," in keys[0]:
+        columns = next(csv.reader([keys[0]]))
+        values = [next(csv.reader([str(r[keys[0]])]), []) for r in rows]
+        return {c: [v[j] if j < len(v) else None for v in values] for j, c in enumerate(columns)}
+    return {k: [r.get(k) for r in rows] for k in keys}
+
+
+def load_table_columns(path: Path) -> dict[str, list]:
+    """Đọc file bảng (.parquet / .jsonl / .json) thành dict {cột: list giá trị}"""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return table_store.read_columns(path)
+    if path.suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            columns = header["columns"]
+            data = {c: [] for c in columns}
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                for j, c in enumerate(columns):
+                    data[c].append(row[j] if j < len(row) else None)
+        return data
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return rows_to_columns(doc.get("content") or [])
+
+
+def find_table_file(json_output_dir: Path, topic: str, document_id: str) -> Path | None:
+    """Tìm file trung gian của 1 document bảng (ưu tiên Parquet -> JSONL -> JSON)"""
+    for suffix in (".parquet", ".jsonl", ".json"):
+        path = Path(json_output_dir) / topic / f"{document_id}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def load_structured_table(json_output_dir: Path, topic: str, document_id: str,
+                          categorical_columns=()) -> StructuredTable | None:
+    path = find_table_file(json_output_dir, topic, document_id)
+    if path is None:
+        print(f"LOG: Không tìm thấy dữ liệu bảng {topic}/{document_id} trong {json_output_dir}")
+        return None
+    data = load_table_columns(path)
+    print(f"LOG: Đã nạp bảng {topic}/{document_id} ({path.name}) vào RAM.")
+    return StructuredTable(f"{topic}/{document_id}", data, categorical_columns)
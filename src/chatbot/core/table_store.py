@@ -0,0 +1,136 @@
+# src/chatbot/core/table_store.py
+# (Định dạng cột (Parquet) cho dữ liệu bảng "table_rows":
+#  schema lưu 1 lần, giá trị có kiểu theo từng cột, ghi/đọc theo block)
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Không có pyarrow -> convert_json dùng JSONL
+    pa = None
+    pq = None
+
+_INT_RE = re.compile(r"^[+-]?(0|[1-9]\d*)$")
+_FLOAT_RE = re.compile(r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$")
+
+# Key trong metadata của file Parquet (source_path, source_filename, data_type...)
+_META_PREFIX = "chatbot."
+
+
+def is_available() -> bool:
+    return pa is not None
+
+
+class SchemaConflict(Exception):
+    """Giá trị ở block sau không khớp kiểu đã suy ra từ block đầu tiên"""
+
+    def __init__(self, column: str, value):
+        super().__init__(f"Cột '{column}' có giá trị không khớp kiểu: {value!r}")
+        self.column = column
+
+
+def infer_column_types(columns: list[str], rows: list[list], string_columns: set[str] = frozenset()) -> list[str]:
+    """Suy ra kiểu mỗi cột ("int" | "float" | "string") từ 1 block hàng"""
+    kinds = []
+    for j, col in enumerate(columns):
+        values = [r[j] for r in rows if j < len(r) and r[j] not in ("", None)]
+        if col in string_columns or not values:
+            kinds.append("string")
+        elif all(_INT_RE.match(str(v)) for v in values):
+            kinds.append("int")
+        elif all(_FLOAT_RE.match(str(v)) for v in values):
+            kinds.append("float")
+        else:
+            kinds.append("string")
+    return kinds
+
+
+def _convert(value, kind: str):
+    if value in ("", None):
+        return None
+    if kind == "int":
+        if not _INT_RE.match(str(value)):
+            raise ValueError(value)
+        return int(value)
+    if kind == "float":
+        if not _FLOAT_RE.match(str(value)):
+            raise ValueError(value)
+        return float(value)
+    return str(value)
+
+
+_ARROW_TYPES = {"int": "int64", "float": "float64", "string": "string"}
+
+
+def write_parquet(
+    out_path: Path,
+    blocks: Iterable[tuple[list[str], list[list]]],
+    metadata: dict,
+    string_columns: set[str] = frozenset(),
+) -> int:
+    """
+    Ghi các block (columns, rows) ra Parquet, mỗi block là 1 row group.
+    Kiểu cột suy ra từ block đầu; block sau không khớp -> raise SchemaConflict
+    (người gọi ghi lại với cột đó ép về string). Trả về số hàng đã ghi.
+    """
+    tmp_path = out_path.with_suffix(".parquet.tmp")
+    writer = None
+    row_count = 0
+    try:
+        for columns, rows in blocks:
+            if writer is None:
+                kinds = infer_column_types(columns, rows, string_columns)
+                schema = pa.schema(
+                    [(col, _ARROW_TYPES[k]) for col, k in zip(columns, kinds)],
+                    metadata={f"{_META_PREFIX}{k}": str(v) for k, v in metadata.items()},
+                )
+                writer = pq.ParquetWriter(str(tmp_path), schema)
+            arrays = []
+            for j, (col, kind) in enumerate(zip(columns, kinds)):
+                try:
+                    values = [_convert(r[j] if j < len(r) else None, kind) for r in rows]
+                except ValueError as e:
+                    raise SchemaConflict(col, e.args[0])
+                arrays.append(pa.array(values, type=_ARROW_TYPES[kind]))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            row_count += len(rows)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if writer is None:
+        return 0
+    writer.close()
+    os.replace(tmp_path, out_path)
+    return row_count
+
+
+def read_metadata(path: Path) -> dict:
+    """Đọc metadata (source_filename, data_type...) + danh sách cột, không đọc dữ liệu"""
+    schema = pq.read_schema(str(path))
+    raw = schema.metadata or {}
+    meta = {
+        k.decode()[len(_META_PREFIX):]: v.decode()
+        for k, v in raw.items()
+        if k.decode().startswith(_META_PREFIX)
+    }
+    meta["columns"] = schema.names
+    return meta
+
+
+def iter_rows(path: Path, batch_rows: int = 5000) -> Iterator[dict]:
+    """Đọc Parquet theo từng batch, yield từng hàng dạng dict (giá trị giữ kiểu gốc)"""
+    parquet_file = pq.ParquetFile(str(path))
+    for batch in parquet_file.iter_batches(batch_size=batch_rows):
+        yield from batch.to_pylist()
+
+
+def read_columns(path: Path, columns: list[str] | None = None) -> dict[str, list]:
+    """Đọc toàn bộ (hoặc một số) cột thành dict {tên cột: list giá trị}"""
+    return pq.read_table(str(path), columns=columns).to_pydict()
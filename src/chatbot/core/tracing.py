@@ -0,0 +1,337 @@
+# src/chatbot/core/tracing.py
+# (Đo thời gian từng bước (span) của đường chat và ingest: ghi ra file JSONL + chỉ số dạng Prometheus.
+#  Tắt tracing -> span() trả về 1 đối tượng rỗng dùng chung, gần như không tốn gì)
+
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Span đang chạy trong context hiện tại (cha của span tạo tiếp theo)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("chatbot_current_span", default=None)
+
+# Giới hạn trên (giây) của các bucket histogram thời gian
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+def payload_bytes(value) -> int:
+    """Kích thước (byte UTF-8) của chuỗi / content message (list block của Gemini)"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, list):
+        return sum(payload_bytes(part if isinstance(part, str) else part.get("text", "")) for part in value)
+    return payload_bytes(getattr(value, "content", str(value)))
+
+
+class Span:
+    """
+    1 bước được đo. Dùng với `with tracer.span(...) as span:` (tự đặt làm span hiện tại
+    cho các span con) hoặc start_span() + end() khi bắt đầu / kết thúc ở 2 chỗ khác nhau.
+    Thuộc tính số có tên kết thúc bằng "_tokens" / "_bytes" được cộng dồn vào counter Prometheus.
+    """
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attrs",
+                 "start_time", "_start", "_token")
+
+    def __init__(self, tracer, name: str, parent, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else _new_id()
+        self.span_id = _new_id()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attrs = attrs
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = None
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def activate(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def end(self, error: BaseException | None = None) -> None:
+        duration = time.perf_counter() - self._start
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Kết thúc ở context khác context đã bắt đầu (generator bị đóng muộn...)
+                pass
+            self._token = None
+        self.tracer._record(self, duration, error)
+
+    def __enter__(self) -> "Span":
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end(exc)
+        return False
+
+
+class _NoopSpan:
+    """Span khi tắt tracing: mọi thao tác đều không làm gì"""
+
+    __slots__ = ()
+
+    def set(self, **attrs) -> "_NoopSpan":
+        return self
+
+    def activate(self) -> "_NoopSpan":
+        return self
+
+    def end(self, error: BaseException | None = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Ghi span của cả process:
+    - JSONL: mỗi span 1 dòng (trace_id, span_id, parent_id, name, start, duration_ms, attrs, error).
+      Gom trong RAM, ghi ra đĩa mỗi `flush_spans` span hoặc mỗi `flush_seconds` giây.
+      Nhiều process (parse pool) cùng ghi 1 file ở chế độ append.
+    - Chỉ số: histogram thời gian + số lỗi theo tên bước, counter token / byte -> render_metrics()
+      trả về text dạng Prometheus (endpoint /metrics, hoặc write_metrics() ra file sau lượt ingest).
+    Mặc định tắt; configure() bật theo config (xem utils.configure_tracing).
+    """
+
+    def __init__(self, enabled: bool = False, jsonl_path: Path | None = None,
+                 buckets: tuple = DEFAULT_BUCKETS, flush_spans: int = 64, flush_seconds: float = 1.0):
+        self._lock = threading.Lock()
+        self.configure(enabled, jsonl_path, buckets, flush_spans, flush_seconds)
+
+    def configure(self, enabled: bool, jsonl_path: Path | None = None, buckets: tuple = DEFAULT_BUCKETS,
+                  flush_spans: int = 64, flush_seconds: float = 1.0) -> None:
+        with self._lock:
+            self.enabled = enabled
+            self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+            self.buckets = tuple(sorted(buckets))
+            self.flush_spans = max(1, flush_spans)
+            self.flush_seconds = flush_seconds
+            self._buffer: list[str] = []
+            self._last_flush = time.perf_counter()
+            self._pid = os.getpid()
+            # tên bước -> [số bucket..., count, tổng giây, số lỗi]
+            self._histograms: dict[str, list] = {}
+            # (tên bước, tên thuộc tính) -> tổng
+            self._counters: dict[tuple, float] = {}
+
+    # --- Tạo span ---
+
+    def span(self, name: str, parent: Span | None = None, **attrs):
+        """
+        Context manager đo 1 bước. `parent`: span cha khi chạy ở thread khác
+        (thread mới không thấy span hiện tại của thread tạo ra nó).
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, parent if parent is not None else _current_span.get(), attrs)
+
+    def start_span(self, name: str, parent: Span | None = None, **attrs):
+        """Như span() nhưng không tự đặt làm span hiện tại; gọi end() khi xong"""
+        return self.span(name, parent, **attrs)
+
+    @staticmethod
+    def current() -> Span | None:
+        return _current_span.get()
+
+    # --- Ghi nhận ---
+
+    def _record(self, span: Span, duration: float, error: BaseException | None) -> None:
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start": round(span.start_time, 6),
+            "duration_ms": round(duration * 1000, 3),
+            "attrs": span.attrs,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        line = json.dumps(record, ensure_ascii=False, default=str)
+
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Process con (fork) chép luôn buffer / chỉ số của process cha -> bắt đầu lại
+                self._buffer, self._histograms, self._counters = [], {}, {}
+                self._pid = os.getpid()
+
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = [0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-3] += 1
+            histogram[-2] += duration
+            if error is not None:
+                histogram[-1] += 1
+            for key, value in span.attrs.items():
+                if (key.endswith("_tokens") or key.endswith("_bytes")) and isinstance(value, (int, float)):
+                    self._counters[(span.name, key)] = self._counters.get((span.name, key), 0) + value
+
+            if self.jsonl_path is None:
+                return
+            self._buffer.append(line)
+            if (len(self._buffer) >= self.flush_spans
+                    or time.perf_counter() - self._last_flush >= self.flush_seconds):
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.perf_counter()
+        if not self._buffer or self.jsonl_path is None:
+            return
+        self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._buffer) + "\n")
+        self._buffer = []
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    # --- Chỉ số dạng Prometheus ---
+
+    def render_metrics(self) -> str:
+        with self._lock:
+            histograms = {name: list(values) for name, values in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP chatbot_stage_duration_seconds Thời gian từng bước (span) của chat / ingest",
+            "# TYPE chatbot_stage_duration_seconds histogram",
+        ]
+        for name in sorted(histograms):
+            values = histograms[name]
+            stage = _label(name)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {values[-3]}')
+            lines.append(f'chatbot_stage_duration_seconds_sum{{stage="{stage}"}} {values[-2]:.6f}')
+            lines.append(f'chatbot_stage_duration_seconds_count{{stage="{stage}"}} {values[-3]}')
+
+        lines += ["# HELP chatbot_stage_errors_total Số span kết thúc bằng lỗi",
+                  "# TYPE chatbot_stage_errors_total counter"]
+        for name in sorted(histograms):
+            lines.append(f'chatbot_stage_errors_total{{stage="{_label(name)}"}} {histograms[name][-1]}')
+
+        for suffix, help_text in (("tokens", "Số token (LLM) theo bước"),
+                                  ("bytes", "Kích thước dữ liệu (byte) theo bước")):
+            metric = f"chatbot_stage_{suffix}_total"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for (name, key), total in sorted(counters.items()):
+                if key.endswith(f"_{suffix}"):
+                    kind = key[: -len(suffix) - 1]
+                    lines.append(f'{metric}{{stage="{_label(name)}",kind="{_label(kind)}"}} {total:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path: Path) -> None:
+        """Ghi chỉ số ra file (dạng textfile của Prometheus node exporter) cho các lượt chạy batch"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(self.render_metrics(), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+# --- Callback LangChain: span cho mỗi lần gọi LLM và mỗi lần gọi tool của agent ---
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Gắn vào agent (with_config callbacks) -> span "llm.call" (kèm số token vào / ra nếu model
+    trả usage_metadata) và "tool.call". Span tool được đặt làm span hiện tại để các bước bên
+    trong tool (embed, search, ghép context) nằm dưới nó.
+    """
+
+    # Chạy ngay trong context của lượt chat (không đẩy sang thread pool) -> thấy / đặt được span hiện tại
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: dict = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, name: str, activate: bool = False, **attrs) -> None:
+        span = self.tracer.start_span(name, **attrs)
+        if span is NOOP_SPAN:
+            return
+        if activate:
+            span.activate()
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _end(self, run_id, error: BaseException | None = None, **attrs) -> None:
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.set(**attrs).end(error)
+
+    # --- LLM ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        model = (kwargs.get("metadata") or {}).get("ls_model_name") or (serialized or {}).get("name")
+        prompt = [message for batch in messages for message in batch]
+        self._start(run_id, "llm.call", model=model, messages=len(prompt),
+                    prompt_bytes=sum(payload_bytes(message.content) for message in prompt))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm.call", model=(serialized or {}).get("name"),
+                    prompt_bytes=sum(payload_bytes(prompt) for prompt in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attrs = {"input_tokens": 0, "output_tokens": 0, "completion_bytes": 0}
+        for generations in response.generations:
+            for generation in generations:
+                attrs["completion_bytes"] += payload_bytes(generation.text)
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                attrs["input_tokens"] += usage.get("input_tokens", 0)
+                attrs["output_tokens"] += usage.get("output_tokens", 0)
+        self._end(run_id, **attrs)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # --- Tool ---
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool.call", activate=True, tool=(serialized or {}).get("name"),
+                    input_bytes=payload_bytes(input_str))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, output_bytes=payload_bytes(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+# Tracer mặc định của process (tắt cho tới khi configure)
+tracer = Tracer()
+# Ghi nốt các span còn trong buffer khi process thoát
+atexit.register(tracer.flush)
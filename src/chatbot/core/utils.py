@@ -1,37 +1,145 @@
 # src/chatbot/core/utils.py
-from langchain_community.embeddings import HuggingFaceEmbeddings
 import os
 import sys
 from pathlib import Path
-from langchain_google_genai import ChatGoogleGenerativeAI
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))
-from config import GEMINI_MODEL_NAME, LLM_TEMPERATURE, VECTOR_STORE_DIR, RETRIEVER_SEARCH_K
-import sys
-from pathlib import Path
-from langchain_community.vectorstores import Chroma
+from config import GEMINI_MODEL_NAME, LLM_TEMPERATURE, VECTOR_STORE_DIR, RETRIEVER_SEARCH_K, EMBEDDING_MODEL_NAME
+from config import LLM_BACKEND, LOCAL_LLM_LATENCY_SECONDS
+from config import (
+    EMBEDDING_BACKEND, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_FILE,
+    EMBEDDING_NUM_THREADS, EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_LENGTH,
+    EMBEDDING_SERVICE_ENABLED, EMBEDDING_SERVICE_MAX_BATCH, EMBEDDING_SERVICE_MAX_WAIT_MS,
+    EMBEDDING_SERVICE_CACHE_SIZE,
+)
+from config import VECTOR_BACKEND, VECTOR_INDEX_NAME, VECTOR_INDEX_HNSW_EF_SEARCH, VECTOR_INDEX_RESCORE_FACTOR
+from config import (
+    SESSION_TOKEN_BUDGET, SESSION_MAX_SESSIONS, SESSION_IDLE_SECONDS,
+    SESSION_SUMMARY_MAX_CHARS, SESSION_SNAPSHOT_DIR, SESSION_CHARS_PER_TOKEN,
+)
+from config import (
+    INGEST_MANIFEST_NAME, RETRIEVAL_CACHE_MAX_ENTRIES, RETRIEVAL_CACHE_TTL_SECONDS,
+    RETRIEVAL_CACHE_SEMANTIC, RETRIEVAL_CACHE_SIMILARITY_THRESHOLD,
+    RETRIEVAL_CACHE_REVISION_CHECK_SECONDS, RETRIEVAL_CACHE_KEY_TERMS, RETRIEVAL_CACHE_KEY_FACET_COLUMNS,
+    FACET_STATS_NAME, FACET_COLUMNS, TOPIC_ALIASES,
+    LEXICAL_INDEX_NAME, HYBRID_CANDIDATES_K, HYBRID_RRF_K,
+    HYBRID_LEXICAL_WEIGHT, HYBRID_VECTOR_WEIGHT, HYBRID_EXACT_MATCH_SHORTCUT,
+)
+from config import (
+    ROUTER_TOPIC_KEYWORDS, ROUTER_FACET_COLUMNS, ROUTER_CENTROID_MIN_MARGIN,
+    ROUTER_CENTROID_MIN_SIMILARITY,
+)
+from config import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_CHUNKS, CONTEXT_MMR_LAMBDA, CONTEXT_DEDUP_THRESHOLD,
+    CONTEXT_MIN_OVERLAP_CHARS,
+)
+from config import (
+    TRACING_ENABLED, TRACE_JSONL_PATH, TRACE_HISTOGRAM_BUCKETS, TRACE_FLUSH_SPANS, TRACE_FLUSH_SECONDS,
+)
+from .lexical_index import LexicalIndex
+from .hybrid_retrieval import HybridRetriever
+from .facet_stats import FacetStats
+from .ingest_manifest import IngestManifest
+from .retrieval_cache import RetrievalCache
+from .session_store import SessionStore
+from .query_router import QueryRouter
+from .context_packing import ContextPacker
+from .registry import registry
+from .tracing import tracer
+
+# Lưu ý: HuggingFaceEmbeddings (torch), Gemini client, Chroma được import BÊN TRONG hàm tạo
+# -> import utils nhanh; model chỉ được tải 1 lần / process qua `registry`.
 
 
-def get_embedding_model():
+def get_embedding_model(backend: str = EMBEDDING_BACKEND):
     """
-    Tải và trả về model embedding local (MiniLM).
+    Trả về model embedding local (MiniLM), dùng chung cả process (chỉ tải 1 lần).
+    backend: "torch" (HuggingFaceEmbeddings) hoặc "onnx" (ONNX Runtime int8, xem onnx_embeddings.py).
     Hàm này được dùng chung bởi cả ingest.py và chain.py
     """
-    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    loaders = {"torch": _load_torch_embedding_model, "onnx": _load_onnx_embedding_model}
+    if backend not in loaders:
+        raise ValueError(f"EMBEDDING_BACKEND không hợp lệ: {backend!r} (chọn 'torch' hoặc 'onnx')")
+    return registry.get(("embeddings", embedding_model_id(backend)), loaders[backend])
+
+
+def get_query_embeddings(backend: str = EMBEDDING_BACKEND):
+    """
+    Model embedding cho câu hỏi lúc chat: bọc model dùng chung bằng dịch vụ micro-batch + LRU
+    (nhiều phiên hỏi cùng lúc -> 1 lần forward). Tắt EMBEDDING_SERVICE_ENABLED -> trả model gốc.
+    """
+    embeddings = get_embedding_model(backend)
+    if not EMBEDDING_SERVICE_ENABLED:
+        return embeddings
+
+    def _create():
+        from .embedding_service import BatchingEmbeddings
+        return BatchingEmbeddings(
+            embeddings,
+            max_batch_size=EMBEDDING_SERVICE_MAX_BATCH,
+            max_wait_ms=EMBEDDING_SERVICE_MAX_WAIT_MS,
+            cache_size=EMBEDDING_SERVICE_CACHE_SIZE,
+        )
+    return registry.get(("query_embeddings", embedding_model_id(backend)), _create)
+
+
+def embedding_model_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Tên định danh vector: dùng làm khoá cache embedding + hash cấu hình ingest.
+    Đổi backend -> vector lệch chút ít -> ingest lại thay vì trộn 2 loại vector trong 1 store.
+    """
+    if backend == "torch":
+        return EMBEDDING_MODEL_NAME
+    return f"{EMBEDDING_MODEL_NAME}#{backend}:{EMBEDDING_ONNX_FILE}"
+
+
+def _load_torch_embedding_model():
+    import torch
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    torch.set_num_threads(EMBEDDING_NUM_THREADS)
+    model_name = EMBEDDING_MODEL_NAME
     model_kwargs = {'device': 'cpu'} # Ép chạy trên CPU
-    encode_kwargs = {'normalize_embeddings': True} # Quan trọng
+    encode_kwargs = {
+        'normalize_embeddings': True, # Quan trọng
+        'batch_size': EMBEDDING_BATCH_SIZE,
+    }
     
     return HuggingFaceEmbeddings(
         model_name=model_name,
         model_kwargs=model_kwargs,
         encode_kwargs=encode_kwargs
     )
+
+
+def _load_onnx_embedding_model():
+    from .onnx_embeddings import OnnxEmbeddings
+
+    print(f"LOG: Dùng embedding ONNX ({EMBEDDING_ONNX_DIR / EMBEDDING_ONNX_FILE}, "
+          f"{EMBEDDING_NUM_THREADS} thread).")
+    return OnnxEmbeddings(
+        EMBEDDING_ONNX_DIR,
+        model_file=EMBEDDING_ONNX_FILE,
+        num_threads=EMBEDDING_NUM_THREADS,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        max_length=EMBEDDING_MAX_LENGTH,
+    )
     
 
-def get_llm():
+def get_llm(backend: str = LLM_BACKEND):
     """
-    Khởi tạo và trả về LLM (Gemini).
+    Trả về LLM (Gemini), dùng chung cả process.
+    backend="local" -> LLM giả lập chạy local (test service, đo tải).
     """
+    return registry.get(("llm", backend), lambda: _load_llm(backend))
+
+
+def _load_llm(backend: str):
+    if backend == "local":
+        from .local_llm import LocalChatModel
+        print(f"LOG: Dùng LLM giả lập local (độ trễ {LOCAL_LLM_LATENCY_SECONDS}s).")
+        return LocalChatModel(latency_seconds=LOCAL_LLM_LATENCY_SECONDS)
     try:
+        from langchain_google_genai import ChatGoogleGenerativeAI
         llm = ChatGoogleGenerativeAI(
             model=GEMINI_MODEL_NAME,
             temperature=LLM_TEMPERATURE,
@@ -42,32 +150,228 @@ def get_llm():
     except Exception as e:
         print(f"LỖI: Không thể tải Gemini. Bạn đã set GOOGLE_API_KEY trong file .env chưa? Lỗi: {e}")
         return None
-    
 
-def get_retriever():
+
+def get_vector_store(store_dir: Path = VECTOR_STORE_DIR, backend: str = VECTOR_BACKEND):
     """
-    Tải Vector Store và tạo một retriever.
+    Mở vector store (chỉ đọc / truy vấn) gắn với model embedding dùng chung. Mỗi thư mục mở 1 lần.
+    backend="mmap": index memory-mapped export lúc ingest (store_dir / VECTOR_INDEX_NAME),
+    chưa có thì quay về Chroma.
     """
-    
-    # 1. Tải embedding model
-    print("LOG: Đang tải model embedding (MiniLM)...")
-    embeddings = get_embedding_model()
-    
-    if not VECTOR_STORE_DIR.exists():
-        print(f"LỖI: Thư mục Vector Store không tồn tại: {VECTOR_STORE_DIR}")
-        raise FileNotFoundError(f"Thư mục Vector Store không tồn tại: {VECTOR_STORE_DIR}")
-        
-    # 2. Tải vector store
-    print(f"LOG: Đang tải Vector Store từ: {VECTOR_STORE_DIR}")
-    vector_store = Chroma(
-        persist_directory=str(VECTOR_STORE_DIR), 
-        embedding_function=embeddings
+    if not store_dir.exists():
+        print(f"LỖI: Thư mục Vector Store không tồn tại: {store_dir}")
+        raise FileNotFoundError(f"Thư mục Vector Store không tồn tại: {store_dir}")
+    if backend == "mmap":
+        index_dir = store_dir / VECTOR_INDEX_NAME
+        if (index_dir / "index.json").exists():
+            try:
+                return registry.get(("vector_store", "mmap", str(index_dir)), lambda: _load_mmap_store(index_dir))
+            except ValueError as e:
+                print(f"LOG: {e} (cần chạy lại ingest), dùng Chroma.")
+        else:
+            print(f"LOG: Chưa có index mmap tại {index_dir} (cần chạy ingest), dùng Chroma.")
+    return registry.get(("vector_store", "chroma", str(store_dir)), lambda: _load_vector_store(store_dir))
+
+
+def _load_vector_store(store_dir: Path):
+    from langchain_chroma import Chroma
+
+    print(f"LOG: Đang tải Vector Store từ: {store_dir}")
+    return Chroma(
+        persist_directory=str(store_dir),
+        embedding_function=get_embedding_model()
     )
+
+
+def _load_mmap_store(index_dir: Path):
+    from .vector_index import MmapVectorIndex, MmapVectorStore
+
+    index = MmapVectorIndex(index_dir, hnsw_ef_search=VECTOR_INDEX_HNSW_EF_SEARCH,
+                            rescore_factor=VECTOR_INDEX_RESCORE_FACTOR)
+    if index.manifest["model_id"] != embedding_model_id():
+        print(f"CẢNH BÁO: Index mmap được tạo bằng {index.manifest['model_id']}, "
+              f"model hiện tại là {embedding_model_id()} -> cần ingest lại.")
+    print(f"LOG: Đã map index vector {index_dir} ({index.count} vector, {len(index.shards)} shard, "
+          f"{'HNSW' if index.hnsw is not None else 'vét cạn NumPy, ' + index.storage}).")
+    return MmapVectorStore(index, embedding=get_embedding_model())
+
+
+def configure_tracing(enabled: bool = TRACING_ENABLED):
+    """
+    Bật / tắt tracer dùng chung của process theo config (span -> TRACE_JSONL_PATH + chỉ số Prometheus).
+    Gọi lúc khởi động (warm_up, ingest, parse); tắt thì mọi span() đều là no-op.
+    """
+    if enabled == tracer.enabled:
+        return tracer
+    tracer.configure(
+        enabled, TRACE_JSONL_PATH, TRACE_HISTOGRAM_BUCKETS,
+        flush_spans=TRACE_FLUSH_SPANS, flush_seconds=TRACE_FLUSH_SECONDS,
+    )
+    if enabled:
+        print(f"LOG: Tracing bật -> {TRACE_JSONL_PATH}")
+    return tracer
+
+
+def warm_up(llm_backend: str = LLM_BACKEND, vector_store: bool = True) -> dict:
+    """
+    Tạo sẵn model embedding, LLM client (và vector store) lúc khởi động worker,
+    để request đầu tiên không phải chờ. Trả về thời gian tạo từng thứ.
+    """
+    configure_tracing()
+    loaders = [get_embedding_model, lambda: get_llm(llm_backend)]
+    if vector_store:
+        loaders.append(get_vector_store)
+    return registry.warm_up(*loaders)
+
+
+def get_retriever():
+    """
+    Tải Vector Store và tạo một retriever (model + store lấy từ registry, không tải lại).
+    """
+    vector_store = get_vector_store()
     
-    # 3. Tạo retriever
+    # Tạo retriever (hybrid BM25 + vector nếu ingest đã build index từ khoá)
+    lexical_index = get_lexical_index()
+    if lexical_index is not None:
+        retriever = get_hybrid_retriever(vector_store, lexical_index)
+        print(f"LOG: Đã tạo hybrid retriever BM25 + vector (k={RETRIEVER_SEARCH_K}).")
+        return retriever
+
     retriever = vector_store.as_retriever(
         search_type="similarity",
         search_kwargs={'k': RETRIEVER_SEARCH_K} 
     )
     print(f"LOG: Đã tạo retriever (k={RETRIEVER_SEARCH_K}) từ Vector Store.")
     return retriever
+
+
+def get_lexical_index(store_dir: Path = VECTOR_STORE_DIR):
+    """
+    Mở index từ khoá BM25 nằm cạnh Chroma store. Trả về None nếu chưa ingest.
+    """
+    index_path = store_dir / LEXICAL_INDEX_NAME
+    if not index_path.exists():
+        print(f"LOG: Chưa có index BM25 tại {index_path}, chỉ dùng vector search.")
+        return None
+    return LexicalIndex(index_path)
+
+
+def get_hybrid_retriever(vector_store, lexical_index, k: int = RETRIEVER_SEARCH_K):
+    """Tạo retriever lai BM25 + vector theo cấu hình trong config.py"""
+    return HybridRetriever(
+        vector_store=vector_store,
+        lexical_index=lexical_index,
+        k=k,
+        candidates_k=HYBRID_CANDIDATES_K,
+        rrf_k=HYBRID_RRF_K,
+        lexical_weight=HYBRID_LEXICAL_WEIGHT,
+        vector_weight=HYBRID_VECTOR_WEIGHT,
+        exact_match_shortcut=HYBRID_EXACT_MATCH_SHORTCUT,
+    )
+
+
+def get_facet_stats(store_dir: Path = VECTOR_STORE_DIR):
+    """
+    Nạp thống kê dựng sẵn lúc ingest (số mục theo topic/document/giá trị cột).
+    Trả về None nếu chưa ingest.
+    """
+    stats_path = store_dir / FACET_STATS_NAME
+    if not stats_path.exists():
+        print(f"LOG: Chưa có thống kê tại {stats_path}.")
+        return None
+    return FacetStats(stats_path, FACET_COLUMNS, TOPIC_ALIASES)
+
+
+def get_query_router(facet_stats=None, store_dir: Path = VECTOR_STORE_DIR):
+    """
+    Bộ định tuyến câu hỏi -> shard topic. Topic lấy từ thống kê ingest, centroid từ index mmap
+    (store_dir / VECTOR_INDEX_NAME, có khi VECTOR_INDEX_EXPORT bật). Trả về None nếu chưa ingest.
+    """
+    from .vector_index import read_topic_centroids
+
+    centroids = read_topic_centroids(store_dir / VECTOR_INDEX_NAME)
+    topics = set(facet_stats.topics()) if facet_stats is not None else set(centroids or {})
+    if not topics:
+        print("LOG: Chưa có topic nào (cần chạy ingest), không định tuyến câu hỏi.")
+        return None
+
+    keywords = {topic: list(ROUTER_TOPIC_KEYWORDS.get(topic, ())) + list(TOPIC_ALIASES.get(topic, ()))
+                for topic in topics}
+    if facet_stats is not None:
+        for topic in topics:
+            columns = facet_stats.topic_summary(topic)["columns"]
+            for col in ROUTER_FACET_COLUMNS:
+                keywords[topic].extend(columns.get(col, {}))
+
+    print(f"LOG: Định tuyến câu hỏi theo {len(topics)} topic "
+          f"({'từ khoá + centroid' if centroids else 'chỉ từ khoá, chưa có index mmap'}).")
+    return QueryRouter(
+        topics,
+        topic_keywords=keywords,
+        centroids=centroids,
+        min_margin=ROUTER_CENTROID_MIN_MARGIN,
+        min_similarity=ROUTER_CENTROID_MIN_SIMILARITY,
+    )
+
+
+def get_context_packer():
+    """Bộ ghép ngữ cảnh (bỏ trùng + MMR + ngân sách token) theo cấu hình trong config.py"""
+    return ContextPacker(
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        max_chunks=CONTEXT_MAX_CHUNKS,
+        mmr_lambda=CONTEXT_MMR_LAMBDA,
+        dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+        min_overlap_chars=CONTEXT_MIN_OVERLAP_CHARS,
+        chars_per_token=SESSION_CHARS_PER_TOKEN,
+    )
+
+
+def get_retrieval_cache(embeddings=None, store_dir: Path = VECTOR_STORE_DIR, facet_stats=None):
+    """
+    Tạo cache kết quả retrieval. Truyền `embeddings` để bật chế độ khớp gần đúng
+    (theo RETRIEVAL_CACHE_SEMANTIC), `facet_stats` để lấy thêm thực thể (hãng, tỉnh...) phân biệt câu hỏi.
+    Cache tự xoá khi manifest ingest đổi revision.
+    """
+    manifest_path = store_dir / INGEST_MANIFEST_NAME
+    manifest = None
+
+    def revision_fn() -> int:
+        # Mở manifest khi đã có (service có thể khởi động trước lần ingest đầu tiên); chưa có -> revision 0
+        nonlocal manifest
+        if manifest is None:
+            if not manifest_path.exists():
+                return 0
+            manifest = IngestManifest(manifest_path)
+        return manifest.revision
+
+    key_terms = list(RETRIEVAL_CACHE_KEY_TERMS)
+    if facet_stats is not None:
+        for topic in facet_stats.topics():
+            columns = facet_stats.topic_summary(topic)["columns"]
+            for col in RETRIEVAL_CACHE_KEY_FACET_COLUMNS:
+                key_terms.extend(columns.get(col, {}))
+
+    embed_fn = embeddings.embed_query if (embeddings is not None and RETRIEVAL_CACHE_SEMANTIC) else None
+    return RetrievalCache(
+        max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+        ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS,
+        embed_fn=embed_fn,
+        similarity_threshold=RETRIEVAL_CACHE_SIMILARITY_THRESHOLD,
+        revision_fn=revision_fn,
+        revision_check_seconds=RETRIEVAL_CACHE_REVISION_CHECK_SECONDS,
+        key_terms=key_terms,
+    )
+
+
+def get_session_store(snapshot_dir=SESSION_SNAPSHOT_DIR):
+    """
+    Kho lịch sử chat theo session_id (giới hạn token + tóm tắt lượt cũ, LRU, snapshot ra đĩa).
+    """
+    return SessionStore(
+        token_budget=SESSION_TOKEN_BUDGET,
+        max_sessions=SESSION_MAX_SESSIONS,
+        idle_seconds=SESSION_IDLE_SECONDS,
+        summary_max_chars=SESSION_SUMMARY_MAX_CHARS,
+        snapshot_dir=snapshot_dir,
+        chars_per_token=SESSION_CHARS_PER_TOKEN,
+    )
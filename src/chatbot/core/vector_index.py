@@ -0,0 +1,463 @@
+# src/chatbot/core/vector_index.py
+# (Index vector tự chứa, export lúc ingest: ma trận float32 memory-mapped + bảng ID/metadata gọn,
+#  chia shard theo topic (các dòng cùng topic nằm liền nhau), top-k bằng NumPy hoặc HNSW
+#  (hnswlib, tuỳ chọn) - thay cho vòng truy vấn SQLite của Chroma)
+
+import json
+import mmap
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+FORMAT_VERSION = 3
+_MANIFEST_FILE = "index.json"
+_VECTORS_FILE = "vectors.npy"        # float32 (N, dim), đã chuẩn hoá L2
+_RECORDS_FILE = "records.jsonl"      # mỗi dòng: {"id", "page_content", "metadata"}
+_OFFSETS_FILE = "offsets.npy"        # int64 (N + 1): vị trí byte của từng dòng trong records.jsonl
+_CENTROIDS_FILE = "centroids.npy"    # float32 (số shard, dim): vector trung bình (chuẩn hoá) của từng shard
+_HNSW_FILE = "hnsw_{shard}.bin"      # 1 đồ thị HNSW / shard, nhãn = số dòng toàn cục
+_CODES_FILE = "vectors_{storage}.npy"  # bản nén (int8) cho lượt quét nhanh
+_SCALES_FILE = "scales.npy"          # float32 (N): hệ số của từng vector khi nén int8
+_IDS_FILE = "ids.npy"                # bytes (N): id chunk đã sắp xếp -> tìm nhị phân, không giải mã records
+_ID_ROWS_FILE = "id_rows.npy"        # int64 (N): số dòng tương ứng với từng id trong ids.npy
+
+# Kiểu lưu vector cho lượt quét đầu: float32 (chính xác), int8 (1/4 RAM, quét nhanh hơn float32).
+# Không có float16: NumPy đổi half -> float32 chậm, lượt quét chậm hơn float32 khoảng 5 lần
+STORAGE_TYPES = ("float32", "int8")
+# Số dòng mỗi block khi quét bản nén: block đổi sang float32 nằm gọn trong cache CPU (~1.5 MB)
+_SCAN_BLOCK_ROWS = 1024
+# Số dòng mỗi block khi chấm điểm bản nén lúc truy vấn: buffer float32 ~384 KB (dim 384) nằm trong cache L2
+_SCORE_BLOCK_ROWS = 256
+
+
+def hnsw_available() -> bool:
+    try:
+        import hnswlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.clip(norms, 1e-12, None)
+
+
+# --- NÉN VECTOR ---
+def quantize(vectors: np.ndarray, storage: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Nén ma trận float32 (đã chuẩn hoá): int8 -> mỗi vector 1 hệ số
+    scale = max|x| / 127, code = round(x / scale). Trả về (codes, scales | None).
+    """
+    if storage == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Kiểu lưu không hợp lệ: {storage!r} (chọn trong {STORAGE_TYPES})")
+
+
+def approx_scores(codes: np.ndarray, scales: np.ndarray | None, query: np.ndarray) -> np.ndarray:
+    """
+    Điểm gần đúng (tích vô hướng) trên bản nén, quét theo block để không bung cả ma trận ra float32.
+    Mỗi block đổi kiểu vào 1 buffer float32 dùng lại (nằm trong cache L2, không cấp phát mới)
+    rồi nhân bằng BLAS, ghi thẳng vào mảng điểm.
+    """
+    scores = np.empty(len(codes), dtype=np.float32)
+    buffer = np.empty((min(_SCORE_BLOCK_ROWS, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), _SCORE_BLOCK_ROWS):
+        block = codes[start:start + _SCORE_BLOCK_ROWS]
+        rows = len(block)
+        np.copyto(buffer[:rows], block, casting="unsafe")
+        np.matmul(buffer[:rows], query, out=scores[start:start + rows])
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Chỉ số k điểm cao nhất (giảm dần), bỏ dòng bị loại (-inf)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+
+def rescored_search(vectors: np.ndarray, codes: np.ndarray, scales: np.ndarray | None,
+                    query: np.ndarray, k: int, rescore_k: int) -> list[tuple[int, float]]:
+    """
+    Lượt 1: quét bản nén lấy `rescore_k` ứng viên. Lượt 2: tính lại điểm chính xác bằng
+    vector float32 của riêng các ứng viên đó (chỉ đọc vài dòng của ma trận mmap).
+    """
+    scores = approx_scores(codes, scales, query)
+    candidates = np.sort(top_k(scores, max(k, rescore_k)))
+    if len(candidates) == 0:
+        return []
+    exact = np.asarray(vectors[candidates], dtype=np.float32) @ query
+    order = np.argsort(-exact)[:k]
+    return [(int(candidates[i]), float(exact[i])) for i in order]
+
+
+# --- GHI (lúc ingest) ---
+class VectorIndexWriter:
+    """
+    Ghi index vào thư mục tạm cạnh `index_dir`; publish() mới thay thế index cũ (đổi tên thư mục).
+    Process đang đọc index cũ vẫn giữ file đã map, lần nạp sau sẽ thấy bản mới.
+    Các dòng phải được add() theo từng topic liền nhau (mỗi topic = 1 shard [start, end)),
+    export_from_collection() đọc Chroma theo đúng thứ tự đó.
+    """
+
+    def __init__(self, index_dir, dim: int, capacity: int, model_id: str):
+        self.index_dir = Path(index_dir)
+        self.tmp_dir = self.index_dir.with_name(f"{self.index_dir.name}.tmp-{os.getpid()}")
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.tmp_dir.mkdir(parents=True)
+        self.dim = dim
+        self.model_id = model_id
+        self.count = 0
+        self._vectors = np.lib.format.open_memmap(
+            self.tmp_dir / _VECTORS_FILE, mode="w+", dtype=np.float32, shape=(max(capacity, 1), dim)
+        )
+        self._records = open(self.tmp_dir / _RECORDS_FILE, "wb")
+        self._offsets = [0]
+        self._ids: list[bytes] = []
+        self._shards: list[dict] = []  # [{"topic", "start", "end"}], topic None = chunk không có topic
+
+    def add(self, ids: list[str], embeddings, documents: list[str], metadatas: list[dict]) -> None:
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        end = self.count + len(ids)
+        if end > self._vectors.shape[0]:
+            raise ValueError(f"Vượt quá số dòng đã khai báo ({self._vectors.shape[0]})")
+        self._vectors[self.count:end] = vectors
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            metadata = metadata or {}
+            line = json.dumps(
+                {"id": chunk_id, "page_content": text, "metadata": metadata}, ensure_ascii=False
+            ).encode("utf-8") + b"\n"
+            self._records.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+            self._ids.append(chunk_id.encode("utf-8"))
+            self._extend_shard(metadata.get("topic") or None)
+        self.count = end
+
+    def _extend_shard(self, topic: str | None) -> None:
+        if self._shards and self._shards[-1]["topic"] == topic:
+            self._shards[-1]["end"] += 1
+            return
+        if any(shard["topic"] == topic for shard in self._shards):
+            raise ValueError(f"Các chunk của topic {topic!r} phải được ghi liền nhau (1 shard / topic)")
+        row = self._shards[-1]["end"] if self._shards else 0
+        self._shards.append({"topic": topic, "start": row, "end": row + 1})
+
+    def publish(self, hnsw: bool = False, hnsw_m: int = 16, hnsw_ef_construction: int = 200,
+                storage: str = "float32") -> dict:
+        """storage: int8 -> ghi thêm bản nén cho lượt quét đầu (float32 vẫn giữ để chấm lại)"""
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Kiểu lưu không hợp lệ: {storage!r} (chọn trong {STORAGE_TYPES})")
+        self._records.close()
+        self._vectors.flush()
+        np.save(self.tmp_dir / _OFFSETS_FILE, np.asarray(self._offsets, dtype=np.int64))
+        # Bảng id -> dòng (sắp xếp theo id): đọc lại vector của chunk theo id mà không phải nạp records
+        ids = np.asarray(self._ids, dtype=bytes) if self._ids else np.empty(0, dtype="S1")
+        order = np.argsort(ids, kind="stable")
+        np.save(self.tmp_dir / _IDS_FILE, ids[order])
+        np.save(self.tmp_dir / _ID_ROWS_FILE, order.astype(np.int64))
+
+        # Centroid của từng shard: bộ định tuyến câu hỏi (query_router.py) so câu hỏi với các vector này
+        centroids = np.zeros((len(self._shards), self.dim), dtype=np.float32)
+        for i, shard in enumerate(self._shards):
+            for start in range(shard["start"], shard["end"], _SCAN_BLOCK_ROWS):
+                end = min(start + _SCAN_BLOCK_ROWS, shard["end"])
+                centroids[i] += np.asarray(self._vectors[start:end]).sum(axis=0)
+        np.save(self.tmp_dir / _CENTROIDS_FILE, _normalize(centroids) if len(centroids) else centroids)
+
+        if storage != "float32":
+            codes = np.lib.format.open_memmap(
+                self.tmp_dir / _CODES_FILE.format(storage=storage), mode="w+",
+                dtype=np.int8, shape=(self.count, self.dim),
+            )
+            scales = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, _SCAN_BLOCK_ROWS):
+                block_codes, block_scales = quantize(
+                    np.asarray(self._vectors[start:start + _SCAN_BLOCK_ROWS][:self.count - start]), storage
+                )
+                codes[start:start + len(block_codes)] = block_codes
+                scales[start:start + len(block_scales)] = block_scales
+            codes.flush()
+            del codes
+            np.save(self.tmp_dir / _SCALES_FILE, scales)
+
+        if hnsw and self.count:
+            import hnswlib
+            for i, shard in enumerate(self._shards):
+                size = shard["end"] - shard["start"]
+                graph = hnswlib.Index(space="ip", dim=self.dim)
+                graph.init_index(max_elements=size, M=hnsw_m, ef_construction=hnsw_ef_construction)
+                graph.add_items(np.asarray(self._vectors[shard["start"]:shard["end"]]),
+                                np.arange(shard["start"], shard["end"]))
+                graph.save_index(str(self.tmp_dir / _HNSW_FILE.format(shard=i)))
+        del self._vectors
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "model_id": self.model_id,
+            "dim": self.dim,
+            "count": self.count,
+            "topics": [shard["topic"] for shard in self._shards if shard["topic"] is not None],
+            "shards": self._shards,
+            "hnsw": bool(hnsw and self.count),
+            "storage": storage,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        (self.tmp_dir / _MANIFEST_FILE).write_text(json.dumps(manifest, ensure_ascii=False, indent=2),
+                                                    encoding="utf-8")
+
+        old_dir = self.index_dir.with_name(f"{self.index_dir.name}.old-{os.getpid()}")
+        if self.index_dir.exists():
+            self.index_dir.rename(old_dir)
+        self.tmp_dir.rename(self.index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return manifest
+
+    def abort(self) -> None:
+        self._records.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def export_from_collection(collection, index_dir, model_id: str, page_size: int = 1000,
+                           hnsw: bool = False, hnsw_m: int = 16, hnsw_ef_construction: int = 200,
+                           storage: str = "float32") -> dict:
+    """
+    Đọc toàn bộ vector + document + metadata từ Chroma collection rồi ghi ra index.
+    Lượt 1 chỉ đọc metadata để nhóm ID theo topic; lượt 2 đọc vector theo từng nhóm
+    -> mỗi topic thành 1 shard liền nhau trong ma trận.
+    """
+    total = collection.count()
+    ids_by_topic: dict[str | None, list[str]] = {}
+    for offset in range(0, total, page_size):
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            ids_by_topic.setdefault((metadata or {}).get("topic") or None, []).append(chunk_id)
+
+    writer = None
+    try:
+        for topic in sorted(ids_by_topic, key=lambda t: (t is None, t or "")):
+            topic_ids = ids_by_topic[topic]
+            for start in range(0, len(topic_ids), page_size):
+                page = collection.get(ids=topic_ids[start:start + page_size],
+                                      include=["embeddings", "documents", "metadatas"])
+                if writer is None:
+                    dim = len(page["embeddings"][0])
+                    writer = VectorIndexWriter(index_dir, dim=dim, capacity=total, model_id=model_id)
+                writer.add(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        if writer is None:
+            return {"count": 0}
+        return writer.publish(hnsw=hnsw, hnsw_m=hnsw_m, hnsw_ef_construction=hnsw_ef_construction,
+                              storage=storage)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+
+# --- ĐỌC ---
+def read_topic_centroids(index_dir) -> dict[str, np.ndarray] | None:
+    """Centroid của từng shard topic (không cần mở cả index). None nếu chưa export."""
+    index_dir = Path(index_dir)
+    if not (index_dir / _CENTROIDS_FILE).exists():
+        return None
+    manifest = json.loads((index_dir / _MANIFEST_FILE).read_text(encoding="utf-8"))
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return None
+    centroids = np.load(index_dir / _CENTROIDS_FILE)
+    return {shard["topic"]: centroids[i] for i, shard in enumerate(manifest["shards"])
+            if shard["topic"] is not None}
+
+
+class MmapVectorIndex:
+    """
+    Mở index đã export. Ma trận vector và bảng offset được memory-map (np.load mmap_mode="r"):
+    nhiều worker process mở cùng index dùng chung trang bộ nhớ của OS, không ai copy vào RAM riêng.
+    """
+
+    def __init__(self, index_dir, hnsw_ef_search: int = 64, rescore_factor: int = 4):
+        self.index_dir = Path(index_dir)
+        self.manifest = json.loads((self.index_dir / _MANIFEST_FILE).read_text(encoding="utf-8"))
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Index {self.index_dir} khác phiên bản định dạng ({self.manifest.get('format_version')})")
+        self.count = self.manifest["count"]
+        self.vectors = np.load(self.index_dir / _VECTORS_FILE, mmap_mode="r")[:self.count]
+        self.offsets = np.load(self.index_dir / _OFFSETS_FILE, mmap_mode="r")
+        self.ids = np.load(self.index_dir / _IDS_FILE, mmap_mode="r")
+        self.id_rows = np.load(self.index_dir / _ID_ROWS_FILE, mmap_mode="r")
+        # Shard theo topic: tìm trong 1 topic = chỉ quét đoạn [start, end) của ma trận
+        self.shards = self.manifest["shards"]
+        self.topics = {shard["topic"]: i for i, shard in enumerate(self.shards) if shard["topic"] is not None}
+        self._records_file = open(self.index_dir / _RECORDS_FILE, "rb")
+        self._records = (
+            mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+        )
+
+        # Bản nén (int8): lượt quét đầu chỉ đụng tới ma trận này -> RAM giảm 4 lần
+        self.storage = self.manifest.get("storage", "float32")
+        if self.storage not in STORAGE_TYPES:
+            raise ValueError(f"Index lưu kiểu {self.storage!r} không còn được hỗ trợ (chọn trong {STORAGE_TYPES})")
+        self.rescore_factor = rescore_factor
+        self.codes = self.scales = None
+        if self.storage != "float32":
+            self.codes = np.load(self.index_dir / _CODES_FILE.format(storage=self.storage), mmap_mode="r")
+            self.scales = np.load(self.index_dir / _SCALES_FILE, mmap_mode="r")
+
+        self.hnsw = None  # list đồ thị, cùng thứ tự với self.shards
+        if self.manifest.get("hnsw") and hnsw_available():
+            import hnswlib
+            self.hnsw = []
+            for i, shard in enumerate(self.shards):
+                graph = hnswlib.Index(space="ip", dim=self.manifest["dim"])
+                graph.load_index(str(self.index_dir / _HNSW_FILE.format(shard=i)),
+                                 max_elements=shard["end"] - shard["start"])
+                graph.set_ef(hnsw_ef_search)
+                self.hnsw.append(graph)
+        self.hnsw_ef_search = hnsw_ef_search
+
+    def record(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._records[start:end])
+
+    def row_of(self, chunk_id: str) -> int | None:
+        """Số dòng của chunk theo id (để đọc lại vector đã lưu); None nếu không có. Tìm nhị phân trên ids.npy"""
+        key = chunk_id.encode("utf-8")
+        i = int(np.searchsorted(self.ids, key))
+        if i < len(self.ids) and self.ids[i] == key:
+            return int(self.id_rows[i])
+        return None
+
+    def search(self, vector, k: int, topic: str | list[str] | None = None) -> list[tuple[int, float]]:
+        """
+        Trả về [(số dòng, cosine)] giảm dần.
+        topic: 1 topic hoặc list topic -> chỉ quét các shard đó; None -> mọi shard.
+        """
+        if self.count == 0 or k <= 0:
+            return []
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        if topic is None:
+            shard_ids = None
+        else:
+            topics = [topic] if isinstance(topic, str) else topic
+            shard_ids = [self.topics[t] for t in dict.fromkeys(topics) if t in self.topics]
+            if not shard_ids:
+                return []
+
+        if self.hnsw is not None:
+            results = []
+            for i in (range(len(self.shards)) if shard_ids is None else shard_ids):
+                results.extend(self._search_hnsw(i, query, k))
+        elif shard_ids is None:
+            results = self._search_rows(query, k, 0, self.count)
+        else:
+            results = []
+            for i in shard_ids:
+                results.extend(self._search_rows(query, k, self.shards[i]["start"], self.shards[i]["end"]))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    def _search_hnsw(self, shard_id: int, query: np.ndarray, k: int) -> list[tuple[int, float]]:
+        shard = self.shards[shard_id]
+        k = min(k, shard["end"] - shard["start"])
+        if k <= 0:
+            return []
+        graph = self.hnsw[shard_id]
+        graph.set_ef(max(self.hnsw_ef_search, k))
+        labels, distances = graph.knn_query(query, k=k)
+        # space="ip": distance = 1 - tích vô hướng
+        return [(int(row), float(1.0 - d)) for row, d in zip(labels[0], distances[0])]
+
+    def _search_rows(self, query: np.ndarray, k: int, start: int, end: int) -> list[tuple[int, float]]:
+        """Vét cạn trên đoạn [start, end) của ma trận (1 shard hoặc cả index)"""
+        if self.codes is not None:
+            found = rescored_search(self.vectors[start:end], self.codes[start:end],
+                                    self.scales[start:end] if self.scales is not None else None,
+                                    query, k, rescore_k=k * self.rescore_factor)
+            return [(start + row, score) for row, score in found]
+        scores = self.vectors[start:end] @ query
+        return [(start + int(row), float(scores[row])) for row in top_k(scores, k)]
+
+    def shard_sizes(self) -> dict[str | None, int]:
+        return {shard["topic"]: shard["end"] - shard["start"] for shard in self.shards}
+
+    def close(self):
+        if isinstance(self._records, mmap.mmap):
+            self._records.close()
+        self._records_file.close()
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Bọc MmapVectorIndex theo interface VectorStore của LangChain (chỉ đọc) để thay Chroma ở
+    đường truy vấn: similarity_search(_by_vector), as_retriever, filter={"topic": ...}.
+    """
+
+    def __init__(self, index: MmapVectorIndex, embedding=None):
+        self.index = index
+        self._embedding = embedding
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def similarity_search_with_score_by_vector(self, embedding: list[float], k: int = 4,
+                                               filter: dict | None = None) -> list[tuple[Document, float]]:
+        filter = dict(filter or {})
+        topic = filter.pop("topic", None)
+        if isinstance(topic, dict):
+            # Cú pháp where của Chroma: {"topic": {"$in": [...]}} / {"topic": {"$eq": ...}}
+            topic = topic.get("$in", topic.get("$eq"))
+        # Điều kiện metadata khác topic: lọc sau trên tập ứng viên rộng hơn
+        fetch_k = k * 10 if filter else k
+        results = []
+        for row, score in self.index.search(embedding, fetch_k, topic=topic):
+            rec = self.index.record(row)
+            metadata = rec["metadata"]
+            if any(metadata.get(key) != value for key, value in filter.items()):
+                continue
+            results.append((Document(id=rec["id"], page_content=rec["page_content"], metadata=metadata), score))
+            if len(results) == k:
+                break
+        return results
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4,
+                                    filter: dict | None = None, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict | None = None,
+                                     **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict | None = None,
+                          **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def get_embeddings(self, ids: list[str]) -> list[np.ndarray | None]:
+        """Vector đã lưu (float32, đã chuẩn hoá) theo id chunk, cùng thứ tự; id không có -> None"""
+        rows = [self.index.row_of(chunk_id) for chunk_id in ids]
+        return [np.asarray(self.index.vectors[row]) if row is not None else None for row in rows]
+
+    def _select_relevance_score_fn(self):
+        # Điểm đã là cosine
+        return lambda score: score
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] | None = None, **kwargs: Any):
+        raise NotImplementedError("Index mmap chỉ đọc: chạy lại chunk_and_embedding.py để export.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Index mmap được export từ Chroma lúc ingest (export_from_collection).")
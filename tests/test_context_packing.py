@@ -0,0 +1,50 @@
+# tests/test_context_packing.py
+# (Kiểm tra ContextPacker: cắt phần lặp do chunk overlap, không bỏ nhầm chunk ngắn)
+
+import sys
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.chatbot.core.context_packing import ContextPacker
+
+
+def _doc(text: str, source: str, topic: str = "license") -> Document:
+    return Document(page_content=text, metadata={"topic": topic, "document_id": source, "source": source})
+
+
+def test_short_chunks_from_other_documents_are_kept():
+    long_text = "Thủ tục đổi bằng lái xe Việt Nam sang bằng Nhật gồm dịch thuật JAF và nộp hồ sơ. " * 3
+    docs = [
+        _doc(long_text, "license_conversion.pdf"),
+        _doc("Phí đổi bằng tại Tokyo: 2.550 yên.", "license_fees.csv"),
+        _doc("Học phí trường lái Aichi: 300.000 yên.", "schools.csv", topic="driving school"),
+    ]
+    packed = ContextPacker(token_budget=1000).pack(docs, "phí đổi bằng Tokyo")
+
+    assert packed.stats["dropped_overlap"] == 0
+    assert "Phí đổi bằng tại Tokyo: 2.550 yên." in packed.text
+    assert "Học phí trường lái Aichi: 300.000 yên." in packed.text
+
+
+def test_overlap_between_neighbouring_chunks_is_trimmed():
+    text = "".join(f"Bước {i}: chuẩn bị giấy tờ số {i} và nộp tại trung tâm cảnh sát. " for i in range(12))
+    first, second = text[:400], text[300:700]
+    packed = ContextPacker(token_budget=1000, min_overlap_chars=50).pack(
+        [_doc(first, "license.pdf"), _doc(second, "license.pdf")], "giấy tờ đổi bằng"
+    )
+
+    assert packed.stats["overlap_chars_trimmed"] >= 100
+    assert packed.text.count(text[300:400]) == 1
+
+
+def test_trimmed_remainder_shorter_than_min_chunk_chars_is_dropped():
+    text = "".join(f"Điều kiện {i}: có bằng lái quốc tế hợp lệ và hộ chiếu còn hạn. " for i in range(8))
+    docs = [_doc(text[:300], "license.pdf"), _doc(text[250:320], "license.pdf")]
+    packed = ContextPacker(token_budget=1000, min_overlap_chars=20, min_chunk_chars=80).pack(docs)
+
+    assert packed.stats["dropped_overlap"] == 1
+    assert packed.stats["packed"] == 1
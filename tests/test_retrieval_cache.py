@@ -0,0 +1,134 @@
+# tests/test_retrieval_cache.py
+# (Kiểm tra RetrievalCache: khớp chính xác / gần đúng (chỉ khi cùng số + thực thể đã biết), lối tắt BM25
+#  trước khi embed, TTL, LRU, xoá cache khi manifest ingest đổi revision)
+
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import RETRIEVAL_CACHE_KEY_TERMS, INGEST_MANIFEST_NAME
+from src.chatbot.core import utils
+from src.chatbot.core.ingest_manifest import IngestManifest
+from src.chatbot.core.retrieval_cache import RetrievalCache, index_key_terms, key_tokens
+
+KEY_TERMS = index_key_terms(RETRIEVAL_CACHE_KEY_TERMS + ["Toyota", "N-BOX", "Kei Car"])
+
+
+def _same_vector(query: str) -> list[float]:
+    # Mọi câu hỏi "rất gần nhau" (cosine = 1): chỉ còn token định danh quyết định có dùng lại kết quả không
+    return [1.0, 0.0, 0.0]
+
+
+def _cache(**kwargs) -> RetrievalCache:
+    return RetrievalCache(embed_fn=_same_vector, key_terms=RETRIEVAL_CACHE_KEY_TERMS, **kwargs)
+
+
+def _search(calls: list):
+    def search(query, embedding):
+        calls.append(query)
+        return [f"docs: {query}"], embedding
+    return search
+
+
+def test_key_tokens_ignore_ordinary_words():
+    assert key_tokens("đổi bằng lái Việt Nam tại Osaka", KEY_TERMS) == {"osaka"}
+    assert key_tokens("thủ tục đổi bằng Osaka cho người Việt", KEY_TERMS) == {"osaka"}
+    assert key_tokens("trường lái ở Aichi học phí bao nhiêu", KEY_TERMS) == {"aichi"}
+    assert key_tokens("N-BOX đời 2018 giá bao nhiêu", KEY_TERMS) == {"n box", "2018"}
+    assert key_tokens("xe Kei Car của Toyota", KEY_TERMS) == {"kei car", "toyota"}
+
+
+def test_paraphrases_hit_semantic_cache():
+    cache, calls = _cache(), []
+    cache.retrieve("đổi bằng lái Việt Nam tại Osaka", _search(calls))
+    docs, _ = cache.retrieve("thủ tục đổi bằng Osaka cho người Việt", _search(calls))
+    cache.retrieve("học phí trường lái ở Aichi", _search(calls))
+    cache.retrieve("trường lái ở Aichi học phí bao nhiêu", _search(calls))
+
+    assert docs == ["docs: đổi bằng lái Việt Nam tại Osaka"]
+    assert calls == ["đổi bằng lái Việt Nam tại Osaka", "học phí trường lái ở Aichi"]
+    assert cache.stats["semantic_hits"] == 2
+
+
+def test_different_city_or_number_is_rejected():
+    cache, calls = _cache(), []
+    cache.retrieve("đổi bằng lái tại Osaka", _search(calls))
+    docs, _ = cache.retrieve("đổi bằng lái tại Tokyo", _search(calls))
+    cache.retrieve("xe đời 2018", _search(calls))
+    cache.retrieve("xe đời 2020", _search(calls))
+
+    assert docs == ["docs: đổi bằng lái tại Tokyo"]
+    assert len(calls) == 4
+    assert cache.stats["semantic_hits"] == 0
+    assert cache.stats["semantic_rejected"] == 3
+
+
+def test_exact_match_shortcut_runs_before_embedding():
+    embedded = []
+    cache = RetrievalCache(embed_fn=lambda q: embedded.append(q) or [1.0, 0.0])
+    calls = []
+    exact_match = lambda q: ["docs: N-BOX"] if q == "N-BOX" else None
+
+    assert cache.retrieve("N-BOX", _search(calls), exact_match=exact_match) == (["docs: N-BOX"], None)
+    assert cache.retrieve("n-box", _search(calls), exact_match=exact_match) == (["docs: N-BOX"], None)
+    docs, vector = cache.retrieve("xe hybrid ở Osaka", _search(calls), exact_match=exact_match)
+
+    assert embedded == ["xe hybrid ở Osaka"]
+    assert vector.tolist() == [1.0, 0.0]
+    assert calls == ["xe hybrid ở Osaka"]
+    assert cache.stats["exact_match_shortcuts"] == 1
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_exact_hit_skips_embedding_and_search():
+    embedded, calls = [], []
+    cache = RetrievalCache(embed_fn=lambda q: embedded.append(q) or [1.0, 0.0])
+    cache.retrieve("Xe Hybrid ở Osaka?", _search(calls))
+    docs, _ = cache.retrieve("xe hybrid ở osaka", _search(calls))
+
+    assert docs == ["docs: Xe Hybrid ở Osaka?"]
+    assert embedded == ["Xe Hybrid ở Osaka?"]
+    assert len(calls) == 1
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_expired_entries_are_searched_again():
+    cache, calls = RetrievalCache(ttl_seconds=0.05), []
+    cache.retrieve("học phí trường lái Aichi", _search(calls))
+    time.sleep(0.1)
+    cache.retrieve("học phí trường lái Aichi", _search(calls))
+
+    assert len(calls) == 2
+    assert cache.stats["exact_hits"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, calls = RetrievalCache(max_entries=2), []
+    for query in ("xe ở Osaka", "xe ở Tokyo", "xe ở Osaka", "xe ở Kyoto", "xe ở Osaka", "xe ở Tokyo"):
+        cache.retrieve(query, _search(calls))
+
+    # "xe ở Tokyo" ít dùng gần đây nhất khi thêm "xe ở Kyoto" -> bị loại, hỏi lại phải search
+    assert calls == ["xe ở Osaka", "xe ở Tokyo", "xe ở Kyoto", "xe ở Tokyo"]
+    assert cache.stats["evictions"] == 2
+    assert len(cache) == 2
+
+
+def test_cache_is_cleared_when_manifest_revision_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "RETRIEVAL_CACHE_REVISION_CHECK_SECONDS", 0)
+    # Cache tạo trước lần ingest đầu tiên (chưa có manifest)
+    cache, calls = utils.get_retrieval_cache(store_dir=tmp_path), []
+    cache.retrieve("đổi bằng lái tại Osaka", _search(calls))
+    cache.retrieve("đổi bằng lái tại Osaka", _search(calls))
+
+    manifest = IngestManifest(tmp_path / INGEST_MANIFEST_NAME)
+    manifest.record("license", "license_conversion", "hash", "cfg", ["license-0"])
+    cache.retrieve("đổi bằng lái tại Osaka", _search(calls))
+    manifest.record("license", "license_conversion", "hash2", "cfg", ["license-0"])
+    cache.retrieve("đổi bằng lái tại Osaka", _search(calls))
+    manifest.close()
+
+    assert len(calls) == 3
+    assert cache.stats["invalidations"] == 2
@@ -0,0 +1,99 @@
+# tests/test_retrieval_tool.py
+# (Kiểm tra tool retrieve_context với cấu hình mặc định: số lần embed câu hỏi trên đường gọi thật
+#  - cache retrieval gần đúng, định tuyến topic, BM25 + vector mmap, ghép ngữ cảnh)
+
+import hashlib
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import VECTOR_INDEX_NAME, LEXICAL_INDEX_NAME, RETRIEVAL_CACHE_ENABLED, CONTEXT_PACKING_ENABLED
+from config import QUERY_ROUTER_ENABLED
+from src.chatbot.core.agent import ChatResources, build_tools
+from src.chatbot.core.lexical_index import LexicalIndex, tokenize
+from src.chatbot.core.utils import get_retrieval_cache, get_context_packer, get_query_router
+from src.chatbot.core.vector_index import VectorIndexWriter, MmapVectorIndex, MmapVectorStore
+
+DIM = 64
+CHUNKS = {
+    "car": [
+        "Honda N-BOX 2019, Kei Car, xăng, hộp số AT, giá 980.000 yên, Osaka.",
+        "Toyota Prius 2018, Hybrid, Sedan, hộp số AT, giá 1.250.000 yên, Tokyo.",
+        "Toyota Aqua 2020, Hybrid, Hatchback, hộp số AT, giá 1.100.000 yên, Aichi.",
+    ],
+    "license": [
+        "Đổi bằng lái Việt Nam sang bằng Nhật: dịch thuật JAF, nộp hồ sơ tại trung tâm cảnh sát, thi lý thuyết.",
+    ],
+    "driving school": [
+        "Trường lái Aichi: học phí khoá học bằng thường khoảng 300.000 yên, giáo viên hướng dẫn tiếng Việt.",
+    ],
+}
+
+
+class CountingEmbeddings:
+    """Embedding túi-từ băm (không cần model) đếm số lần embed câu hỏi"""
+
+    def __init__(self):
+        self.queries = []
+
+    def embed_documents(self, texts):
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                vectors[i, int(hashlib.md5(token.encode()).hexdigest(), 16) % DIM] += 1.0
+        return (vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)).tolist()
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def tool_and_embeddings(tmp_path, capsys):
+    embeddings = CountingEmbeddings()
+    lexical_index = LexicalIndex(tmp_path / LEXICAL_INDEX_NAME)
+    texts = [text for topic in CHUNKS for text in CHUNKS[topic]]
+    writer = VectorIndexWriter(tmp_path / VECTOR_INDEX_NAME, DIM, len(texts), model_id="test")
+    for topic, chunks in CHUNKS.items():
+        ids = [f"{topic}-{i}" for i in range(len(chunks))]
+        metadatas = [{"topic": topic, "document_id": f"{topic}_data", "source": f"{topic}.csv"} for _ in chunks]
+        writer.add(ids, embeddings.embed_documents(chunks), chunks, metadatas)
+        lexical_index.upsert(ids, metadatas, chunks)
+    writer.publish()
+
+    # Giống load_resources(): mỗi thành phần theo cờ trong config.py
+    resources = ChatResources(
+        embeddings=embeddings,
+        vector_store=MmapVectorStore(MmapVectorIndex(tmp_path / VECTOR_INDEX_NAME), embedding=embeddings),
+        lexical_index=lexical_index,
+        retrieval_cache=get_retrieval_cache(embeddings, store_dir=tmp_path) if RETRIEVAL_CACHE_ENABLED else None,
+        router=get_query_router(store_dir=tmp_path) if QUERY_ROUTER_ENABLED else None,
+        context_packer=get_context_packer() if CONTEXT_PACKING_ENABLED else None,
+    )
+    tool = next(t for t in build_tools(resources) if t.name == "retrieve_context")
+    yield tool, embeddings
+    lexical_index.close()
+
+
+def test_exact_match_query_is_never_embedded(tool_and_embeddings):
+    tool, embeddings = tool_and_embeddings
+
+    context = tool.invoke({"query": "N-BOX"})
+
+    assert "Honda N-BOX 2019" in context
+    assert embeddings.queries == []
+
+
+def test_other_queries_are_embedded_once(tool_and_embeddings):
+    tool, embeddings = tool_and_embeddings
+
+    context = tool.invoke({"query": "xe hybrid giá rẻ ở Tokyo"})
+    tool.invoke({"query": "xe hybrid giá rẻ ở Tokyo"})
+
+    assert "Toyota Prius 2018" in context
+    assert embeddings.queries == ["xe hybrid giá rẻ ở Tokyo"]
@@ -0,0 +1,105 @@
+# tests/test_session_store.py
+# (Kiểm tra SessionStore: cắt theo lượt giữ nguyên cặp tool_call / ToolMessage, tóm tắt lượt cũ,
+#  LRU + phiên rảnh được ghi snapshot, nạp lại snapshot kèm topic)
+
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.chatbot.core.session_store import SessionStore, SUMMARY_MESSAGE_ID
+
+
+def _turn(i: int) -> list:
+    call_id = f"call_{i}"
+    return [
+        HumanMessage(content=f"Câu hỏi số {i}: thủ tục đổi bằng lái ở Osaka cần giấy tờ gì?"),
+        AIMessage(content="", tool_calls=[{"name": "retrieve_context", "args": {"query": f"đổi bằng {i}"},
+                                           "id": call_id}]),
+        ToolMessage(content="Nội dung: dịch thuật JAF, hộ chiếu, bằng lái Việt Nam. " * 5, tool_call_id=call_id),
+        AIMessage(content=f"Trả lời số {i}: cần bản dịch JAF, hộ chiếu và bằng lái gốc."),
+    ]
+
+
+def _store(tmp_path, **kwargs) -> SessionStore:
+    options = {"token_budget": 400, "max_sessions": 10, "idle_seconds": 3600, "summary_max_chars": 300}
+    options.update(kwargs)
+    return SessionStore(snapshot_dir=tmp_path, **options)
+
+
+def test_trimming_keeps_tool_call_pairs_together(tmp_path):
+    store = _store(tmp_path)
+    messages = []
+    for i in range(8):
+        messages += _turn(i)
+        store.update("khach-1", messages)
+        messages = store.history("khach-1")
+
+    history = store.history("khach-1")
+    assert history[0].id == SUMMARY_MESSAGE_ID
+    assert isinstance(history[1], HumanMessage)
+    call_ids = [call["id"] for m in history if isinstance(m, AIMessage) for call in m.tool_calls]
+    result_ids = [m.tool_call_id for m in history if isinstance(m, ToolMessage)]
+    assert call_ids == result_ids
+    assert len(history) - 1 < 8 * 4
+    assert history[-1].content.startswith("Trả lời số 7")
+
+
+def test_folded_turns_go_into_summary_within_limit(tmp_path):
+    store = _store(tmp_path, summary_max_chars=300)
+    messages = []
+    for i in range(8):
+        messages += _turn(i)
+        store.update("khach-1", messages)
+        messages = store.history("khach-1")
+
+    history = store.history("khach-1")
+    summary = history[0].content
+    kept = {m.content for m in history[1:] if isinstance(m, HumanMessage)}
+    assert "Câu hỏi số 0" not in "".join(kept)
+    # Lượt vừa bị gộp gần nhất nằm trong tóm tắt, các lượt rất cũ bị cắt bớt để tóm tắt không vượt giới hạn
+    newest_folded = min(int(text.split("số ")[1].split(":")[0]) for text in kept) - 1
+    assert f"Câu hỏi số {newest_folded}" in summary
+    assert "Trả lời số" in summary
+    assert "Câu hỏi số 0" not in summary
+    assert len(store._sessions["khach-1"].summary) <= 300
+    # Ngân sách tính trên tóm tắt thô; message tóm tắt gửi đi có thêm dòng mở đầu (~10 token)
+    assert store.tokens("khach-1") <= 400 + 16
+
+
+def test_lru_eviction_writes_snapshot(tmp_path):
+    store = _store(tmp_path, max_sessions=2)
+    for session_id in ("khach-1", "khach-2", "khach-3"):
+        store.update(session_id, _turn(1), topic="license")
+
+    assert len(store) == 2
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    # Truy cập lại phiên đã bị đẩy ra -> nạp từ snapshot (và đẩy phiên ít dùng nhất kế tiếp ra)
+    assert len(store.history("khach-1")) == 4
+    assert len(store) == 2
+
+
+def test_idle_session_is_evicted_to_snapshot(tmp_path):
+    store = _store(tmp_path, idle_seconds=0.05)
+    store.update("khach-1", _turn(1))
+    time.sleep(0.1)
+    store.update("khach-2", _turn(2))
+
+    assert len(store) == 1
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+
+def test_snapshot_reloads_with_topic(tmp_path):
+    store = _store(tmp_path)
+    store.update("khach-1", _turn(1) + _turn(2), topic="license")
+    store.save_all()
+
+    reloaded = _store(tmp_path)
+    history = reloaded.history("khach-1")
+    assert reloaded.topic("khach-1") == "license"
+    assert [m.content for m in history] == [m.content for m in _turn(1) + _turn(2)]
+    assert isinstance(history[2], ToolMessage) and history[2].tool_call_id == "call_1"